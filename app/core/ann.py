@@ -0,0 +1,342 @@
+import hashlib
+import logging
+import os
+import time
+import numpy as np
+from app.core.vectors import cap_scores, exact_search, l2_normalize, top_k
+
+logger = logging.getLogger(__name__)
+
+# Nearest-neighbour engines used behind SearchCache.
+# Engines work on the cache's L2-normalised float32 matrix, so cosine
+# similarity is a plain dot product. An engine indexes the first `size` rows;
+# rows appended later (the "tail") are scored exactly at query time until the
+# next rebuild, so a delta load never has to retrain anything.
+# `ceiling` (used by paging, see app.core.pagination) restricts a search to
+# rows scoring at most that value; `allowed` (a boolean mask over the rows,
+# see app.core.filters) to the rows it marks, before top-k selection.
+
+def fingerprint(ids: np.ndarray, embeddings: np.ndarray, block: int = 65536) -> str:
+    """
+    Identifies the exact rows an index was built for: the ids and the vector
+    contents, so a persisted index is never loaded over re-embedded papers.
+    Hashed in blocks, so a mapped matrix is streamed rather than copied.
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(ids).tobytes(), digest_size=16)
+    for start in range(0, len(embeddings), block):
+        digest.update(np.ascontiguousarray(embeddings[start:start + block]).data)
+    dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+    return f"{len(ids)}:{dim}:{digest.hexdigest()}"
+
+class ExactIndex:
+    """ Brute-force cosine scan. Always correct; linear in corpus size. """
+    name = "exact"
+
+    def __init__(self, size: int = 0):
+        self.size = size
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, **params):
+        return cls(len(embeddings))
+
+    def search(self, embeddings: np.ndarray, query: np.ndarray, k: int, exclude=None, ceiling=None, allowed=None):
+        return exact_search(embeddings, query, k, exclude, ceiling, allowed)
+
+class ScalarQuantizer:
+    """
+    Compact copy of a matrix for approximate scoring: float16 ("fp16"), or
+    int8 with a per-dimension scale and offset ("sq8"), i.e. 2 or 1 bytes
+    per value instead of 4.
+    """
+    KINDS = ("sq8", "fp16")
+    BLOCK = 8192 # Rows decoded per step; keeps the float32 scratch in cache
+
+    def __init__(self, codes, scale=None, offset=None):
+        self.codes = codes
+        self.scale = scale # sq8 only: x ~= offset + scale * code
+        self.offset = offset
+
+    @classmethod
+    def train(cls, embeddings: np.ndarray, kind: str):
+        if kind not in cls.KINDS:
+            raise ValueError(f"Unknown quantizer: {kind}")
+        if kind == "fp16":
+            return cls(embeddings.astype(np.float16))
+        low, high = embeddings.min(axis=0), embeddings.max(axis=0)
+        offset = ((high + low) / 2).astype(np.float32)
+        scale = ((high - low) / 254).astype(np.float32)
+        scale[scale == 0] = 1.0
+        codes = np.empty(embeddings.shape, dtype=np.int8)
+        for start in range(0, len(embeddings), cls.BLOCK):
+            block = (embeddings[start:start + cls.BLOCK] - offset) / scale
+            np.clip(np.rint(block), -127, 127, out=block)
+            codes[start:start + cls.BLOCK] = block
+        return cls(codes, scale, offset)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray = None) -> np.ndarray:
+        """ Approximate dot products of `query` with `codes` (default: all rows). """
+        codes = self.codes if codes is None else codes
+        if self.scale is None:
+            weights, bias = query, 0.0
+        else:
+            # q . (offset + scale * code) = q . offset + (q * scale) . code
+            weights, bias = query * self.scale, float(query @ self.offset)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.BLOCK):
+            scores[start:start + self.BLOCK] = codes[start:start + self.BLOCK].astype(np.float32) @ weights
+        return scores + bias
+
+    def error_bound(self, query: np.ndarray) -> float:
+        """ Upper bound on |approximate - exact| score for unit-length rows and `query`. """
+        if self.scale is None:
+            # float16 keeps 11 significant bits: |x_i - x16_i| <= 2^-11 |x_i|, and sum |q_i x_i| <= 1
+            return 2.0 ** -11 + 1e-6
+        # Rounding to the nearest code is off by at most half a step per dimension
+        return float(np.abs(query * self.scale).sum() / 2) + 1e-6
+
+    def save(self, path: str) -> dict:
+        """ Writes the codes to `path` (.npy, so they can be memory-mapped); returns the small arrays. """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.codes)
+        os.replace(tmp_path, path)
+        return {} if self.scale is None else {"scale": self.scale, "offset": self.offset}
+
+    @classmethod
+    def load(cls, path: str, data):
+        if not os.path.exists(path):
+            return None
+        scale = data["scale"] if "scale" in data else None
+        offset = data["offset"] if "offset" in data else None
+        return cls(np.load(path, mmap_mode="r"), scale, offset)
+
+def rerank(embeddings: np.ndarray, rows: np.ndarray, query: np.ndarray, k: int, ceiling=None):
+    """ Exact scores for candidate `rows`; returns the best k, best first. """
+    rows = np.sort(rows) # Sequential access when the matrix is a mapped file
+    scores = cap_scores(embeddings[rows] @ query, ceiling)
+    best = top_k(scores, k)
+    return rows[best], scores[best]
+
+def capped_pool(approx: np.ndarray, quantizer: ScalarQuantizer, query: np.ndarray, ceiling, k: int, rerank: int) -> int:
+    """
+    Applies a page `ceiling` to approximate scores and returns how many
+    candidates to re-rank. The cap is widened by the quantisation error, so
+    no row at or under the ceiling is lost, and the pool grows by the rows
+    in that uncertain band, which may turn out to be above it.
+    """
+    pool = max(k, rerank)
+    if ceiling is None:
+        return pool
+    bound = quantizer.error_bound(query)
+    cap_scores(approx, ceiling + bound)
+    return pool + int(np.count_nonzero(approx > ceiling - bound))
+
+class IVFIndex:
+    """
+    Inverted-file index: spherical k-means partitions the corpus into `nlist`
+    cells; a query only scores the rows in its `nprobe` closest cells.
+    With `quantize`, candidates are scored on compact codes stored in cell
+    order and only the best `rerank` are read at full precision.
+    """
+    name = "ivf"
+
+    def __init__(self, centroids, order, offsets, nprobe, quantizer=None, rerank=256):
+        self.centroids = centroids # (nlist, dim) unit vectors
+        self.order = order # Row ids grouped by cell
+        self.offsets = offsets # Cell c owns order[offsets[c]:offsets[c + 1]]
+        self.nprobe = nprobe
+        self.quantizer = quantizer # Codes for order[i] at position i, or None
+        self.rerank = rerank
+        self.size = len(order)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: int = 0, nprobe: int = 16,
+              train_sample: int = 100_000, iterations: int = 10, seed: int = 0,
+              quantize: str = "", rerank: int = 256, **params):
+        """ Trains on L2-normalised rows, as held by SearchCache. """
+        n = len(embeddings)
+        if nlist <= 0:
+            # Common rule of thumb: ~4 * sqrt(n) cells
+            nlist = int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(seed)
+        sample_rows = rng.choice(n, size=min(n, max(train_sample, nlist)), replace=False)
+        sample = l2_normalize(embeddings[sample_rows])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assign, minlength=nlist)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[np.argsort(assign, kind="stable")], starts[~empty])
+            if empty.any():
+                # Reseed dead cells with random training points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = l2_normalize(sums)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 65536):
+            assign[start:start + 65536] = np.argmax(embeddings[start:start + 65536] @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=offsets[1:])
+        quantizer = ScalarQuantizer.train(embeddings[order], quantize) if quantize else None
+        return cls(centroids, order, offsets, nprobe, quantizer, rerank)
+
+    def cells(self, query: np.ndarray, nprobe: int = None) -> np.ndarray:
+        return top_k(self.centroids @ query, min(nprobe or self.nprobe, len(self.centroids)))
+
+    def search(self, embeddings: np.ndarray, query: np.ndarray, k: int, exclude=None, ceiling=None, allowed=None):
+        q = l2_normalize(query)
+        nprobe = self.nprobe
+        if allowed is not None:
+            # A filter keeping a fraction f of the rows probes 1/f times the cells,
+            # so about as many matching candidates are scored as without one
+            density = max(np.count_nonzero(allowed), 1) / max(self.size, 1)
+            nprobe = int(np.ceil(self.nprobe / density))
+        cells = self.cells(q, nprobe)
+        rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+        keep = np.ones(len(rows), dtype=bool)
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(rows, exclude)
+        if allowed is not None:
+            keep &= allowed[rows]
+
+        if self.quantizer is None:
+            rows = rows[keep]
+            scores = cap_scores(embeddings[rows] @ q, ceiling)
+            best = top_k(scores, k)
+            return rows[best], scores[best]
+
+        approx = np.concatenate([
+            self.quantizer.scores(q, self.quantizer.codes[self.offsets[c]:self.offsets[c + 1]]) for c in cells
+        ])
+        rows, approx = rows[keep], approx[keep]
+        pool = capped_pool(approx, self.quantizer, q, ceiling, k, self.rerank)
+        return rerank(embeddings, rows[top_k(approx, pool)], q, k, ceiling)
+
+    def save(self, path: str, meta: str):
+        # Write then rename, so other processes never load a half-written file
+        extra = self.quantizer.save(f"{path}.codes.npy") if self.quantizer is not None else {}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path, centroids=self.centroids, order=self.order, offsets=self.offsets,
+            meta=np.array(meta), **extra,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, meta: str, nprobe: int = 16, quantize: str = "", rerank: int = 256, **params):
+        """ Returns the persisted index, or None if missing or built for other rows. """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if str(data["meta"]) != meta:
+                return None
+            quantizer = None
+            if quantize:
+                quantizer = ScalarQuantizer.load(f"{path}.codes.npy", data)
+                if quantizer is None:
+                    return None
+            return cls(data["centroids"], data["order"], data["offsets"], nprobe, quantizer, rerank)
+
+class QuantizedIndex:
+    """
+    Flat scan over quantised codes with exact re-ranking: the best `rerank`
+    candidates are re-scored against the full-precision rows. With
+    SHARED_CACHE those rows are a memory-mapped file, so only the codes
+    need to stay resident.
+    """
+    kind = None
+
+    def __init__(self, quantizer: ScalarQuantizer, rerank: int = 256):
+        self.quantizer = quantizer
+        self.rerank = rerank
+        self.size = len(quantizer.codes)
+
+    @property
+    def codes(self):
+        return self.quantizer.codes
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, rerank: int = 256, **params):
+        return cls(ScalarQuantizer.train(embeddings, cls.kind), rerank)
+
+    def search(self, embeddings: np.ndarray, query: np.ndarray, k: int, exclude=None, ceiling=None, allowed=None):
+        q = l2_normalize(query)
+        approx = cap_scores(self.quantizer.scores(q), allowed=allowed)
+        pool = capped_pool(approx, self.quantizer, q, ceiling, k, self.rerank)
+        candidates = top_k(approx, pool, exclude)
+        return rerank(embeddings, candidates, q, k, ceiling)
+
+    def save(self, path: str, meta: str):
+        extra = self.quantizer.save(f"{path}.codes.npy")
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, meta=np.array(meta), **extra)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, meta: str, rerank: int = 256, **params):
+        """ Returns the persisted index (codes memory-mapped), or None if missing or stale. """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if str(data["meta"]) != meta:
+                return None
+            quantizer = ScalarQuantizer.load(f"{path}.codes.npy", data)
+        return cls(quantizer, rerank) if quantizer is not None else None
+
+class Float16Index(QuantizedIndex):
+    name = kind = "fp16"
+
+class Int8Index(QuantizedIndex):
+    name = kind = "sq8"
+
+ENGINES = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+    Float16Index.name: Float16Index,
+    Int8Index.name: Int8Index,
+}
+
+def search_with_tail(index, embeddings: np.ndarray, query: np.ndarray, k: int, exclude=None, ceiling=None,
+                     allowed=None):
+    """
+    Searches `index` over its rows and scores any rows appended since the
+    build exactly, merging both into a single top-k. `exclude` rows, and
+    rows not marked in `allowed`, are never returned.
+    """
+    size = index.size
+    exclude = np.asarray(exclude if exclude is not None else [], dtype=np.int64)
+    head, tail = (None, None) if allowed is None else (allowed[:size], allowed[size:])
+    rows, scores = index.search(embeddings[:size], query, k, exclude[exclude < size], ceiling, head)
+    if size < len(embeddings):
+        tail_rows, tail_scores = exact_search(embeddings[size:], query, k, exclude[exclude >= size] - size, ceiling, tail)
+        rows = np.concatenate([rows, tail_rows + size])
+        scores = np.concatenate([scores, tail_scores])
+        best = top_k(scores, k)
+        rows, scores = rows[best], scores[best]
+    return rows, scores
+
+def recall_at_k(index, embeddings: np.ndarray, k: int = 10, queries: int = 200, seed: int = 0):
+    """
+    Measures recall@k of `index` against the exact scan, using random corpus
+    rows as queries. Returns (recall, mean_ms, p99_ms).
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(embeddings), size=min(queries, len(embeddings)), replace=False)
+    exact = ExactIndex(len(embeddings))
+    hits, timings = 0, []
+    for row in sample:
+        query = embeddings[row]
+        truth, _ = exact.search(embeddings, query, k)
+        start = time.perf_counter()
+        found, _ = search_with_tail(index, embeddings, query, k)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += len(np.intersect1d(truth, found))
+    recall = hits / (len(sample) * min(k, len(embeddings)))
+    return recall, float(np.mean(timings)), float(np.percentile(timings, 99))
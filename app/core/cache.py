@@ -1,30 +1,507 @@
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app.models.paper import Paper
+from app.core.ann import ENGINES, ExactIndex, fingerprint, recall_at_k, rerank, search_with_tail
+from app.core.config import settings
+from app.core.filters import PaperFilter, RowColumns
+from app.core.shared_matrix import SharedMatrix
+from app.core.vectors import EMBEDDING_DTYPE, l2_normalize, unpack_embeddings
 import numpy as np
+import threading
+import time
+import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
+class CacheSnapshot:
+    """
+    Immutable view of the search index.
+    Requests should grab `search_cache.snapshot` once and use it throughout,
+    so a concurrent reload can never pair ids from one version with
+    embeddings from another.
+    """
+    __slots__ = ("ids", "embeddings", "watermark", "generation", "index", "vectors_version", "columns")
+
+    def __init__(self, ids: np.ndarray, embeddings: np.ndarray, watermark=None, generation: int = 0, index=None,
+                 vectors_version: int = 0, columns: RowColumns = None):
+        self.ids = ids # Sorted paper ids (int64), row i <-> embeddings[i]
+        self.embeddings = embeddings # L2-normalised float32, read-only
+        self.watermark = watermark # Highest `indexed_at` seen in the DB
+        self.generation = generation
+        self.index = index if index is not None else ExactIndex(len(ids))
+        # Bumped only when an already-indexed paper's vector may have changed
+        # (full load, re-versioned rows); pure appends keep it
+        self.vectors_version = vectors_version
+        # Category / published day per row, for filtered searches
+        self.columns = columns if columns is not None else RowColumns.unknown(len(ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, paper_id: int):
+        """ Returns the matrix row for a paper id, or None if it is not indexed. """
+        i = int(np.searchsorted(self.ids, paper_id))
+        if i < len(self.ids) and self.ids[i] == paper_id:
+            return i
+        return None
+
+    def rows_of(self, paper_ids) -> np.ndarray:
+        """ Vectorised `row_of`; ids that are not indexed are dropped. """
+        paper_ids = np.asarray(paper_ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, paper_ids)
+        rows = rows[rows < len(self.ids)]
+        return rows[np.isin(self.ids[rows], paper_ids)]
+
+    def ids_for(self, rows) -> list[int]:
+        """ Maps matrix rows back to plain python paper ids (safe to bind in SQL). """
+        return self.ids[rows].tolist()
+
+    def mask(self, flt: PaperFilter):
+        """ Boolean row mask for `flt` (memoised per snapshot), or None for no filter. """
+        return self.columns.mask(flt)
+
+    def search(self, query: np.ndarray, k: int, exclude_ids=None, ceiling=None, allowed=None):
+        """
+        Top-k rows by cosine similarity to `query`, best first, with their
+        scores. Papers in `exclude_ids` are never returned, nor rows scoring
+        above `ceiling` (see app.core.pagination.vector_page), nor rows
+        outside the `allowed` mask (see `mask`).
+        """
+        if not len(self.ids):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        exclude = self.rows_of(exclude_ids) if exclude_ids is not None else None
+        if allowed is not None:
+            matching = np.flatnonzero(allowed)
+            if len(matching) <= settings.FILTER_SCAN_ROWS:
+                # Selective filter: scoring just the matching rows is cheaper than
+                # the index and exact, however few of them sit near the query
+                if exclude is not None and len(exclude):
+                    matching = matching[~np.isin(matching, exclude)]
+                return rerank(self.embeddings, matching, l2_normalize(query), k, ceiling)
+        return search_with_tail(self.index, self.embeddings, query, k, exclude, ceiling, allowed)
+
+_EMPTY = CacheSnapshot(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=EMBEDDING_DTYPE))
+
 class SearchCache:
-    def __init__(self):
-        self.ids = []
-        self.embeddings = None
-        self.loaded = False
+    def __init__(self, shared: SharedMatrix = None):
+        self._snapshot = _EMPTY
+        # Writable backing store; snapshots are views of its first n rows, so
+        # appends go into spare capacity without touching what readers see.
+        # None while the snapshot is a read-only shared mapping.
+        self._buffer = None
+        self._lock = threading.Lock()
+        self._building = False
+        self._build_again = False # Rows changed under a build in progress
+        # Cross-worker mode: the matrix lives in `shared`, see app.core.shared_matrix
+        self.shared = shared
+        self._shared_generation = None
+        self._shared_vectors_version = None
+        self._shared_segment = None
+        self._shared_index = None # Meta of the persisted ANN index the manifest announces
+        # Whoever last wrote the shared rows builds and persists the ANN index;
+        # the other workers load it (see `_build_index`)
+        self._token = uuid.uuid4().hex
+        self._publisher = False
+        self._checked_at = 0.0
+
+    @property
+    def snapshot(self) -> CacheSnapshot:
+        if self.shared is not None:
+            self._follow_shared()
+        return self._snapshot
+
+    @property
+    def ids(self):
+        return self._snapshot.ids
+
+    @property
+    def embeddings(self):
+        return self._snapshot.embeddings
+
+    @property
+    def loaded(self) -> bool:
+        return len(self._snapshot) > 0
+
+    def load_or_attach(self, db: Session):
+        """
+        Startup entry point. With a shared matrix, attaches to the published
+        generation if it is current with the DB; otherwise one worker loads
+        and publishes while the others wait on the lock and then attach.
+        """
+        if self.shared is None:
+            return self.load(db)
+        watermark = self._max_watermark(db)
+        with self.shared.lock():
+            manifest = self.shared.manifest()
+            if manifest is None or manifest["watermark"] != (None if watermark is None else str(watermark)):
+                self.load(db)
+                return
+        with self._lock:
+            self._attach()
 
     def load(self, db: Session):
+        """ Full rebuild from the papers table. """
         logger.info("Loading paper embeddings into memory...")
         try:
-            papers = db.query(Paper).filter(Paper.embedding.isnot(None)).all()
-            if not papers:
-                logger.info("No embeddings found in DB.")
-                return
+            with self._lock:
+                watermark = self._max_watermark(db)
+                # Raw column read: skips ORM object construction for every paper
+                rows = db.execute(text(
+                    "SELECT id, embedding, category, published FROM papers "
+                    "WHERE typeof(embedding) = 'blob' ORDER BY id"
+                )).all()
+                if not rows:
+                    logger.info("No embeddings found in DB.")
+                    return
 
-            self.ids = [p.id for p in papers]
-            # embedding stored as JSON list, need to be numpy
-            self.embeddings = np.array([p.embedding for p in papers])
-            self.loaded = True
-            logger.info(f"Loaded {len(self.ids)} embeddings.")
+                ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                # Packed float32 blobs -> normalised (n, dim) float32 matrix in one pass
+                self._buffer = l2_normalize(unpack_embeddings([row[1] for row in rows]))
+                columns = RowColumns.build([row[2] for row in rows], [row[3] for row in rows])
+                self._publish(ids, len(ids), watermark, rewritten=True, columns=columns)
+            logger.info(f"Loaded {len(ids)} embeddings.")
         except Exception as e:
             logger.error(f"Error loading cache: {e}")
 
-search_cache = SearchCache()
+    def refresh(self, db: Session) -> int:
+        """
+        Delta load: picks up papers added or re-versioned since the last
+        watermark. Falls back to a full load when nothing is cached yet.
+        Returns the number of rows applied.
+        """
+        snap = self._snapshot
+        if not len(snap) or snap.watermark is None:
+            self.load(db)
+            return len(self._snapshot)
+
+        watermark = self._max_watermark(db)
+        # `>=` re-reads the boundary rows; unchanged ones are skipped by upsert
+        rows = db.execute(text(
+            "SELECT id, embedding, category, published FROM papers "
+            "WHERE indexed_at >= :watermark AND typeof(embedding) = 'blob' ORDER BY id"
+        ), {"watermark": snap.watermark}).all()
+        applied = self.upsert([tuple(row) for row in rows], watermark=watermark)
+        logger.info(f"Cache refresh applied {applied} of {len(rows)} changed rows.")
+        return applied
+
+    def upsert(self, items, watermark=None) -> int:
+        """
+        Applies (paper_id, packed_embedding[, category, published]) tuples to
+        the live index and swaps in a new snapshot. New papers are appended,
+        re-versioned ones replaced; without the metadata, replaced rows keep
+        theirs and appended ones are unknown to filters. Used by `refresh` and
+        by the fetcher to push freshly ingested rows.
+        """
+        items = [tuple(item) + (None, None) * (len(item) == 2) for item in items]
+        with self._lock:
+            snap = self._snapshot
+            if not len(snap):
+                if not items:
+                    return 0
+                items = sorted(items, key=lambda item: item[0])
+                ids = np.array([item[0] for item in items], dtype=np.int64)
+                self._buffer = l2_normalize(unpack_embeddings([item[1] for item in items]))
+                columns = RowColumns.build([item[2] for item in items], [item[3] for item in items])
+                self._publish(ids, len(ids), watermark, rewritten=True, columns=columns)
+                return len(ids)
+
+            n = len(snap)
+            appends, replaces, meta = {}, {}, {}
+            for pid, blob, category, published in items:
+                vector = l2_normalize(np.frombuffer(blob, dtype=EMBEDDING_DTYPE))
+                row = snap.row_of(pid)
+                if row is None:
+                    appends[pid] = vector
+                    meta[pid] = (category, published)
+                elif not np.array_equal(snap.embeddings[row], vector):
+                    replaces[row] = vector
+                    if category is not None or published is not None:
+                        meta[pid] = (category, published)
+
+            if not appends and not replaces:
+                if watermark is not None and watermark != snap.watermark:
+                    self._publish(
+                        snap.ids, n, watermark, index=snap.index, matrix=snap.embeddings, columns=snap.columns,
+                    )
+                return 0
+
+            new_ids = np.fromiter(sorted(appends), dtype=np.int64, count=len(appends))
+            in_order = not len(new_ids) or new_ids[0] > snap.ids[-1]
+
+            # Columns are small: changes go to a copy, so the old snapshot keeps its own
+            columns = snap.columns
+            replaced = [row for row in replaces if int(snap.ids[row]) in meta]
+            if replaced:
+                columns = columns.updated(replaced, *zip(*(meta[int(snap.ids[row])] for row in replaced)))
+            if len(new_ids):
+                columns = columns.extended(*zip(*(meta[pid] for pid in new_ids.tolist())))
+
+            if self._shared_segment is not None and self._buffer is None and in_order and not replaces:
+                # Shared fast path: write the new rows into the shared segment in place
+                vectors = np.stack([appends[pid] for pid in new_ids.tolist()])
+                if self._append_shared(snap, new_ids, vectors, columns, watermark):
+                    return len(new_ids)
+
+            capacity = 0 if self._buffer is None else len(self._buffer)
+
+            if in_order and not replaces and n + len(new_ids) <= capacity:
+                # Fast path: write into spare capacity past the live rows
+                buffer = self._buffer
+            else:
+                # Copy-on-write: current readers keep the old matrix untouched
+                buffer = np.empty((max(2 * n, n + len(new_ids)), snap.embeddings.shape[1]), dtype=EMBEDDING_DTYPE)
+                buffer[:n] = snap.embeddings
+                for row, vector in replaces.items():
+                    buffer[row] = vector
+
+            for offset, pid in enumerate(new_ids.tolist()):
+                buffer[n + offset] = appends[pid]
+            ids = np.concatenate([snap.ids, new_ids])
+            total = len(ids)
+
+            if not in_order:
+                order = np.argsort(ids, kind="stable")
+                ids = ids[order]
+                buffer = np.ascontiguousarray(buffer[:total][order])
+                columns = columns.taken(order)
+
+            self._buffer = buffer
+            self._publish(
+                ids, total, watermark if watermark is not None else snap.watermark, rewritten=bool(replaces),
+                columns=columns,
+            )
+            return len(new_ids) + len(replaces)
+
+    def search(self, query: np.ndarray, k: int, exclude_ids=None, ceiling=None, allowed=None):
+        return self._snapshot.search(query, k, exclude_ids, ceiling, allowed)
+
+    def _publish(self, ids: np.ndarray, n: int, watermark, index=None, rewritten=False, matrix=None,
+                 columns: RowColumns = None):
+        private = matrix is None
+        if private:
+            matrix = self._buffer[:n]
+            matrix.flags.writeable = False
+        if index is None:
+            index = self._index_for(ids, rewritten)
+        current = self._snapshot
+        # Single reference assignment: readers see either the old or the new index
+        self._snapshot = CacheSnapshot(
+            ids, matrix, watermark, current.generation + 1, index,
+            current.vectors_version + (1 if rewritten else 0), columns,
+        )
+        if self.shared is not None and private:
+            self._share()
+
+    def _share(self):
+        """
+        Publishes the private matrix for the other workers as a new segment
+        with spare capacity for appends, then swaps this process over to the
+        shared mapping too, freeing the private copy (lock held).
+        """
+        snap = self._snapshot
+        try:
+            manifest = self.shared.publish(
+                snap.ids, snap.embeddings, snap.watermark, snap.vectors_version,
+                columns={"category": snap.columns.category, "published": snap.columns.published},
+                # A kept index still covers a prefix of the new segment
+                meta={"categories": snap.columns.vocabulary, "writer": self._token,
+                      "index": getattr(snap.index, "meta", None)},
+                capacity=2 * len(snap),
+            )
+        except Exception as e:
+            logger.error(f"Error publishing shared matrix; keeping private copy: {e}")
+            return
+        self._shared_generation = manifest["generation"]
+        self._shared_vectors_version = manifest["vectors_version"]
+        self._shared_segment = manifest["segment"]
+        self._shared_index = manifest["index"]
+        self._publisher = True
+        attached = self.shared.attach()
+        if attached is None or attached[0]["generation"] != manifest["generation"]:
+            return # Superseded already; the next poll attaches the newer one
+        _, ids, embeddings, _ = attached
+        self._buffer = None
+        self._snapshot = CacheSnapshot(
+            ids, embeddings, snap.watermark, snap.generation, snap.index, snap.vectors_version, snap.columns,
+        )
+
+    def _append_shared(self, snap: CacheSnapshot, new_ids: np.ndarray, vectors: np.ndarray, columns: RowColumns,
+                       watermark) -> bool:
+        """
+        Appends rows past the live ones of the shared segment and attaches
+        the result (lock held). False if the segment has no room left or was
+        changed by another worker: the caller publishes a new one.
+        """
+        n = len(snap)
+        try:
+            manifest = self.shared.append(
+                self._shared_segment, n, new_ids, vectors, watermark if watermark is not None else snap.watermark,
+                columns={"category": columns.category[n:], "published": columns.published[n:]},
+                meta={"categories": columns.vocabulary, "writer": self._token},
+            )
+        except Exception as e:
+            logger.error(f"Error appending to shared matrix: {e}")
+            return False
+        if manifest is None:
+            return False
+        self._attach()
+        return True
+
+    def _follow_shared(self):
+        """ Re-attaches when another process published a newer generation. """
+        now = time.monotonic()
+        if now - self._checked_at < settings.SHARED_CACHE_POLL_SECONDS:
+            return
+        self._checked_at = now
+        generation = self.shared.generation()
+        if generation is None or generation == self._shared_generation:
+            return
+        # Never stall a request behind a load in progress; the next poll retries
+        if not self._lock.acquire(blocking=False):
+            self._checked_at = 0.0
+            return
+        try:
+            self._attach()
+        finally:
+            self._lock.release()
+
+    def _attach(self):
+        """ Maps the current shared generation as the live snapshot (lock held). """
+        attached = self.shared.attach()
+        if attached is None:
+            return
+        manifest, ids, embeddings, columns = attached
+        if manifest["generation"] == self._shared_generation:
+            return
+        rewritten = manifest["vectors_version"] != self._shared_vectors_version
+        self._shared_generation = manifest["generation"]
+        self._shared_vectors_version = manifest["vectors_version"]
+        self._shared_segment = manifest.get("segment", manifest["generation"])
+        self._shared_index = manifest.get("index")
+        self._publisher = manifest.get("writer") == self._token
+        self._buffer = None
+        if manifest["rows"]:
+            columns = (
+                RowColumns(columns["category"], columns["published"], manifest["categories"])
+                if "category" in columns else None # Published by an older release
+            )
+            self._publish(ids, len(ids), manifest["watermark"], rewritten=rewritten, matrix=embeddings, columns=columns)
+            if not self._publisher and self._shared_index != getattr(self._snapshot.index, "meta", None):
+                self._schedule_build() # Loads the index the writer announced
+        logger.info(f"Attached shared matrix generation {manifest['generation']} ({manifest['rows']} rows).")
+
+    def _index_for(self, ids: np.ndarray, rewritten: bool = False):
+        """
+        Picks the ANN index for a snapshot about to be published (lock held).
+        The current index is kept while the rows it covers are unchanged; new
+        rows are scored exactly as a tail until a background rebuild lands.
+        `rewritten` (vectors replaced in place) makes it unusable: its codes
+        and cell assignments describe the old vectors.
+        """
+        n = len(ids)
+        if settings.ANN_ENGINE not in ENGINES or settings.ANN_ENGINE == ExactIndex.name or n < settings.ANN_MIN_ROWS:
+            return ExactIndex(n)
+
+        current = self._snapshot.index
+        reusable = (
+            not rewritten
+            and not isinstance(current, ExactIndex)
+            and current.size <= n
+            and np.array_equal(ids[:current.size], self._snapshot.ids[:current.size])
+        )
+        if not reusable:
+            self._schedule_build()
+            return ExactIndex(n)
+        if n - current.size > settings.ANN_REBUILD_TAIL_FRACTION * current.size:
+            self._schedule_build()
+        return current
+
+    def _schedule_build(self):
+        if self._building:
+            self._build_again = True
+            return
+        self._building = True
+        threading.Thread(target=self._build_index, name="ann-index-build", daemon=True).start()
+
+    def _build_index(self):
+        try:
+            # Waits for the publish that scheduled this build to finish
+            with self._lock:
+                snap = self._snapshot
+                self._build_again = False
+                follower = self.shared is not None and not self._publisher
+                segment, announced = self._shared_segment, self._shared_index
+            engine = ENGINES[settings.ANN_ENGINE]
+            loader = getattr(engine, "load", None)
+            params = dict(
+                nlist=settings.ANN_NLIST, nprobe=settings.ANN_NPROBE,
+                quantize=settings.ANN_QUANTIZE, rerank=settings.ANN_RERANK,
+                train_sample=settings.ANN_TRAIN_SAMPLE, iterations=settings.ANN_KMEANS_ITERATIONS,
+            )
+            if follower and loader is not None:
+                # The writer builds and persists the index once; until it announces
+                # one in the manifest, this worker keeps scoring the tail exactly
+                if announced is None or announced == getattr(snap.index, "meta", None):
+                    return
+                meta, index = announced, loader(settings.ANN_INDEX_PATH, announced, **params)
+                if index is None:
+                    return
+                logger.info(f"Loaded shared {engine.name} index over {index.size} rows.")
+            else:
+                meta = (
+                    f"{engine.name}:{fingerprint(snap.ids, snap.embeddings)}:"
+                    f"{settings.ANN_NLIST}:{settings.ANN_KMEANS_ITERATIONS}:{settings.ANN_QUANTIZE}"
+                )
+                index = loader(settings.ANN_INDEX_PATH, meta, **params) if loader else None
+                if index is None:
+                    start = time.perf_counter()
+                    index = engine.build(snap.embeddings, **params)
+                    recall, mean_ms, p99_ms = recall_at_k(index, snap.embeddings)
+                    logger.info(
+                        f"Built {engine.name} index over {index.size} rows in {time.perf_counter() - start:.1f}s "
+                        f"(recall@10={recall:.3f}, mean={mean_ms:.2f}ms, p99={p99_ms:.2f}ms)"
+                    )
+                    if hasattr(index, "save"):
+                        index.save(settings.ANN_INDEX_PATH, meta)
+                else:
+                    logger.info(f"Loaded persisted {engine.name} index over {index.size} rows.")
+            index.meta = meta # What it was persisted under, for the shared manifest
+
+            with self._lock:
+                current = self._snapshot
+                # Only attach if the rows it was built over are still in place, with the same vectors
+                if (
+                    len(current) >= index.size and len(snap) >= index.size
+                    and current.vectors_version == snap.vectors_version
+                    and np.array_equal(current.ids[:index.size], snap.ids[:index.size])
+                ):
+                    self._snapshot = CacheSnapshot(
+                        current.ids, current.embeddings, current.watermark, current.generation + 1, index,
+                        current.vectors_version, current.columns,
+                    )
+                    if self.shared is not None and not follower and hasattr(index, "save"):
+                        self._announce_index(segment, meta)
+        except Exception as e:
+            logger.error(f"Error building ANN index: {e}")
+        finally:
+            with self._lock:
+                self._building = False
+                if self._build_again:
+                    self._schedule_build()
+
+    def _announce_index(self, segment: int, meta: str):
+        """ Points the other workers at the index just persisted (lock held). """
+        generation = self._shared_generation
+        manifest = self.shared.set_index(segment, meta)
+        if manifest is None:
+            return # A new segment superseded it; its writer builds for that one
+        if manifest["generation"] == generation + 1:
+            # Nothing else changed: no need to re-attach to our own announcement
+            self._shared_generation = manifest["generation"]
+            self._shared_index = meta
+
+    @staticmethod
+    def _max_watermark(db: Session):
+        return db.execute(text("SELECT max(indexed_at) FROM papers")).scalar()
+
+search_cache = SearchCache(SharedMatrix(settings.SHARED_CACHE_DIR) if settings.SHARED_CACHE else None)
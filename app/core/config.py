@@ -12,6 +12,91 @@ class Settings(BaseSettings):
     
     # Arxiv Settings
     ARXIV_QUERY_INTERVAL_HOURS: int = 24
+    ARXIV_PAGE_SIZE: int = 1000 # Results per API call when harvesting (API max is 2000)
+    ARXIV_REQUEST_DELAY: float = 3.0 # Seconds between API calls, per arXiv's usage policy
+    ARXIV_MAX_RETRIES: int = 3
+    EMBED_BATCH_SIZE: int = 64 # Papers per model.encode batch during ingest
+    INGEST_COMMIT_CHUNK: int = 500 # Papers per upsert transaction
+
+    # SQLite connection profile (WAL; readers never wait on the writer)
+    SQLITE_SYNCHRONOUS: str = "NORMAL" # Durable across app crashes in WAL mode; FULL also survives power loss
+    SQLITE_CACHE_KB: int = 32768 # Page cache per connection
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT_MS: int = 10000 # Writers wait this long for another process's write to finish
+    SQLITE_READ_POOL_SIZE: int = 8
+    WRITE_QUEUE_SIZE: int = 1000 # Pending writes before submitters block
+    WRITE_QUEUE_WAIT_SECONDS: float = 5.0 # How long async routes wait on a full write queue before a 503
+
+    # Auth: cached principals per token subject; bcrypt on a dedicated process pool
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_TTL_SECONDS: int = 60 # Re-read the user after this, to see other workers' changes
+    AUTH_HASH_WORKERS: int = 2
+    AUTH_HASH_QUEUE_SIZE: int = 64 # Hashes waiting for a worker before logins get 503
+
+    # Load the embedding model in the background at startup (else on first semantic search)
+    WARMUP_MODEL: bool = True
+
+    # Query encoding: concurrent /search queries are embedded in micro-batches
+    QUERY_BATCH_WINDOW_MS: float = 5.0 # How long the first query waits for others to join
+    QUERY_BATCH_MAX: int = 32
+    QUERY_CACHE_SIZE: int = 10000 # Recent query vectors kept (LRU)
+
+    # AI explanations
+    AI_BACKEND: str = "gemini" # "gemini" or "stub" (offline, for tests and development)
+    GEMINI_API_KEY: str = "" # Set via the environment
+    GEMINI_MODEL: str = "gemini-1.5-flash"
+    AI_MAX_CONCURRENCY: int = 4 # Upstream calls in flight per worker
+    AI_PREGENERATE_INTERVAL_SECONDS: int = 0 # 0 = off; run it on one worker only
+    AI_PREGENERATE_BATCH: int = 50 # Trending + newest papers considered per run
+    AI_PREGENERATE_CONCURRENCY: int = 2
+    AI_STUB_DELAY: float = 0.0
+
+    # Cross-worker shared embedding matrix (memory-mapped files)
+    SHARED_CACHE: bool = True
+    SHARED_CACHE_DIR: str = os.path.join(DATA_DIR, "shared_cache")
+    SHARED_CACHE_POLL_SECONDS: float = 1.0 # How often workers check for another worker's reload
+
+    # Nearest-neighbour index: "ivf", "exact", or quantised scans with exact
+    # re-ranking ("sq8" int8, "fp16" float16); small corpora always use exact
+    ANN_ENGINE: str = "ivf"
+    ANN_MIN_ROWS: int = 20000
+    ANN_NLIST: int = 0 # 0 = ~4 * sqrt(n) cells
+    ANN_NPROBE: int = 16
+    ANN_QUANTIZE: str = "" # "sq8" or "fp16": score ivf candidates on compact codes
+    ANN_RERANK: int = 256 # Quantised scoring: candidates re-scored at full precision
+    ANN_TRAIN_SAMPLE: int = 100000
+    ANN_KMEANS_ITERATIONS: int = 10
+    ANN_REBUILD_TAIL_FRACTION: float = 0.1 # Rebuild once unindexed rows exceed this share
+    ANN_INDEX_PATH: str = os.path.join(DATA_DIR, "ann_index.npz")
+    # Filtered searches (category / date): when at most this many rows match, they are
+    # scored exactly instead of through the ANN index
+    FILTER_SCAN_ROWS: int = 50000
+
+    # Cached per-user library profiles for /recommend
+    PROFILE_CACHE_SIZE: int = 10000 # Users kept in memory (LRU)
+    PROFILE_TTL_SECONDS: int = 300 # Re-read from the DB after this, to see other workers' toggles
+
+    # In-memory paper metadata behind result lists (app.core.paper_store)
+    PAPER_SUMMARY_CACHE_SIZE: int = 20000 # Abstracts kept (LRU); the short fields of every paper are resident
+    PAPER_STORE_FALLBACK_SIZE: int = 10000 # Papers read outside the startup load / delta refresh (LRU)
+
+    # Results per page of every paged listing (keyset cursors, see app.core.pagination)
+    PAGE_SIZE: int = 30
+
+    # Hybrid search: candidates taken from each ranker before reciprocal rank fusion
+    SEARCH_CANDIDATES: int = 100
+    RRF_K: int = 60
+
+    # Trending (/hype): precomputed top-N per window
+    TRENDING_TOP_N: int = 50
+    TRENDING_REFRESH_SECONDS: int = 60 # Recompute after this, to see other workers' toggles
+
+    # Version counters behind the ETags of /, /hype and /library/ids (shared by all workers)
+    VERSIONS_PATH: str = os.path.join(DATA_DIR, "versions.bin")
+
+    # Rendered paper-list fragments, invalidated when papers or saves change
+    FRAGMENT_CACHE_ENTRIES: int = 512
+    FRAGMENT_CACHE_BYTES: int = 32 * 1024 * 1024
     
     class Config:
         case_sensitive = True
@@ -1,19 +1,72 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-engine = create_engine(
+def sqlite_profile(engine, read_only: bool = False):
+    """
+    Applies the connection pragmas to every new connection of `engine`.
+    WAL lets readers run alongside a writer, so a backfill never blocks
+    page loads. Read-only connections also set `query_only`, so a stray
+    write on the read pool fails instead of queueing behind ingest.
+    """
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode=WAL") # Persistent: stored in the DB file
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return engine
+
+# Write pool: migrations, scripts/ingest and the app's single writer (app.core.writer)
+engine = sqlite_profile(create_engine(
     f"sqlite:///{settings.DB_PATH}", 
     connect_args={"check_same_thread": False} # Needed for SQLite
-)
+))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read pool for request handlers
+read_engine = sqlite_profile(create_engine(
+    f"sqlite:///{settings.DB_PATH}",
+    connect_args={"check_same_thread": False},
+    pool_size=settings.SQLITE_READ_POOL_SIZE,
+), read_only=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Async engine for `async def` routes: queries run on aiosqlite's worker
+# thread, so the event loop keeps serving other requests meanwhile.
+async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{settings.DB_PATH}",
+    pool_size=settings.SQLITE_READ_POOL_SIZE,
+)
+sqlite_profile(async_engine.sync_engine, read_only=True)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False,
+    expire_on_commit=False # Loaded objects stay usable in templates after commit
+)
+
 Base = declarative_base()
 
 def get_db():
-    db = SessionLocal()
+    """
+    Read-only sync session, for plain `def` routes (run in the threadpool).
+    Writes go through `app.core.writer.db_writer`.
+    """
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """ Read-only async session, for `async def` routes. """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,169 @@
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+import numpy as np
+from fastapi import HTTPException
+
+# Category and date-range restrictions for /search and /similar.
+# A PaperFilter is applied in SQL for keyword hits and listings, and compiled
+# to a boolean row mask over the search snapshot's RowColumns for vector
+# results, so the top-k is taken among matching papers only.
+
+UNKNOWN_CATEGORY = -1
+UNKNOWN_DAY = np.iinfo(np.int32).min
+_EPOCH = date(1970, 1, 1)
+
+class PaperFilter(NamedTuple):
+    categories: tuple = () # Any of these primary categories; () = all
+    since: date = None
+    until: date = None # Inclusive
+
+    @property
+    def active(self) -> bool:
+        return bool(self.categories) or self.since is not None or self.until is not None
+
+    def params(self) -> dict:
+        """ Query parameters that reproduce this filter (for next-page links). """
+        params = {}
+        if self.categories:
+            params["category"] = ",".join(self.categories)
+        if self.since is not None:
+            params["since"] = self.since.isoformat()
+        if self.until is not None:
+            params["until"] = self.until.isoformat()
+        return params
+
+    def conditions(self, model) -> list:
+        """ SQLAlchemy filter clauses on a model with `category` and `published`. """
+        clauses = []
+        if self.categories:
+            clauses.append(model.category.in_(self.categories))
+        if self.since is not None:
+            clauses.append(model.published >= datetime.combine(self.since, time()))
+        if self.until is not None:
+            clauses.append(model.published < datetime.combine(self.until + timedelta(days=1), time()))
+        return clauses
+
+    def sql(self, table: str = "papers") -> tuple[str, dict]:
+        """ The same clauses for raw SQL: (" AND ..." fragment, bind parameters). """
+        clauses, params = [], {}
+        if self.categories:
+            names = [f":category_{i}" for i in range(len(self.categories))]
+            clauses.append(f"{table}.category IN ({', '.join(names)})")
+            params.update({name[1:]: category for name, category in zip(names, self.categories)})
+        # DateTime columns are ISO text in SQLite, so prefixes compare correctly
+        if self.since is not None:
+            clauses.append(f"{table}.published >= :since")
+            params["since"] = self.since.isoformat()
+        if self.until is not None:
+            clauses.append(f"{table}.published < :until")
+            params["until"] = (self.until + timedelta(days=1)).isoformat()
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+NO_FILTER = PaperFilter()
+
+def paper_filter(category: str = "", since: date = None, until: date = None) -> PaperFilter:
+    """ FastAPI dependency: `?category=cs.LG,cs.CL&since=2024-01-01&until=2024-06-30`. """
+    categories = tuple(sorted({name.strip() for name in category.split(",") if name.strip()}))
+    if since is not None and until is not None and since > until:
+        raise HTTPException(status_code=400, detail="`since` is after `until`")
+    return PaperFilter(categories, since, until)
+
+def to_days(values) -> np.ndarray:
+    """ datetimes, ISO strings (as raw SQLite reads return them) or None -> int32 days since 1970. """
+    dates = np.array([value if value is not None else "NaT" for value in values], dtype="datetime64[D]")
+    days = dates.astype(np.int64)
+    days[np.isnat(dates)] = UNKNOWN_DAY
+    return days.astype(np.int32)
+
+class RowColumns:
+    """
+    Compact per-row metadata kept next to the search matrix, row i <-> ids[i]:
+        category   int16 code into `vocabulary` (-1: unknown)
+        published  int32 days since 1970-01-01 (UNKNOWN_DAY: unknown)
+    Six bytes per paper, so a filter is a vectorised comparison over a few
+    hundred KB instead of a SQL round trip. Immutable like the snapshot that
+    holds it; codes are append-only, so they stay valid across snapshots.
+    """
+    MASK_CACHE_SIZE = 64
+
+    def __init__(self, category: np.ndarray, published: np.ndarray, vocabulary=()):
+        self.category = category
+        self.published = published
+        self.vocabulary = list(vocabulary)
+        self._codes = {name: code for code, name in enumerate(self.vocabulary)}
+        self._masks = {} # PaperFilter -> boolean row mask, compiled on first use
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.category)
+
+    @classmethod
+    def unknown(cls, n: int, vocabulary=()):
+        return cls(np.full(n, UNKNOWN_CATEGORY, dtype=np.int16), np.full(n, UNKNOWN_DAY, dtype=np.int32), vocabulary)
+
+    @classmethod
+    def build(cls, categories, published, vocabulary=()):
+        columns = cls.unknown(0, vocabulary)
+        return columns.extended(categories, published)
+
+    def _encode(self, categories) -> tuple[np.ndarray, list]:
+        """ Category names -> codes, growing a copy of the vocabulary for unseen names. """
+        vocabulary, codes = list(self.vocabulary), dict(self._codes)
+        encoded = np.empty(len(categories), dtype=np.int16)
+        for i, name in enumerate(categories):
+            if not name:
+                encoded[i] = UNKNOWN_CATEGORY
+                continue
+            code = codes.get(name)
+            if code is None:
+                code = codes[name] = len(vocabulary)
+                vocabulary.append(name)
+            encoded[i] = code
+        return encoded, vocabulary
+
+    def extended(self, categories, published) -> "RowColumns":
+        """ A copy with rows appended. """
+        codes, vocabulary = self._encode(categories)
+        return RowColumns(
+            np.concatenate([self.category, codes]), np.concatenate([self.published, to_days(published)]), vocabulary,
+        )
+
+    def updated(self, rows, categories, published) -> "RowColumns":
+        """ A copy with `rows` overwritten. """
+        codes, vocabulary = self._encode(categories)
+        category, days = self.category.copy(), self.published.copy()
+        rows = np.asarray(rows, dtype=np.int64)
+        category[rows] = codes
+        days[rows] = to_days(published)
+        return RowColumns(category, days, vocabulary)
+
+    def taken(self, order: np.ndarray) -> "RowColumns":
+        """ A copy with rows reordered (or selected) by `order`. """
+        return RowColumns(self.category[order], self.published[order], self.vocabulary)
+
+    def mask(self, flt: PaperFilter):
+        """ Boolean mask of the rows `flt` keeps, or None when it keeps everything. """
+        if not flt.active:
+            return None
+        mask = self._masks.get(flt)
+        if mask is None:
+            mask = self._compile(flt)
+            mask.flags.writeable = False
+            with self._lock:
+                if len(self._masks) >= self.MASK_CACHE_SIZE:
+                    self._masks.clear()
+                self._masks[flt] = mask
+        return mask
+
+    def _compile(self, flt: PaperFilter) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if flt.categories:
+            codes = [self._codes[name] for name in flt.categories if name in self._codes]
+            mask &= np.isin(self.category, codes)
+        if flt.since is not None:
+            mask &= self.published >= (flt.since - _EPOCH).days
+        if flt.until is not None:
+            # Unknown dates are INT32_MIN, so `since` drops them and this check alone doesn't
+            mask &= (self.published <= (flt.until - _EPOCH).days) & (self.published != UNKNOWN_DAY)
+        return mask
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from fastapi.responses import HTMLResponse
+from app.core.config import settings
+from app.core.versions import versions
+
+import logging
+logger = logging.getLogger(__name__)
+
+class FragmentCache:
+    """
+    In-process LRU of rendered HTML, bounded by entry count and total size.
+
+    Entries are keyed by endpoint + parameters and stamped with the global
+    data version. Ingest and library toggles call `bump()`, which makes
+    every stored fragment stale at once; there is no TTL. A render that
+    started before a bump is never stored, so a stale page cannot be
+    cached after the data changed. `shared_version` (a callable) covers
+    changes made by other processes: when its value moves, that is a bump.
+    """
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024, shared_version=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> html
+        self._bytes = 0
+        self._version = 0
+        self.shared_version = shared_version
+        self._shared_seen = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self):
+        """ Data changed: drop every fragment rendered from the old data. """
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html: str, version: int):
+        size = len(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version != self._version:
+                return # Rendered from data that has since changed
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = html
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    async def render(self, templates, name: str, key, load_context) -> HTMLResponse:
+        """
+        Returns the cached fragment for `key`, or renders template `name`
+        with `await load_context()` (which does the DB work) and caches it.
+        Templates rendered this way must not depend on the request.
+        """
+        if self.shared_version is not None:
+            seen = self.shared_version()
+            if seen != self._shared_seen:
+                self._shared_seen = seen
+                self.bump()
+        version = self._version
+        html = self.get(key)
+        if html is None:
+            html = templates.get_template(name).render(await load_context())
+            self.put(key, html, version)
+        return HTMLResponse(html)
+
+fragment_cache = FragmentCache(
+    settings.FRAGMENT_CACHE_ENTRIES, settings.FRAGMENT_CACHE_BYTES,
+    shared_version=lambda: (versions.papers, versions.saves),
+)
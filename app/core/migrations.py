@@ -0,0 +1,131 @@
+import json
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from app.core.vectors import pack_embedding
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+def run_migrations(engine: Engine):
+    """
+    Brings an existing SQLite database up to date with the current models.
+    `create_all` only creates missing tables, so anything that changes existing
+    tables or stored data lives here. Every step is idempotent.
+    """
+    _migrate_json_embeddings(engine)
+    _add_indexed_at(engine)
+    _create_fts_index(engine)
+    _seed_trending(engine)
+    _create_listing_indexes(engine)
+
+def _migrate_json_embeddings(engine: Engine):
+    """ Rewrites embeddings stored as JSON float lists into packed float32 blobs. """
+    migrated = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, embedding FROM papers "
+                    "WHERE id > :last_id AND typeof(embedding) = 'text' "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                vector = json.loads(row.embedding)
+                # JSON `null` rows become real NULLs
+                blob = pack_embedding(vector) if vector else None
+                params.append({"id": row.id, "embedding": blob})
+            conn.execute(text("UPDATE papers SET embedding = :embedding WHERE id = :id"), params)
+            migrated += len(rows)
+            last_id = rows[-1].id
+
+    if migrated:
+        logger.info(f"Migrated {migrated} JSON embeddings to float32 blobs.")
+
+def _add_indexed_at(engine: Engine):
+    """ Adds the `papers.indexed_at` watermark column, seeded from `created_at`. """
+    columns = {c["name"] for c in inspect(engine).get_columns("papers")}
+    if "indexed_at" in columns:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE papers ADD COLUMN indexed_at DATETIME"))
+        conn.execute(text("UPDATE papers SET indexed_at = created_at"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_papers_indexed_at ON papers (indexed_at)"))
+    logger.info("Added papers.indexed_at column.")
+
+def _create_fts_index(engine: Engine):
+    """
+    FTS5 keyword index over title, summary and authors. It is an external
+    content table (no second copy of the text) kept in sync by triggers, so
+    every ingest path, ORM or bulk upsert, updates it in the same transaction.
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'papers_fts'"
+        )).first()
+        if exists:
+            return
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE papers_fts USING fts5("
+            "title, summary, authors, content='papers', content_rowid='id', tokenize='porter unicode61')"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER papers_fts_ai AFTER INSERT ON papers BEGIN "
+            "INSERT INTO papers_fts(rowid, title, summary, authors) "
+            "VALUES (new.id, new.title, new.summary, new.authors); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER papers_fts_ad AFTER DELETE ON papers BEGIN "
+            "INSERT INTO papers_fts(papers_fts, rowid, title, summary, authors) "
+            "VALUES ('delete', old.id, old.title, old.summary, old.authors); END"
+        ))
+        # Only text changes touch the index; embedding-only updates skip it
+        conn.execute(text(
+            "CREATE TRIGGER papers_fts_au AFTER UPDATE OF title, summary, authors ON papers BEGIN "
+            "INSERT INTO papers_fts(papers_fts, rowid, title, summary, authors) "
+            "VALUES ('delete', old.id, old.title, old.summary, old.authors); "
+            "INSERT INTO papers_fts(rowid, title, summary, authors) "
+            "VALUES (new.id, new.title, new.summary, new.authors); END"
+        ))
+        conn.execute(text("INSERT INTO papers_fts(papers_fts) VALUES ('rebuild')"))
+    logger.info("Created papers_fts keyword index.")
+
+def _seed_trending(engine: Engine):
+    """ Fills `paper_trends` from existing library rows the first time it exists. """
+    tables = inspect(engine).get_table_names()
+    if "paper_trends" not in tables or "library" not in tables:
+        return
+    with engine.connect() as conn:
+        seeded = conn.execute(text("SELECT 1 FROM paper_trends LIMIT 1")).first()
+        saves = conn.execute(text("SELECT 1 FROM library LIMIT 1")).first()
+    if seeded or not saves:
+        return
+
+    from sqlalchemy.orm import Session
+    from app.services.trending_service import trending_service
+    with Session(engine) as db:
+        trending_service.rebuild(db)
+
+def _create_listing_indexes(engine: Engine):
+    """
+    Composite indexes behind keyset pagination (`create_all` skips indexes
+    of tables that already exist). With them a page is a range read in
+    index order instead of a scan and sort of the whole table.
+    """
+    tables = inspect(engine).get_table_names()
+    with engine.begin() as conn:
+        if "papers" in tables:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_papers_published_id ON papers (published, id)"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_papers_category_published_id ON papers (category, published, id)"
+            ))
+        if "library" in tables:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_library_user_created ON library (user_id, created_at)"))
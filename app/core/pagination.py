@@ -0,0 +1,77 @@
+import base64
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+from fastapi import HTTPException
+from app.core.config import settings
+
+# Keyset ("cursor") pagination for the list endpoints.
+# A cursor is the sort key of the last item shown, so the next page is one
+# indexed range read (or, for vector results, one capped scan) no matter how
+# deep it is. Cursors are opaque to clients: url-safe base64 of a small JSON
+# object whose fields depend on the listing.
+
+def encode_cursor(key: dict) -> str:
+    raw = json.dumps(key, separators=(",", ":"), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """ The cursor's fields, {} for no cursor. 400 if it was tampered with. """
+    if not cursor:
+        return {}
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+def cursor_field(key: dict, name: str, kind):
+    """ A typed field of a decoded cursor; 400 if it is missing or of the wrong type. """
+    value = key.get(name)
+    if kind is datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    if kind is float and isinstance(value, int):
+        value = float(value)
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Not serialisable in a cursor: {value!r}")
+
+def page_url(path: str, key: dict, **params) -> str:
+    """ Link to the page after `key` of the listing at `path` with filters `params`. """
+    return f"{path}?{urlencode({**params, 'cursor': encode_cursor(key)})}"
+
+def vector_page(snapshot, query, cursor: dict, limit: int = None, exclude_ids=(), allowed=None):
+    """
+    One page of nearest neighbours from `snapshot`, best first.
+
+    The cursor holds the lowest score shown so far and the ids shown at
+    exactly that score; the next page is the top-`limit` of rows scoring no
+    higher, minus those ids. Each page is a single scan capped at that
+    score, so page N costs the same as page one instead of re-ranking the
+    first N * limit results. `allowed` is a filter mask (see
+    CacheSnapshot.mask). Returns (paper ids, next cursor key or None).
+    """
+    limit = limit or settings.PAGE_SIZE
+    ceiling = cursor.get("s")
+    seen = list(cursor.get("x", [])) if ceiling is not None else []
+    if not isinstance(ceiling, (int, float, type(None))) or not all(isinstance(pid, int) for pid in seen):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows, scores = snapshot.search(query, limit, exclude_ids=[*exclude_ids, *seen], ceiling=ceiling, allowed=allowed)
+    ids = snapshot.ids_for(rows)
+    if len(ids) < limit:
+        return ids, None
+    last = float(scores[-1])
+    ties = [pid for pid, score in zip(ids, scores) if score == scores[-1]]
+    if ceiling is not None and last == ceiling:
+        ties += seen
+    return ids, {"s": last, "x": ties}
@@ -0,0 +1,195 @@
+import sys
+import threading
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.versions import versions
+from app.models.paper import Paper
+
+import logging
+logger = logging.getLogger(__name__)
+
+class PaperRecord:
+    """
+    What a paper list renders, without the embedding. Read-only: shared by
+    every request. Resident records have no `summary`; `hydrate` hands out
+    copies with it filled in (see `with_summary`).
+    """
+    __slots__ = ("id", "arxiv_id", "title", "authors", "published", "category", "links", "summary")
+
+    def __init__(self, id, arxiv_id, title, authors, published, category, links, summary=None):
+        self.id = id
+        self.arxiv_id = arxiv_id
+        self.title = title
+        self.authors = tuple(authors or ())
+        self.published = published
+        # A few hundred distinct values across the corpus: one string object each
+        self.category = sys.intern(category) if category else category
+        self.links = links or {}
+        self.summary = summary
+
+    def with_summary(self, summary) -> "PaperRecord":
+        record = object.__new__(PaperRecord)
+        for name in self.__slots__:
+            setattr(record, name, getattr(self, name))
+        record.summary = summary
+        return record
+
+    def __repr__(self):
+        return f"<PaperRecord {self.arxiv_id}: {self.title}>"
+
+# Plain column reads (no ORM objects, never the embedding blob, no abstracts)
+COLUMNS = (
+    Paper.id, Paper.arxiv_id, Paper.title, Paper.authors,
+    Paper.published, Paper.category, Paper.links, Paper.indexed_at,
+)
+
+class PaperStore:
+    """
+    In-memory paper metadata for rendering result lists, next to SearchCache.
+
+    Searches produce ids; hydrating them here is one dict lookup per result
+    instead of an `IN` query that builds ORM objects and is reordered in
+    Python. Loaded at startup; ingests in this or any other process are
+    picked up through `versions.papers` with a delta read on `indexed_at`.
+
+    Only the short fields are resident for every paper. Abstracts, the bulk
+    of the text, are read on first render and kept in an LRU of
+    `PAPER_SUMMARY_CACHE_SIZE`; rendered lists are cached as fragments
+    anyway. Ids the store doesn't hold (e.g. before the load finished) are
+    read from the DB into a bounded LRU of `PAPER_STORE_FALLBACK_SIZE`.
+
+    No lock is ever held across a query: under `AsyncSession.run_sync` a
+    query yields to the event loop, and a second request blocking on the
+    lock would then block the loop itself. Reads build local results that
+    are merged under `_lock`; one refresh runs at a time (`_refreshing`,
+    never waited on), and requests arriving meanwhile serve what is there.
+    """
+    def __init__(self, summary_size: int = None, fallback_size: int = None):
+        self.summary_size = summary_size or settings.PAPER_SUMMARY_CACHE_SIZE
+        self.fallback_size = fallback_size or settings.PAPER_STORE_FALLBACK_SIZE
+        self._records = {} # paper id -> PaperRecord
+        self._fallback = OrderedDict() # paper id -> PaperRecord read outside load/refresh (LRU)
+        self._summaries = OrderedDict() # paper id -> abstract (LRU)
+        self._watermark = None # Highest `indexed_at` read; None until loaded
+        self._version = None # `versions.papers` the records are current with
+        self._lock = threading.Lock() # Guards the swaps and merges only
+        self._refreshing = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def loaded(self) -> bool:
+        return self._watermark is not None
+
+    @property
+    def stale(self) -> bool:
+        return self.loaded and versions.papers != self._version
+
+    def load(self, db: Session):
+        """ Full read of the papers table (startup, on the warm-up thread). """
+        with self._refreshing:
+            # Read first: a bump during the load leaves the store stale, not silently behind
+            version = versions.papers
+            rows = db.execute(select(*COLUMNS)).all()
+            records = {row.id: self._record(row) for row in rows}
+            watermark = max((row.indexed_at for row in rows if row.indexed_at is not None), default=None)
+            with self._lock:
+                self._records, self._watermark, self._version = records, watermark, version
+                self._fallback.clear()
+                self._summaries.clear()
+        logger.info(f"Loaded metadata of {len(rows)} papers.")
+
+    def refresh(self, db: Session) -> int:
+        """
+        Delta read of the papers added or re-versioned since the last read.
+        Returns the rows read; 0 (without waiting) if a refresh is already running.
+        """
+        if self._watermark is None or not self._refreshing.acquire(blocking=False):
+            return 0
+        try:
+            version, watermark = versions.papers, self._watermark
+            # `>=` re-reads the boundary rows, so none committed in the same instant is missed
+            rows = db.execute(select(*COLUMNS).where(Paper.indexed_at >= watermark)).all()
+            records = {row.id: self._record(row) for row in rows}
+            with self._lock:
+                self._records.update(records)
+                for pid in records:
+                    self._fallback.pop(pid, None)
+                    self._summaries.pop(pid, None) # A new version may have a new abstract
+                self._watermark = max([watermark, *(row.indexed_at for row in rows if row.indexed_at is not None)])
+                self._version = version
+            return len(rows)
+        finally:
+            self._refreshing.release()
+
+    def lookup(self, paper_ids) -> tuple[list, list, list]:
+        """
+        (records for `paper_ids` in that order, summary filled in where cached;
+        ids not in the store; ids whose summary isn't cached).
+        """
+        records, missing, unsummarised = [], [], []
+        with self._lock:
+            for pid in paper_ids:
+                record = self._records.get(pid)
+                if record is None:
+                    record = self._fallback.get(pid)
+                    if record is None:
+                        missing.append(pid)
+                        continue
+                    self._fallback.move_to_end(pid)
+                summary = self._summaries.get(pid)
+                if summary is None:
+                    unsummarised.append(pid)
+                else:
+                    self._summaries.move_to_end(pid)
+                records.append(record.with_summary(summary))
+        return records, missing, unsummarised
+
+    def hydrate(self, db: Session, paper_ids) -> list[PaperRecord]:
+        """ Records for `paper_ids` with their summaries, in that order; unknown ids are dropped. """
+        if self.stale:
+            self.refresh(db)
+        records, missing, unsummarised = self.lookup(paper_ids)
+        if not missing and not unsummarised:
+            return records
+        found = {record.id: record for record in records}
+        if missing:
+            rows = db.execute(select(*COLUMNS).where(Paper.id.in_(missing))).all()
+            fallback = {row.id: self._record(row) for row in rows}
+            with self._lock:
+                self._fallback.update(fallback)
+                while len(self._fallback) > self.fallback_size:
+                    self._fallback.popitem(last=False)
+            found.update(fallback)
+            unsummarised += list(fallback)
+        summaries = {
+            pid: summary or ""
+            for pid, summary in db.execute(select(Paper.id, Paper.summary).where(Paper.id.in_(unsummarised))).all()
+        }
+        with self._lock:
+            self._summaries.update(summaries)
+            while len(self._summaries) > self.summary_size:
+                self._summaries.popitem(last=False)
+        # Built from what was just read: the LRUs may have evicted some of it already
+        return [
+            found[pid] if found[pid].summary is not None else found[pid].with_summary(summaries.get(pid, ""))
+            for pid in paper_ids if pid in found
+        ]
+
+    async def hydrate_async(self, db: AsyncSession, paper_ids) -> list[PaperRecord]:
+        """ `hydrate` for async routes: no DB round trip unless the store is behind. """
+        if not self.stale:
+            records, missing, unsummarised = self.lookup(paper_ids)
+            if not missing and not unsummarised:
+                return records
+        return await db.run_sync(self.hydrate, paper_ids)
+
+    @staticmethod
+    def _record(row) -> PaperRecord:
+        return PaperRecord(*row[:-1])
+
+paper_store = PaperStore()
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from typing import NamedTuple
+from app.core.config import settings
+import threading
+import time
+
+class Principal(NamedTuple):
+    """ What routes need to know about the authenticated user; safe to share between requests. """
+    id: int
+    email: str
+    is_active: bool
+
+class PrincipalCache:
+    """
+    Token subject (email) -> Principal, so authenticated requests skip the
+    `users` lookup. Entries expire after `PRINCIPAL_TTL_SECONDS` (picks up
+    changes made by other worker processes) and are dropped explicitly when
+    this process changes the user.
+    """
+    def __init__(self, size: int = None, ttl: float = None):
+        self.size = size or settings.PRINCIPAL_CACHE_SIZE
+        self.ttl = settings.PRINCIPAL_TTL_SECONDS if ttl is None else ttl
+        self._entries = OrderedDict() # email -> (principal, cached_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email: str):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(email)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(email, None)
+            self.misses += 1
+            return None
+
+    def put(self, principal: Principal):
+        with self._lock:
+            self._entries[principal.email] = (principal, time.monotonic())
+            self._entries.move_to_end(principal.email)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from app.core.cache import SearchCache, search_cache
+from app.core.config import settings
+from app.models.user import Library
+import numpy as np
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class UserProfile:
+    """
+    Running sum of a user's library embeddings. The mean is the
+    recommendation query; add/remove are O(d).
+    """
+    __slots__ = ("paper_ids", "pending", "total", "count", "vectors_version", "generation", "built_at")
+
+    def __init__(self, dim: int, vectors_version: int, generation: int):
+        self.paper_ids = set() # Everything in the library
+        self.pending = set() # Library papers with no cached embedding (yet)
+        self.total = np.zeros(dim, dtype=np.float64)
+        self.count = 0 # Papers contributing to `total`
+        self.vectors_version = vectors_version
+        self.generation = generation # Snapshot `pending` was last checked against
+        self.built_at = time.monotonic()
+
+    def vector(self):
+        if not self.count:
+            return None
+        return (self.total / self.count).astype(np.float32)
+
+class ProfileStore:
+    """
+    Per-user profile cache kept current by library toggles.
+    A profile is rebuilt from the DB only when first requested, after
+    `PROFILE_TTL_SECONDS` (picks up toggles made in other worker processes),
+    or when cached vectors of existing papers were rewritten.
+    """
+    def __init__(self, cache: SearchCache):
+        self.cache = cache
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> UserProfile:
+        snapshot = self.cache.snapshot
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None and self._is_fresh(profile, snapshot):
+                self._profiles.move_to_end(user_id)
+                if profile.pending and profile.generation != snapshot.generation:
+                    self._resolve_pending(profile, snapshot)
+                return profile
+
+        paper_ids = [row[0] for row in db.query(Library.paper_id).filter(Library.user_id == user_id).all()]
+        profile = self._build(paper_ids, snapshot)
+        with self._lock:
+            self._profiles[user_id] = profile
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > settings.PROFILE_CACHE_SIZE:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def query(self, db: Session, user_id: int):
+        """ (mean library vector or None, library paper ids), copied consistently. """
+        profile = self.get(db, user_id)
+        with self._lock:
+            return profile.vector(), list(profile.paper_ids)
+
+    def add(self, user_id: int, paper_id: int):
+        """ Applies a library save to a cached profile (no-op if not cached). """
+        snapshot = self.cache.snapshot
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None or paper_id in profile.paper_ids:
+                return
+            profile.paper_ids.add(paper_id)
+            row = snapshot.row_of(paper_id)
+            if row is None or profile.vectors_version != snapshot.vectors_version:
+                profile.pending.add(paper_id)
+            else:
+                profile.total += snapshot.embeddings[row]
+                profile.count += 1
+
+    def remove(self, user_id: int, paper_id: int):
+        """ Applies a library removal to a cached profile (no-op if not cached). """
+        snapshot = self.cache.snapshot
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None or paper_id not in profile.paper_ids:
+                return
+            profile.paper_ids.discard(paper_id)
+            if paper_id in profile.pending:
+                profile.pending.discard(paper_id)
+                return
+            row = snapshot.row_of(paper_id)
+            if row is None or profile.vectors_version != snapshot.vectors_version:
+                # Can't subtract the exact vector that was added: rebuild on next read
+                self._profiles.pop(user_id, None)
+                return
+            profile.total -= snapshot.embeddings[row]
+            profile.count -= 1
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._profiles.pop(user_id, None)
+
+    @staticmethod
+    def _is_fresh(profile: UserProfile, snapshot) -> bool:
+        return (
+            profile.vectors_version == snapshot.vectors_version
+            and time.monotonic() - profile.built_at < settings.PROFILE_TTL_SECONDS
+        )
+
+    @staticmethod
+    def _build(paper_ids, snapshot) -> UserProfile:
+        dim = snapshot.embeddings.shape[1] if len(snapshot) else 0
+        profile = UserProfile(dim, snapshot.vectors_version, snapshot.generation)
+        profile.paper_ids = set(paper_ids)
+        if paper_ids and len(snapshot):
+            rows = snapshot.rows_of(paper_ids)
+            profile.total = snapshot.embeddings[rows].sum(axis=0, dtype=np.float64)
+            profile.count = len(rows)
+            profile.pending = profile.paper_ids - set(snapshot.ids_for(rows))
+        else:
+            profile.pending = set(profile.paper_ids)
+        return profile
+
+    @staticmethod
+    def _resolve_pending(profile: UserProfile, snapshot):
+        """ Folds in library papers whose embeddings have since been appended to the cache. """
+        profile.generation = snapshot.generation
+        if not len(snapshot):
+            return
+        rows = snapshot.rows_of(list(profile.pending))
+        if not len(rows):
+            return
+        if profile.total.shape[0] != snapshot.embeddings.shape[1]:
+            profile.total = np.zeros(snapshot.embeddings.shape[1], dtype=np.float64)
+        profile.total += snapshot.embeddings[rows].sum(axis=0, dtype=np.float64)
+        profile.count += len(rows)
+        profile.pending -= set(snapshot.ids_for(rows))
+
+profile_store = ProfileStore(search_cache)
@@ -1,11 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
+import asyncio
+import multiprocessing
 import os
 import secrets
+import threading
 
 # Configuration
 # For a personal project/Github demo, we allow a default, but in prod this comes from ENV
@@ -30,3 +35,73 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+class HashPool:
+    """
+    bcrypt on a small dedicated process pool, so a burst of logins neither
+    blocks the event loop nor fills the threadpool other routes rely on.
+    At most `queue_size` hashes wait for a worker; past that, requests get
+    503 rather than queueing without bound.
+    """
+    def __init__(self, workers: int = None, queue_size: int = None):
+        self.workers = workers or settings.AUTH_HASH_WORKERS
+        self.queue_size = settings.AUTH_HASH_QUEUE_SIZE if queue_size is None else queue_size
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0 # Submitted, not finished (running + queued)
+        self.max_pending = 0
+        self.completed = 0 # Returned a result
+        self.failed = 0 # Raised, or the request was cancelled while waiting
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many logins in progress, try again shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+            if self._executor is None:
+                # spawn: forking a process that already runs threads (warm-up, writer) isn't safe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            result = await asyncio.wrap_future(self._executor.submit(fn, *args))
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+            raise
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": min(self.pending, self.workers),
+                "queue_depth": max(0, self.pending - self.workers),
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+hash_pool = HashPool()
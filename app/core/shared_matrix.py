@@ -0,0 +1,211 @@
+import json
+import os
+import contextlib
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows: single-process deployments only
+    fcntl = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+class SharedMatrix:
+    """
+    Publishes the search matrix as memory-mapped files that every worker
+    process attaches to zero-copy, so N workers share one copy in the page
+    cache instead of holding N private ones.
+
+    Layout of `directory`:
+        manifest.json         {"generation", "segment", "rows", "capacity", "dim", "watermark",
+                               "vectors_version", "columns", "index", ...}
+        ids.<seg>.npy         sorted int64 paper ids
+        embeddings.<seg>.npy  L2-normalised float32 (capacity, dim)
+        <column>.<seg>.npy    optional per-row arrays named in "columns"
+
+    A publish writes a new segment with spare (sparse) capacity; `append`
+    then writes new rows past the live ones in place, so an ingest costs its
+    own rows rather than a copy of the matrix. Only the first `rows` rows of
+    a segment are ever read, and the manifest is replaced atomically after
+    the files are written, so readers only ever see complete rows.
+    `generation` is the cross-process counter workers poll to pick up
+    another process's changes; every publish, append and `set_index` bumps it.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._held = threading.local() # flock isn't re-entrant across open() calls
+
+    @contextlib.contextmanager
+    def lock(self):
+        """ Exclusive across processes; serialises publishes and startup loads. Re-entrant. """
+        depth = getattr(self._held, "depth", 0)
+        if depth:
+            self._held.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._held.depth = depth
+            return
+        with open(os.path.join(self.directory, "lock"), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            self._held.depth = 1
+            try:
+                yield
+            finally:
+                self._held.depth = 0
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def manifest(self):
+        """ The current manifest, or None if nothing was published yet. """
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def generation(self):
+        manifest = self.manifest()
+        return manifest["generation"] if manifest else None
+
+    def publish(self, ids: np.ndarray, embeddings: np.ndarray, watermark=None, vectors_version: int = 0,
+                columns: dict = None, meta: dict = None, capacity: int = 0) -> dict:
+        """
+        Writes a new segment with room for `capacity` rows and makes it
+        current. Returns its manifest. `columns` are extra per-row arrays;
+        `meta` extra JSON manifest fields.
+        """
+        columns = columns or {}
+        rows = len(ids)
+        capacity = max(capacity, rows)
+        with self.lock():
+            current = self.manifest()
+            generation = (current["generation"] if current else 0) + 1
+            self._save(f"ids.{generation}.npy", np.asarray(ids, dtype=np.int64), capacity)
+            self._save(f"embeddings.{generation}.npy", embeddings, capacity)
+            for name, column in columns.items():
+                self._save(f"{name}.{generation}.npy", column, capacity)
+            manifest = {
+                **(meta or {}),
+                "generation": generation,
+                "segment": generation,
+                "rows": int(rows),
+                "capacity": int(capacity),
+                "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+                "watermark": None if watermark is None else str(watermark),
+                "vectors_version": vectors_version,
+                "columns": sorted(columns),
+            }
+            self._write_manifest(manifest)
+            # The previous segment is kept for workers still opening it
+            self._remove_older_than(current.get("segment", current["generation"]) if current else generation)
+        return manifest
+
+    def append(self, segment: int, rows: int, ids: np.ndarray, embeddings: np.ndarray, watermark=None,
+               columns: dict = None, meta: dict = None) -> dict:
+        """
+        Writes rows in place after the first `rows` of `segment` and makes
+        them current. Returns the new manifest, or None if the segment was
+        superseded, has grown meanwhile or has no room left: the caller then
+        publishes a new segment. Mappings of the previous manifest never
+        look past its `rows`, so they are unaffected.
+        """
+        columns = columns or {}
+        with self.lock():
+            current = self.manifest()
+            if (
+                current is None or current.get("segment") != segment or current["rows"] != rows
+                or rows + len(ids) > current.get("capacity", rows) or sorted(columns) != current["columns"]
+            ):
+                return None
+            self._write_rows(f"ids.{segment}.npy", rows, ids)
+            self._write_rows(f"embeddings.{segment}.npy", rows, embeddings)
+            for name, column in columns.items():
+                self._write_rows(f"{name}.{segment}.npy", rows, column)
+            manifest = {
+                **current,
+                **(meta or {}),
+                "generation": current["generation"] + 1,
+                "rows": int(rows + len(ids)),
+                "watermark": None if watermark is None else str(watermark),
+            }
+            self._write_manifest(manifest)
+        return manifest
+
+    def set_index(self, segment: int, index_meta: str) -> dict:
+        """
+        Records that the ANN index persisted under `index_meta` covers a
+        prefix of `segment`, so other workers load it instead of building
+        their own. Returns the new manifest, or None if the segment was
+        superseded.
+        """
+        with self.lock():
+            current = self.manifest()
+            if current is None or current.get("segment") != segment:
+                return None
+            manifest = {**current, "generation": current["generation"] + 1, "index": index_meta}
+            self._write_manifest(manifest)
+        return manifest
+
+    def attach(self):
+        """
+        Maps the live rows of the current segment read-only. Returns
+        (manifest, ids, embeddings, columns), or None if nothing was
+        published yet.
+        """
+        for _ in range(3):
+            manifest = self.manifest()
+            if manifest is None:
+                return None
+            segment, rows = manifest.get("segment", manifest["generation"]), manifest["rows"]
+            try:
+                ids = np.load(self._path(f"ids.{segment}.npy"), mmap_mode="r")[:rows]
+                embeddings = np.load(self._path(f"embeddings.{segment}.npy"), mmap_mode="r")[:rows]
+                columns = {
+                    name: np.load(self._path(f"{name}.{segment}.npy"), mmap_mode="r")[:rows]
+                    for name in manifest.get("columns", [])
+                }
+            except FileNotFoundError:
+                continue # Superseded and cleaned up while we read the manifest: retry
+            return manifest, ids, embeddings, columns
+        return None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _save(self, name: str, array: np.ndarray, capacity: int):
+        tmp_path = self._path(f"{name}.tmp")
+        # open_memmap extends the file by seeking, so the spare rows are a sparse hole
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=array.dtype, shape=(capacity, *array.shape[1:]))
+        out[:len(array)] = array
+        out.flush()
+        del out
+        os.replace(tmp_path, self._path(name))
+
+    def _write_rows(self, name: str, start: int, values: np.ndarray):
+        out = np.load(self._path(name), mmap_mode="r+")
+        out[start:start + len(values)] = values
+        out.flush()
+        del out
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _remove_older_than(self, segment: int):
+        # Mappings held by other workers stay valid after unlink (POSIX)
+        for name in os.listdir(self.directory):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[2] == "npy" and parts[1].isdigit():
+                if int(parts[1]) < segment:
+                    try:
+                        os.remove(self._path(name))
+                    except OSError as e:
+                        logger.warning(f"Could not remove old shared matrix file {name}: {e}")
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Embeddings are stored as packed little-endian float32 blobs (384 dims -> 1536 bytes)
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+def pack_embedding(vector) -> bytes:
+    """ Packs a vector (list or ndarray) into the binary format stored in `Paper.embedding`. """
+    return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+def unpack_embedding(blob: bytes) -> np.ndarray:
+    """ Inverse of `pack_embedding` for a single row. """
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+def unpack_embeddings(blobs) -> np.ndarray:
+    """
+    Turns a sequence of packed blobs into an (n, dim) float32 matrix.
+    The blobs are joined once and viewed in place, so there is no per-row
+    decoding and no intermediate float64 copy. The result is read-only.
+    """
+    if not blobs:
+        return np.empty((0, 0), dtype=EMBEDDING_DTYPE)
+    row_bytes = len(blobs[0])
+    if row_bytes == 0 or row_bytes % EMBEDDING_DTYPE.itemsize:
+        raise ValueError(f"Invalid embedding blob size: {row_bytes} bytes")
+    buf = b"".join(blobs)
+    if len(buf) != row_bytes * len(blobs):
+        raise ValueError("Embedding blobs have inconsistent dimensions")
+    dim = row_bytes // EMBEDDING_DTYPE.itemsize
+    return np.frombuffer(buf, dtype=EMBEDDING_DTYPE).reshape(len(blobs), dim)
+
+def l2_normalize(matrix: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """ Scales rows (or a single vector) to unit length; zero rows are left as-is. """
+    matrix = np.asarray(matrix, dtype=EMBEDDING_DTYPE)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.divide(matrix, norms, out=out)
+
+def top_k(scores: np.ndarray, k: int, exclude=None) -> np.ndarray:
+    """
+    Positions of the k highest scores, best first.
+    `np.argpartition` selects in O(n); only the k winners get sorted.
+    `exclude` positions, and positions scored -inf (see `cap_scores`), are
+    never returned.
+    """
+    if exclude is not None and len(exclude):
+        scores = scores.copy()
+        scores[exclude] = -np.inf
+        k = min(k, len(scores) - len(np.unique(exclude)))
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    part = part[np.argsort(-scores[part], kind="stable")]
+    return part[scores[part] > -np.inf]
+
+def cap_scores(scores: np.ndarray, ceiling=None, allowed=None) -> np.ndarray:
+    """
+    Drops (in place, to -inf) scores above `ceiling`, i.e. rows a page cursor
+    has already passed, and scores of rows outside the boolean `allowed` mask
+    (a search filter, see app.core.filters).
+    """
+    if ceiling is not None:
+        scores[scores > ceiling] = -np.inf
+    if allowed is not None:
+        scores[~allowed] = -np.inf
+    return scores
+
+def exact_search(matrix: np.ndarray, query: np.ndarray, k: int, exclude=None, ceiling=None, allowed=None):
+    """
+    Cosine top-k over an L2-normalised matrix: one GEMV (or GEMM for a batch
+    of queries) plus `top_k`. Returns (rows, scores); for a 2-D query batch
+    both are lists with one array per query. With `ceiling`, only rows
+    scoring at most that are considered, and with `allowed` only the rows
+    it marks (single queries only).
+    """
+    query = l2_normalize(query)
+    scores = matrix @ query.T
+    if query.ndim == 1:
+        rows = top_k(cap_scores(scores, ceiling, allowed), k, exclude)
+        return rows, scores[rows]
+    results = [top_k(column, k, exclude) for column in scores.T]
+    return results, [column[rows] for column, rows in zip(scores.T, results)]
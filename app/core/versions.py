@@ -0,0 +1,141 @@
+import contextlib
+import os
+import secrets
+import threading
+import numpy as np
+from fastapi import Request, Response
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError: # Windows: single-process deployments only
+    fcntl = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+class VersionCounters:
+    """
+    Cheap data-version counters behind the ETags of polled endpoints.
+
+    The counters are int64 slots in a small memory-mapped file, so every
+    worker process (and ingest scripts) bumps and reads the same values
+    without touching the database; a read is one memory load. Without a
+    path they are private to the process.
+
+    Layout:
+        epoch    random, set when the file is created; a recreated file
+                 never reissues an ETag a client already holds
+        papers   bumped when papers are ingested or the search index reloads
+        saves    bumped on every library toggle (trending input)
+        users    one slot per user id (modulo `user_slots`); a collision
+                 only costs a spurious full response, never a wrong 304
+    """
+    EPOCH, PAPERS, SAVES = 0, 1, 2
+    USER_BASE = 16
+
+    def __init__(self, path: str = None, user_slots: int = 65536):
+        self.path = path
+        self.user_slots = user_slots
+        self._counts = None
+        self._fd = None
+        self._lock = threading.Lock()
+
+    @property
+    def counts(self) -> np.ndarray:
+        if self._counts is None:
+            with self._lock:
+                if self._counts is None:
+                    self._counts = self._open()
+        return self._counts
+
+    def _open(self) -> np.ndarray:
+        size = self.USER_BASE + self.user_slots
+        if self.path is None:
+            counts = np.zeros(size, dtype="<i8")
+            counts[self.EPOCH] = secrets.randbits(48)
+            return counts
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._exclusive():
+            if os.fstat(self._fd).st_size < size * 8:
+                os.ftruncate(self._fd, size * 8) # Zero-filled
+            counts = np.memmap(self.path, dtype="<i8", mode="r+", shape=(size,))
+            if not counts[self.EPOCH]:
+                counts[self.EPOCH] = secrets.randbits(48)
+                counts.flush()
+        return counts
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """ Exclusive across processes (no-op for private counters). """
+        if self._fd is None or fcntl is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def papers(self) -> int:
+        return int(self.counts[self.PAPERS])
+
+    @property
+    def saves(self) -> int:
+        return int(self.counts[self.SAVES])
+
+    def user(self, user_id: int) -> int:
+        return int(self.counts[self._user_slot(user_id)])
+
+    def bump_papers(self):
+        self._increment(self.PAPERS)
+
+    def bump_saves(self):
+        self._increment(self.SAVES)
+
+    def bump_library(self, user_id: int):
+        """ A user's library changed: their library version and the global save version move. """
+        self._increment(self._user_slot(user_id), self.SAVES)
+
+    def _user_slot(self, user_id: int) -> int:
+        return self.USER_BASE + user_id % self.user_slots
+
+    def _increment(self, *slots):
+        counts = self.counts
+        # Read-modify-write under the file lock: two processes never hand out the same version
+        with self._lock, self._exclusive():
+            for slot in slots:
+                counts[slot] += 1
+
+    def etag(self, *parts) -> str:
+        """ Weak ETag over the epoch, the deployed templates and the given version numbers. """
+        return 'W/"' + "-".join(str(part) for part in (int(self.counts[self.EPOCH]), RELEASE, *parts)) + '"'
+
+def _release() -> str:
+    """ Changes when a deploy changes the templates, so pages cached before it aren't kept. """
+    directory = os.path.join(settings.BASE_DIR, "app", "templates")
+    stamps = [
+        int(os.path.getmtime(os.path.join(root, name)))
+        for root, _, names in os.walk(directory) for name in names
+    ]
+    return f"{settings.PROJECT_VERSION}.{max(stamps, default=0)}"
+
+RELEASE = _release()
+
+def not_modified(request: Request, etag: str, cache_control: str = "no-cache"):
+    """ A 304 if the client's If-None-Match already has `etag`, else None (render, then `with_etag`). """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    candidates = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    # Weak comparison: proxies may strip or add the W/ prefix
+    if "*" in candidates or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in candidates):
+        return Response(status_code=304, headers=headers)
+    return None
+
+def with_etag(response: Response, etag: str, cache_control: str = "no-cache") -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+versions = VersionCounters(settings.VERSIONS_PATH)
@@ -0,0 +1,57 @@
+import threading
+import time
+from app.core.config import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Warmup:
+    """
+    Loads the slow pieces (search index, embedding model) on background
+    threads after startup, so the server accepts traffic immediately.
+    Keeps the startup timing report and the flags behind /readyz.
+    """
+    COMPONENTS = ("index", "model")
+
+    def __init__(self):
+        self.timings = {} # phase -> seconds
+        self.ready = {name: False for name in self.COMPONENTS}
+        self.errors = {}
+        self._started = None
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float):
+        self.timings[phase] = round(seconds, 3)
+
+    @property
+    def is_ready(self) -> bool:
+        return all(self.ready.values())
+
+    def start(self, load_index, load_model=None):
+        """ Runs each loader on its own thread; they overlap each other and serving. """
+        self._started = time.perf_counter()
+        threading.Thread(target=self._run, args=("index", load_index), name="warmup-index", daemon=True).start()
+        if load_model is not None:
+            threading.Thread(target=self._run, args=("model", load_model), name="warmup-model", daemon=True).start()
+        else:
+            self.ready["model"] = True
+
+    def _run(self, name: str, loader):
+        start = time.perf_counter()
+        try:
+            loader()
+            with self._lock:
+                self.ready[name] = True
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {e}")
+            self.errors[name] = str(e)
+        self.record(name, time.perf_counter() - start)
+        with self._lock:
+            if self.is_ready and "ready" not in self.timings:
+                self.record("ready", time.perf_counter() - self._started)
+                logger.info(f"Startup timing: {self.report()['timings']}")
+
+    def report(self) -> dict:
+        return {"ready": self.is_ready, "components": dict(self.ready), "timings": dict(self.timings), "errors": dict(self.errors)}
+
+warmup = Warmup()
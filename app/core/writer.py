@@ -0,0 +1,93 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+import logging
+logger = logging.getLogger(__name__)
+
+class DatabaseWriter:
+    """
+    Runs every write in this process on one thread with one connection.
+
+    `submit(fn, *args)` queues `fn(db, *args)`; the writer runs it in its own
+    transaction, commits, and resolves the returned future with fn's result
+    (or its exception, after a rollback). Writers therefore never contend
+    for SQLite's lock with each other, and a full queue applies
+    backpressure instead of failing with "database is locked": `submit`
+    blocks, `run_async` waits without blocking the event loop and gives up
+    with a 503 after `wait_seconds`.
+    """
+    def __init__(self, session_factory=SessionLocal, queue_size: int = 1000, wait_seconds: float = None):
+        self.session_factory = session_factory
+        self.wait_seconds = settings.WRITE_QUEUE_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def run(self, fn, *args):
+        """ Blocking submit, for sync routes and scripts. """
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn, *args):
+        """ Awaitable submit, for async routes. Never blocks the loop on a full queue. """
+        self._ensure_started()
+        future = Future()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_seconds
+        delay = 0.001
+        while True:
+            try:
+                self._queue.put_nowait((fn, args, future))
+                break
+            except queue.Full:
+                if loop.time() >= deadline:
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Too many writes in progress, try again shortly.",
+                        headers={"Retry-After": "1"},
+                    )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        return await asyncio.wrap_future(future)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        with self.session_factory() as db:
+            while True:
+                fn, args, future = self._queue.get()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = fn(db, *args)
+                    db.commit()
+                except BaseException as e:
+                    db.rollback()
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                finally:
+                    # Nothing from one write leaks into the next
+                    db.expunge_all()
+
+db_writer = DatabaseWriter(SessionLocal, settings.WRITE_QUEUE_SIZE)
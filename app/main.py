@@ -1,26 +1,49 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, Request, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from datetime import datetime
+from urllib.parse import urlencode
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db, SessionLocal
 from app.models.paper import Paper
-from app.services.embedding_service import get_embedder
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from app.services.embedding_service import embedder_loaded
+from app.services.query_encoder import query_encoder
+from app.services.search_service import keyword_page, keyword_search, reciprocal_rank_fusion
+import asyncio
 import logging
 
 # Logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from app.routers import auth, library, recommend, hype
-from fastapi.responses import RedirectResponse
+from app.routers import auth, library, recommend, hype, ai
+from fastapi.responses import JSONResponse, RedirectResponse
 from app.core.database import engine, Base
+from app.core.migrations import run_migrations
 from app.core.cache import search_cache
+from app.core.filters import NO_FILTER, PaperFilter, paper_filter
+from app.core.fragments import fragment_cache
+from app.core.pagination import cursor_field, decode_cursor, page_url, vector_page
+from app.core.paper_store import paper_store
+from app.core.versions import not_modified, versions, with_etag
+from app.core.principals import principal_cache
+from app.core.security import hash_pool
+from app.services.explanation_service import explanation_service
+from app.core.warmup import warmup
+
+warmup.record("imports", time.perf_counter() - _import_started)
 
 # Create tables
+_migrations_started = time.perf_counter()
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+warmup.record("migrations", time.perf_counter() - _migrations_started)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -56,90 +79,230 @@ app.include_router(auth.router)
 app.include_router(library.router)
 app.include_router(recommend.router)
 app.include_router(hype.router)
+app.include_router(ai.router)
 
 @app.on_event("startup")
 def startup_event():
-    db = next(get_db())
-    search_cache.load(db)
+    # Index and model load in the background; /readyz reports when they're done
+    warmup.start(load_index, load_model if settings.WARMUP_MODEL else None)
+    warmup.record("startup", time.perf_counter() - _import_started)
+    if settings.AI_PREGENERATE_INTERVAL_SECONDS > 0:
+        asyncio.get_event_loop().create_task(
+            explanation_service.run_pregeneration(settings.AI_PREGENERATE_INTERVAL_SECONDS)
+        )
+
+@app.on_event("shutdown")
+def shutdown_event():
+    hash_pool.shutdown()
+
+def load_index():
+    with SessionLocal() as db:
+        search_cache.load_or_attach(db)
+        paper_store.load(db)
+    # Fragments rendered during warm-up (e.g. an empty /similar) predate the index
+    fragment_cache.bump()
+    versions.bump_papers()
+
+def load_model():
+    # One encode also warms up the inference path (and the batching thread)
+    query_encoder.encode("warm-up")
+
+def model_warming_up() -> bool:
+    return settings.WARMUP_MODEL and not embedder_loaded() and "model" not in warmup.errors
+
+@app.get("/healthz")
+async def healthz():
+    """ Liveness: the process is up and serving. """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """ Readiness: search index and embedding model are loaded. 503 until then. """
+    return JSONResponse(warmup.report(), status_code=200 if warmup.is_ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """ Query encoder batching, principal cache and password-hash pool counters. """
+    return {
+        "query_encoder": query_encoder.metrics(),
+        "principal_cache": principal_cache.metrics(),
+        "hash_pool": hash_pool.metrics(),
+    }
 
 @app.get("/")
-async def index(request: Request, db: Session = Depends(get_db)):
-    # Recent papers
-    papers = db.query(Paper).order_by(Paper.published.desc()).limit(30).all()
-    return templates.TemplateResponse("index.html", {
-        "request": request, 
-        "papers": papers
-    })
+async def index(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Revalidation against the paper version: 304 without a query or a render
+    etag = versions.etag(versions.papers)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    # Recent papers (rendered once per data version)
+    async def context():
+        return {"request": request, **await recent_page(db, {})}
+    response = await fragment_cache.render(templates, "index.html", ("index",), context)
+    return with_etag(response, etag)
+
+async def recent_page(db: AsyncSession, key: dict, flt: PaperFilter = NO_FILTER) -> dict:
+    """
+    One page of the newest papers (matching `flt`) as template context.
+    Keyset-paged on (published, id) over ix_papers_published_id, or
+    ix_papers_category_published_id for a category feed: every page is a
+    range read. Papers without a `published` date aren't listed: they have
+    no place in the order, and a NULL key could not continue a page.
+    """
+    # Keys only (read from the index); the rest comes from the metadata store
+    query = select(Paper.published, Paper.id).filter(Paper.published.isnot(None), *flt.conditions(Paper)) \
+        .order_by(Paper.published.desc(), Paper.id.desc())
+    if key:
+        after = (cursor_field(key, "p", datetime), cursor_field(key, "i", int))
+        query = query.filter(tuple_(Paper.published, Paper.id) < tuple_(*after))
+    keys = (await db.execute(query.limit(settings.PAGE_SIZE))).all()
+    papers = await papers_by_ids(db, [row.id for row in keys])
+    next_url = None
+    if len(keys) == settings.PAGE_SIZE:
+        next_url = page_url("/search", {"p": keys[-1].published, "i": keys[-1].id}, **flt.params())
+    return {"papers": papers, "next_url": next_url, "continued": bool(key)}
+
+async def papers_by_ids(db: AsyncSession, top_ids):
+    """ Papers for `top_ids`, in that order, from the in-memory metadata store. """
+    return await paper_store.hydrate_async(db, top_ids)
 
 @app.get("/search")
-async def search(request: Request, q: str = "", db: Session = Depends(get_db)):
+async def search(request: Request, q: str = "", mode: str = Query("hybrid", pattern="^(hybrid|semantic|keyword)$"),
+                 cursor: str = "", flt: PaperFilter = Depends(paper_filter), db: AsyncSession = Depends(get_async_db)):
+    """
+    mode=hybrid (default) fuses BM25 keyword hits with semantic neighbours,
+    so exact terms like model names still surface; `semantic` and `keyword`
+    use one ranker only. `category` / `since` / `until` restrict every mode
+    before ranking (see app.core.filters). Results are paged with `cursor`
+    (see app.core.pagination): `semantic` and `keyword` pages continue their
+    ranking without rescoring it; `hybrid` pages are offsets into one fused
+    pool of at most SEARCH_CANDIDATES hits per ranker (see step 3).
+    """
+    key = decode_cursor(cursor)
     if not q:
         # Return recent if empty query
-        papers = db.query(Paper).order_by(Paper.published.desc()).limit(30).all()
-        return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": papers})
-
-    # 1. Semantic Search
-    if search_cache.loaded:
-        import asyncio
-        loop = asyncio.get_event_loop()
-
-        # Define the CPU-bound operation
-        def cpu_bound_search(query_text, embeddings, ids):
-            embedder = get_embedder() # Lightweight singleton access
-            q_emb = embedder.model.encode(query_text)
-            sim_scores = cosine_similarity(q_emb.reshape(1, -1), embeddings)[0]
-            top_indices = np.argsort(sim_scores)[::-1][:30]
-            return [ids[i] for i in top_indices]
-
-        # Run in threadpool so we don't block the server loop
-        top_ids = await loop.run_in_executor(None, cpu_bound_search, q, search_cache.embeddings, search_cache.ids)
-        
-        # Fetch papers (preserve order)
-        # SQL `IN` doesn't preserve order, so we fetch and sort in python
-        papers = db.query(Paper).filter(Paper.id.in_(top_ids)).all()
-        papers_map = {p.id: p for p in papers}
-        ordered_papers = [papers_map[pid] for pid in top_ids if pid in papers_map]
-        
-        return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": ordered_papers})
-    
+        async def context():
+            return {"request": request, **await recent_page(db, key, flt)}
+        return await fragment_cache.render(templates, "partials/paper_list.html", ("recent", cursor, flt), context)
+
+    snapshot = search_cache.snapshot
+    if not len(snapshot) or model_warming_up():
+        # No embeddings (or reload failed), or still warming up: keyword only
+        mode = "keyword"
+    if key and key.get("m") != mode:
+        key = {} # Issued for another mode (e.g. before warm-up finished): start over
+    next_key = None
+
+    # 1. Semantic Search (started first, so it overlaps the keyword query)
+    semantic = None
+    if mode in ("hybrid", "semantic"):
+        async def semantic_search():
+            # Batched with concurrent queries; popular queries come from the cache
+            q_emb = await query_encoder.encode_async(q)
+            # The filter applies before top-k, so narrow filters still fill the page
+            allowed = snapshot.mask(flt)
+            if mode == "semantic":
+                # Continues below the last score shown, without re-ranking earlier pages
+                return await run_in_threadpool(vector_page, snapshot, q_emb, key, allowed=allowed)
+            top_indices, _ = await run_in_threadpool(
+                snapshot.search, q_emb, settings.SEARCH_CANDIDATES, allowed=allowed,
+            )
+            return snapshot.ids_for(top_indices), None
+
+        semantic = asyncio.ensure_future(semantic_search())
+
+    # 2. Keyword Search (FTS5 / BM25)
+    keyword_ids = []
+    if mode == "keyword":
+        after = (cursor_field(key, "r", float), cursor_field(key, "i", int)) if key else None
+        hits = await db.run_sync(keyword_page, q, settings.PAGE_SIZE, after, flt)
+        keyword_ids = [pid for pid, _ in hits]
+        if len(hits) == settings.PAGE_SIZE:
+            next_key = {"r": hits[-1][1], "i": hits[-1][0]}
+    elif mode == "hybrid":
+        keyword_ids = await db.run_sync(keyword_search, q, settings.SEARCH_CANDIDATES, flt)
+    semantic_ids = []
+    if semantic is not None:
+        semantic_ids, next_key = await semantic
+
+    # 3. Fuse
+    notice = None
+    if mode == "hybrid":
+        # Hybrid pages are offsets into the fused pool, and every page re-runs
+        # both searches to rebuild it. Neither ranker can continue on its own:
+        # a paper's RRF score needs its rank in both lists. The pool holds the
+        # top SEARCH_CANDIDATES of each ranker; past it, say so and point at the
+        # single-ranker modes, which page through their whole ranking.
+        offset = cursor_field(key, "o", int) if key else 0
+        fused = reciprocal_rank_fusion([semantic_ids, keyword_ids], k=settings.RRF_K, limit=2 * settings.SEARCH_CANDIDATES)
+        top_ids = fused[offset:offset + settings.PAGE_SIZE]
+        if len(fused) > offset + settings.PAGE_SIZE:
+            next_key = {"o": offset + settings.PAGE_SIZE}
+        elif max(len(semantic_ids), len(keyword_ids)) >= settings.SEARCH_CANDIDATES:
+            notice = {
+                "text": f"End of the {len(fused)} best hybrid matches. For more, continue with",
+                "links": [
+                    (name, f"/search?{urlencode({'q': q, 'mode': name, **flt.params()})}")
+                    for name in ("semantic", "keyword")
+                ],
+            }
     else:
-        # Fallback to simple Keyword match if no embeddings (or reload failed)
-        papers = db.query(Paper).filter(Paper.title.contains(q)).limit(30).all()
-        return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": papers})
+        top_ids = semantic_ids or keyword_ids
+        
+    # Fetch papers (preserve order)
+    ordered_papers = await papers_by_ids(db, top_ids)
+    next_url = page_url("/search", {**next_key, "m": mode}, q=q, mode=mode, **flt.params()) if next_key else None
+
+    return templates.TemplateResponse("partials/paper_list.html", {
+        "request": request, "papers": ordered_papers, "next_url": next_url, "continued": bool(key),
+        "notice": notice,
+    })
 
 @app.get("/similar/{paper_id}")
-async def similar(request: Request, paper_id: int, db: Session = Depends(get_db)):
-    # 1. Find the target paper
-    target_paper = db.query(Paper).filter(Paper.id == paper_id).first()
-    if not target_paper or not search_cache.loaded:
-        return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": []})
-        
-    # 2. Get its index in cache
-    try:
-        idx = search_cache.ids.index(paper_id)
-    except ValueError:
-        return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": []})
-
-    # 3. Compute similarity
-    target_emb = search_cache.embeddings[idx]
-    sim_scores = cosine_similarity(target_emb.reshape(1, -1), search_cache.embeddings)[0]
-    
-    # 4. Top N (exclude self)
-    top_indices = np.argsort(sim_scores)[::-1][1:31] # Skip index 0 (self)
-    
-    top_ids = [search_cache.ids[i] for i in top_indices]
-    
-    papers = db.query(Paper).filter(Paper.id.in_(top_ids)).all()
-    papers_map = {p.id: p for p in papers}
-    ordered_papers = [papers_map[pid] for pid in top_ids if pid in papers_map]
+async def similar(request: Request, paper_id: int, flt: PaperFilter = Depends(paper_filter),
+                  db: AsyncSession = Depends(get_async_db)):
+    async def context():
+        return {"request": request, "papers": await similar_papers(db, paper_id, flt)}
+    return await fragment_cache.render(templates, "partials/paper_list.html", ("similar", paper_id, flt), context)
+
+async def similar_papers(db: AsyncSession, paper_id: int, flt: PaperFilter = NO_FILTER):
+    # 1-2. Find the target paper's row in the cache (binary search over the sorted ids)
+    snapshot = search_cache.snapshot
+    idx = snapshot.row_of(paper_id)
+    if idx is None:
+        return []
+
+    # 3. Nearest neighbours through the shared index, excluding the paper itself
+    # (by id, so exact duplicates of it are still returned), among papers matching `flt`
+    target_emb = snapshot.embeddings[idx]
+    top_indices, _ = snapshot.search(target_emb, 30, exclude_ids=[paper_id], allowed=snapshot.mask(flt))
     
-    return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": ordered_papers})
+    top_ids = snapshot.ids_for(top_indices)
+    return await papers_by_ids(db, top_ids)
 
 @app.post("/reload")
-async def reload_cache(db: Session = Depends(get_db)):
-    """Reloads the in-memory embedding cache."""
-    search_cache.load(db)
-    return {"message": "Cache reloaded", "count": len(search_cache.ids)}
+async def reload_cache(full: bool = False):
+    """
+    Refreshes the in-memory embedding cache.
+    By default only papers added or re-versioned since the last load are
+    applied; `?full=true` forces a complete rebuild.
+    """
+    def reload():
+        # Decoding and normalising vectors is CPU work, so it runs in the
+        # threadpool with its own session rather than on the event loop
+        with SessionLocal() as db:
+            if full:
+                search_cache.load(db)
+                return len(search_cache.snapshot)
+            return search_cache.refresh(db)
+
+    applied = await run_in_threadpool(reload)
+    if applied:
+        fragment_cache.bump()
+        versions.bump_papers()
+    return {"message": "Cache reloaded", "applied": applied, "count": len(search_cache.snapshot)}
 
 @app.get("/login-page")
 async def login_page(request: Request):
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from datetime import datetime
+from app.core.database import Base
+
+class Explanation(Base):
+    """
+    Generated AI explanation, one per paper version and prompt version, so
+    a re-versioned paper or a changed prompt gets a fresh one.
+    """
+    __tablename__ = "explanations"
+
+    paper_id = Column(Integer, ForeignKey("papers.id"), primary_key=True)
+    version = Column(Integer, primary_key=True) # Paper.version (arXiv vN) it was generated from
+    prompt_version = Column(Integer, primary_key=True)
+    content = Column(Text) # HTML fragment
+    created_at = Column(DateTime, default=datetime.utcnow)
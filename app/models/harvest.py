@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from datetime import datetime
+from app.core.database import Base
+
+class HarvestCheckpoint(Base):
+    """ Resume point for a paged arXiv backfill, one row per search query. """
+    __tablename__ = "harvest_checkpoints"
+
+    query = Column(String, primary_key=True)
+    next_start = Column(Integer, default=0) # Offset of the next page to request
+    total_results = Column(Integer, nullable=True) # As reported by the API
+    completed = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, LargeBinary, Index
+from sqlalchemy.orm import deferred
 from app.core.database import Base
 from datetime import datetime
 
@@ -20,9 +21,20 @@ class Paper(Base):
     links = Column(JSON) # Stores pdf, abs links
     
     # Metadata for the "Modern" twist
-    embedding = Column(JSON) # Store as list of floats (simplest approach for now)
+    # Packed float32 vector, see app.core.vectors. Deferred: ORM loads of papers
+    # never read the 1.5 KB blob; the search index reads the column directly
+    embedding = deferred(Column(LargeBinary))
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped on insert and on every version update; SearchCache delta loads key off it
+    indexed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # Recent listing: ORDER BY published DESC, id DESC with a keyset cursor
+        Index("ix_papers_published_id", "published", "id"),
+        # Per-category feeds: the same keyset within one category
+        Index("ix_papers_category_published_id", "category", "published", "id"),
+    )
 
     def __repr__(self):
         return f"<Paper {self.arxiv_id}: {self.title}>"
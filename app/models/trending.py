@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from datetime import datetime
+from app.core.database import Base
+
+class PaperTrend(Base):
+    """
+    Materialised save counters per paper, maintained by library toggles.
+    Decayed scores are stored in log space relative to a fixed epoch (see
+    app.services.trending_service), so they never need periodic re-decaying.
+    """
+    __tablename__ = "paper_trends"
+
+    paper_id = Column(Integer, ForeignKey("papers.id"), primary_key=True)
+    saves = Column(Integer, default=0, index=True) # All-time save count
+    score_day = Column(Float, nullable=True, index=True) # Half-life: 1 day
+    score_week = Column(Float, nullable=True, index=True) # Half-life: 7 days
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
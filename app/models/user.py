@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -25,3 +25,8 @@ class Library(Base):
 
     user = relationship("User", back_populates="library_items")
     paper = relationship("Paper")
+
+    __table_args__ = (
+        # A user's library, newest first, paged by (created_at, id)
+        Index("ix_library_user_created", "user_id", "created_at"),
+    )
@@ -1,19 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.models.paper import Paper
-from app.services.gemini_service import get_gemini_service
+from app.services.explanation_service import explanation_service
+
+import logging
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/ai/explain/{paper_id}")
-async def explain_paper(paper_id: int, db: Session = Depends(get_db)):
-    paper = db.query(Paper).filter(Paper.id == paper_id).first()
+@router.get("/ai/explain/{paper_id}", response_class=HTMLResponse)
+async def explain_paper(paper_id: int, db: AsyncSession = Depends(get_async_db)):
+    paper = await db.get(Paper, paper_id)
     if not paper:
         return "<p>Paper not found</p>"
     
-    service = get_gemini_service()
-    explanation = await service.explain_paper(paper.title, paper.summary)
+    # Stored per paper + prompt version; concurrent requests share one upstream call
+    try:
+        explanation = await explanation_service.explain(paper)
+    except Exception as e:
+        logger.error(f"Explanation for paper {paper_id} failed: {e}")
+        explanation = f"<p style='color:red'>Error: {e}. Check server logs.</p>"
     
     return f"""
     <div style="background: #f0fdf4; border: 1px solid #bbf7d0; padding: 15px; margin-top: 10px; border-radius: 4px; font-size: 14px; color: #166534;">
@@ -21,3 +30,40 @@ async def explain_paper(paper_id: int, db: Session = Depends(get_db)):
         {explanation}
     </div>
     """
+
+def sse(data: str, event: str = None) -> str:
+    """ One Server-Sent Event; multi-line data becomes several `data:` lines. """
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+@router.get("/ai/explain/{paper_id}/stream")
+async def stream_explanation(paper_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Streams the explanation as Server-Sent Events while it is generated:
+    `data` events carry HTML chunks, then a final `done` (or `error`) event.
+    """
+    paper = await db.get(Paper, paper_id)
+
+    async def events():
+        if not paper:
+            yield sse("<p>Paper not found</p>")
+            yield sse("", event="done")
+            return
+        try:
+            # aclosing: leaving early runs the stream's cleanup now, which
+            # cancels the upstream call once no other client is listening
+            async with aclosing(explanation_service.stream(paper)) as chunks:
+                async for chunk in chunks:
+                    if await request.is_disconnected():
+                        return
+                    yield sse(chunk)
+            yield sse("", event="done")
+        except Exception as e:
+            logger.error(f"Explanation stream for paper {paper_id} failed: {e}")
+            yield sse(f"Error: {e}. Check server logs.", event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no", # Don't let a reverse proxy buffer the stream
+    })
@@ -1,9 +1,13 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import create_access_token, get_password_hash, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.database import get_async_db
+from app.core.principals import principal_cache
+from app.core.writer import db_writer
+from app.core.security import create_access_token, hash_pool, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.models.user import User
 from pydantic import BaseModel
 
@@ -13,27 +17,45 @@ class UserCreate(BaseModel):
 
 router = APIRouter()
 
+async def find_user(db: AsyncSession, email: str):
+    return (await db.execute(select(User).filter(User.email == email))).scalars().first()
+
 @router.post("/register")
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_in.email).first()
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    user = await find_user(db, user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
-    user = User(
-        email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
-    )
+    # Hash outside the writer job (on the hash pool), so the writer isn't held for it
+    hashed_password = await hash_pool.hash(user_in.password)
+    user_id, _, created = await db_writer.run_async(create_user, user_in.email, hashed_password)
+    if not created:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system.",
+        )
+    return {"id": user_id, "email": user_in.email}
+
+def create_user(db: Session, email: str, hashed_password: str):
+    """
+    Writer job: inserts the user unless the email is taken.
+    Returns (id, stored hash, created).
+    """
+    user = db.query(User).filter(User.email == email).first()
+    if user:
+        return user.id, user.hashed_password, False
+    user = User(email=email, hashed_password=hashed_password)
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    return {"id": user.id, "email": user.email}
+    db.flush()
+    principal_cache.invalidate(email)
+    return user.id, user.hashed_password, True
 
 @router.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await find_user(db, form_data.username)
+    if not user or not await hash_pool.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -46,22 +68,24 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login_or_create")
-def login_or_create(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_or_create(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     # 1. Try to find user
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await find_user(db, form_data.username)
     
     if not user:
-        # Create new user
-        user = User(
-            email=form_data.username,
-            hashed_password=get_password_hash(form_data.password),
+        # Create new user (unless a concurrent request just did)
+        _, hashed_password, created = await db_writer.run_async(
+            create_user, form_data.username, await hash_pool.hash(form_data.password)
         )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        if not created and not await hash_pool.verify(form_data.password, hashed_password):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect password",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
     else:
         # Verify password
-        if not verify_password(form_data.password, user.hashed_password):
+        if not await hash_pool.verify(form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect password",
@@ -71,6 +95,6 @@ def login_or_create(form_data: OAuth2PasswordRequestForm = Depends(), db: Sessio
     # Generate token (for both new and existing)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": form_data.username}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
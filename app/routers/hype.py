@@ -1,38 +1,48 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.core.database import get_db
-from app.models.user import Library
-from app.models.paper import Paper
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.core.fragments import fragment_cache
+from app.core.pagination import cursor_field, decode_cursor, page_url
+from app.core.paper_store import paper_store
+from app.core.versions import not_modified, versions, with_etag
+from app.services.trending_service import trending_service
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/hype")
-async def top_hype(request: Request, db: Session = Depends(get_db)):
+async def top_hype(request: Request, window: str = Query("week", pattern="^(day|week|all)$"), cursor: str = "",
+                   db: AsyncSession = Depends(get_async_db)):
     """
-    Returns papers sorted by number of saves in user libraries.
+    Returns trending papers. `day` and `week` rank by time-decayed saves
+    (half-life of one day / one week); `all` ranks by total saves.
+    Paged with `cursor`, the last (score, paper id) shown.
     """
-    # Count saves per paper
-    # SELECT paper_id, COUNT(*) as count FROM library GROUP BY paper_id ORDER BY count DESC
-    hype_query = db.query(
-        Library.paper_id, 
-        func.count(Library.paper_id).label('count')
-    ).group_by(Library.paper_id).order_by(func.count(Library.paper_id).desc()).limit(50).all()
-    
-    if not hype_query:
-         return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": []})
+    # Unchanged since the client's copy (no paper or save anywhere since): 304, no query
+    etag = versions.etag(versions.papers, versions.saves)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
 
-    # Get paper objects
-    top_ids = [r[0] for r in hype_query]
-    papers = db.query(Paper).filter(Paper.id.in_(top_ids)).all()
-    
-    # Sort papers by the order in top_ids (descending count)
-    papers_map = {p.id: p for p in papers}
-    ordered_papers = []
-    for pid in top_ids:
-        if pid in papers_map:
-            ordered_papers.append(papers_map[pid])
+    # Precomputed from the materialised counters, see trending_service
+    key = decode_cursor(cursor)
+    if key:
+        key = {"s": cursor_field(key, "s", float), "i": cursor_field(key, "i", int)}
+    top_ids, next_key = await db.run_sync(trending_service.page, window, key, settings.PAGE_SIZE)
+    next_url = page_url("/hype", next_key, window=window) if next_key else None
 
-    return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": ordered_papers})
+    # Keyed by the ranking itself, so a list refreshed from other workers' saves re-renders
+    async def context():
+        return {"request": request, "papers": await load_papers(db, top_ids), "next_url": next_url, "continued": bool(key)}
+    response = await fragment_cache.render(
+        templates, "partials/paper_list.html", ("hype", window, bool(key), tuple(top_ids), next_url), context
+    )
+    return with_etag(response, etag)
+
+async def load_papers(db: AsyncSession, top_ids):
+    if not top_ids:
+        return []
+    # In the order of top_ids (hottest first)
+    return await paper_store.hydrate_async(db, top_ids)
@@ -1,43 +1,80 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_async_db
 from app.api.deps import get_current_user
-from app.models.user import User, Library
+from app.core.principals import Principal
+from app.core.fragments import fragment_cache
+from app.core.pagination import cursor_field, decode_cursor, page_url
+from app.core.paper_store import paper_store
+from app.core.profiles import profile_store
+from app.core.versions import not_modified, versions, with_etag
+from app.core.writer import db_writer
+from app.services.trending_service import trending_service
+from app.models.user import Library
 from app.models.paper import Paper
 from typing import List
+from datetime import datetime
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/library")
-async def view_library(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """ Returns the papers in the user's library """
-    # Get all paper IDs
-    lib_entries = db.query(Library).filter(Library.user_id == current_user.id).all()
-    paper_ids = [entry.paper_id for entry in lib_entries]
+async def view_library(request: Request, cursor: str = "", db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    """ Returns the papers in the user's library, most recently saved first """
+    # 1. One page of library entries: keyset on (created_at, id) over ix_library_user_created
+    key = decode_cursor(cursor)
+    query = select(Library.id, Library.paper_id, Library.created_at) \
+        .filter(Library.user_id == current_user.id) \
+        .order_by(Library.created_at.desc(), Library.id.desc())
+    if key:
+        after = (cursor_field(key, "t", datetime), cursor_field(key, "i", int))
+        query = query.filter(tuple_(Library.created_at, Library.id) < tuple_(*after))
+    entries = (await db.execute(query.limit(settings.PAGE_SIZE))).all()
+    paper_ids = [entry.paper_id for entry in entries]
     
-    # Fetch papers
-    if not paper_ids:
-        return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": []})
-        
-    papers = db.query(Paper).filter(Paper.id.in_(paper_ids)).all()
-    return templates.TemplateResponse("partials/paper_list.html", {"request": request, "papers": papers})
+    # 2. Paper metadata from memory (in library order)
+    papers = await paper_store.hydrate_async(db, paper_ids)
+
+    next_url = None
+    if len(entries) == settings.PAGE_SIZE:
+        next_url = page_url("/library", {"t": entries[-1].created_at, "i": entries[-1].id})
+    return templates.TemplateResponse("partials/paper_list.html", {
+        "request": request, "papers": papers, "next_url": next_url, "continued": bool(key),
+    })
 
 @router.post("/library/toggle/{paper_id}")
-def toggle_library(paper_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def toggle_library(paper_id: int, current_user: Principal = Depends(get_current_user)):
     """
     Toggles a paper in the user's library. 
     Returns: 'ON' if added, 'OFF' if removed.
     """
+    # Read-check-write runs as one job on the single writer, so two
+    # concurrent toggles of the same paper can't both insert
+    state = await db_writer.run_async(toggle_entry, current_user.id, paper_id)
+    if state == "OFF":
+        profile_store.remove(current_user.id, paper_id)
+    else:
+        profile_store.add(current_user.id, paper_id)
+    trending_service.invalidate() # Again, now that the change is committed
+    versions.bump_library(current_user.id)
+    fragment_cache.bump()
+    return state
+
+def toggle_entry(db: Session, user_id: int, paper_id: int) -> str:
+    """ Writer job: flips the library row and the trending counters together. """
     existing = db.query(Library).filter(
-        Library.user_id == current_user.id, 
+        Library.user_id == user_id, 
         Library.paper_id == paper_id
     ).first()
 
     if existing:
+        trending_service.record_unsave(db, paper_id, existing.created_at)
         db.delete(existing)
-        db.commit()
         return "OFF"
     else:
         # Check if paper exists first
@@ -45,13 +82,22 @@ def toggle_library(paper_id: int, db: Session = Depends(get_db), current_user: U
         if not paper:
             raise HTTPException(status_code=404, detail="Paper not found")
             
-        entry = Library(user_id=current_user.id, paper_id=paper_id)
+        entry = Library(user_id=user_id, paper_id=paper_id, created_at=datetime.utcnow())
         db.add(entry)
-        db.commit()
+        # Counters change in the same transaction as the library row
+        trending_service.record_save(db, paper_id, entry.created_at)
         return "ON"
 
 @router.get("/library/ids")
-def get_library_ids(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """ Returns list of paper IDs in user's library """
-    items = db.query(Library).filter(Library.user_id == current_user.id).all()
-    return [item.paper_id for item in items]
+async def get_library_ids(request: Request, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    """
+    Returns list of paper IDs in user's library.
+    Polled by the frontend; revalidation with the user's library version
+    answers 304 without a query.
+    """
+    etag = versions.etag(current_user.id, versions.user(current_user.id))
+    cached = not_modified(request, etag, "private, no-cache")
+    if cached is not None:
+        return cached
+    paper_ids = (await db.execute(select(Library.paper_id).filter(Library.user_id == current_user.id))).scalars().all()
+    return with_etag(JSONResponse(paper_ids), etag, "private, no-cache")
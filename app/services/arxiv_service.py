@@ -1,11 +1,21 @@
+import io
 import urllib.request
 import urllib.parse
+import xml.etree.ElementTree as ET
 import feedparser
+import threading
 import time
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from app.models.paper import Paper
+from app.models.harvest import HarvestCheckpoint
+from app.core.config import settings
 from app.core.database import SessionLocal
+from app.core.vectors import pack_embedding
+from app.core.fragments import fragment_cache
+from app.core.versions import versions
 import dateutil.parser
 # Import embedder
 from app.services.embedding_service import get_embedder
@@ -14,16 +24,94 @@ import logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV = "{http://arxiv.org/schemas/atom}"
+OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+
+def split_arxiv_id(id_url: str):
+    """ 'http://arxiv.org/abs/2401.00001v2' -> ('2401.00001', 2) """
+    arxiv_id = id_url.split('/abs/')[-1]
+    version = 1
+    if 'v' in arxiv_id:
+        parts = arxiv_id.split('v')
+        arxiv_id = parts[0]
+        version = int(parts[1])
+    return arxiv_id, version
+
+class FeedStream:
+    """
+    Incremental Atom parser for arXiv API responses.
+    Iterating yields entries in the same shape as `ArxivFetcher._parse_entry`,
+    clearing each element once read, so memory stays flat regardless of
+    page size. `total_results` is filled in as soon as it is seen.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.total_results = None
+
+    def __iter__(self):
+        for _, elem in ET.iterparse(self.stream, events=("end",)):
+            if elem.tag == f"{OPENSEARCH}totalResults":
+                self.total_results = int(elem.text)
+            elif elem.tag == f"{ATOM}entry":
+                entry = self._parse(elem)
+                elem.clear()
+                if entry is not None:
+                    yield entry
+
+    @staticmethod
+    def total_results_of(data: bytes):
+        """ Reads just the result count from a downloaded page. """
+        for _, elem in ET.iterparse(io.BytesIO(data), events=("end",)):
+            if elem.tag == f"{OPENSEARCH}totalResults":
+                return int(elem.text)
+            if elem.tag == f"{ATOM}entry":
+                break
+        return None
+
+    @staticmethod
+    def _parse(elem):
+        id_url = elem.findtext(f"{ATOM}id")
+        # Error responses come back as a single entry without a title
+        if not id_url or elem.find(f"{ATOM}title") is None:
+            return None
+        arxiv_id, version = split_arxiv_id(id_url)
+
+        links = {}
+        for link in elem.findall(f"{ATOM}link"):
+            if link.get("rel") == "alternate":
+                links['abs'] = link.get("href")
+            elif link.get("title") == "pdf":
+                links['pdf'] = link.get("href")
+
+        category = elem.find(f"{ARXIV}primary_category")
+        return {
+            "arxiv_id": arxiv_id,
+            "version": version,
+            "title": " ".join(elem.findtext(f"{ATOM}title", "").split()),
+            "summary": " ".join(elem.findtext(f"{ATOM}summary", "").split()),
+            "authors": [a.findtext(f"{ATOM}name") for a in elem.findall(f"{ATOM}author")],
+            "published": dateutil.parser.parse(elem.findtext(f"{ATOM}published")),
+            "updated": dateutil.parser.parse(elem.findtext(f"{ATOM}updated")),
+            "category": category.get("term") if category is not None else None,
+            "links": links
+        }
+
 class ArxivFetcher:
     BASE_URL = 'https://export.arxiv.org/api/query?'
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache=None, embedder=None):
         self.db = db
-        try:
-            self.embedder = get_embedder()
-        except Exception as e:
-            logger.warning(f"Warning: Could not load embedder. Semantic search will be disabled. Error: {e}")
-            self.embedder = None
+        # Optional live SearchCache; ingested rows are pushed into it after commit
+        self.cache = cache
+        self.embedder = embedder
+        self._last_request = 0.0 # monotonic time of the last API call
+        self._throttle_lock = threading.Lock()
+        if self.embedder is None:
+            try:
+                self.embedder = get_embedder()
+            except Exception as e:
+                logger.warning(f"Warning: Could not load embedder. Semantic search will be disabled. Error: {e}")
 
     def fetch_papers(self, search_query="cat:cs.CV OR cat:cs.AI OR cat:cs.LG", max_results=200):
         logger.info(f"Fetching {max_results} papers for query: {search_query}")
@@ -64,29 +152,133 @@ class ArxivFetcher:
                 # If the intent was to use the existing self.db, the snippet is misleading.
                 # Sticking to the provided snippet's structure.
                 with SessionLocal() as db:
-                    for entry in feed.entries:
-                        paper_data = self._parse_entry(entry)
-                        # Pass DB explicitly to _save_paper
-                        added = self._save_paper(db, paper_data)
-                        if added:
-                            new_papers += 1
-                    
-                    db.commit()
+                    entries = [self._parse_entry(entry) for entry in feed.entries]
+                    new_papers = self._ingest_entries(db, entries)
                     
         except Exception as e:
             logger.error(f"Error fetching from Arxiv: {e}")
             
         logger.info(f"Done. Added {new_papers} new papers.")
 
+    def harvest(self, search_query, max_papers=None, page_size=None, restart=False):
+        """
+        Backfills a whole query by paging through the API with `start`
+        offsets. Progress is checkpointed in `harvest_checkpoints` after every
+        page, so an interrupted run resumes where it stopped; pages are
+        streamed and written in `INGEST_COMMIT_CHUNK` batches, and requests
+        are spaced `ARXIV_REQUEST_DELAY` seconds apart.
+        Returns the number of papers inserted or updated.
+        """
+        page_size = page_size or settings.ARXIV_PAGE_SIZE
+        written = 0
+        with SessionLocal() as db:
+            checkpoint = self.load_checkpoint(db, search_query, restart)
+            if checkpoint.completed:
+                return 0
+
+            harvested = 0
+            while max_papers is None or harvested < max_papers:
+                count = page_size if max_papers is None else min(page_size, max_papers - harvested)
+                seen, page_written, total = self._harvest_page(db, search_query, checkpoint.next_start, count)
+                written += page_written
+                harvested += seen
+
+                checkpoint.next_start += seen
+                if total is not None:
+                    checkpoint.total_results = total
+                if seen == 0 or (total is not None and checkpoint.next_start >= total):
+                    checkpoint.completed = True
+                db.commit()
+                logger.info(
+                    f"Harvest '{search_query}': offset {checkpoint.next_start}/{checkpoint.total_results}, "
+                    f"{written} written"
+                )
+                if checkpoint.completed:
+                    break
+
+        logger.info(f"Harvest done. Wrote {written} papers.")
+        return written
+
+    def load_checkpoint(self, db, search_query, restart=False) -> HarvestCheckpoint:
+        """ Returns (creating if needed) the committed checkpoint for a harvest query. """
+        checkpoint = db.get(HarvestCheckpoint, search_query)
+        if checkpoint is None:
+            checkpoint = HarvestCheckpoint(query=search_query, next_start=0, completed=False)
+            db.add(checkpoint)
+        elif restart:
+            checkpoint.next_start, checkpoint.completed = 0, False
+        db.commit()
+        if checkpoint.completed:
+            logger.info(f"Harvest of '{search_query}' already completed ({checkpoint.next_start} papers).")
+        else:
+            logger.info(f"Harvesting '{search_query}' from offset {checkpoint.next_start}")
+        return checkpoint
+
+    def open_page(self, search_query, start, count):
+        """ Opens one harvest page (oldest first), honouring the request throttle. """
+        query_params = {
+            "search_query": search_query,
+            "start": start,
+            "max_results": count,
+            # Oldest first: new submissions land at the end, so offsets stay stable across runs
+            "sortBy": "submittedDate",
+            "sortOrder": "ascending"
+        }
+        url = f"http://export.arxiv.org/api/query?{urllib.parse.urlencode(query_params)}"
+        op = urllib.request.build_opener()
+        op.addheaders = [('User-agent', 'Mozilla/5.0')]
+        self._throttle()
+        return op.open(url)
+
+    def _harvest_page(self, db, search_query, start, count):
+        """ Fetches, parses and stores one page. Returns (entries_seen, written, total_results). """
+        for attempt in range(1, settings.ARXIV_MAX_RETRIES + 1):
+            seen, written = 0, 0
+            try:
+                with self.open_page(search_query, start, count) as response:
+                    feed = FeedStream(response)
+                    chunk = []
+                    for entry in feed:
+                        chunk.append(entry)
+                        if len(chunk) >= settings.INGEST_COMMIT_CHUNK:
+                            written += self._ingest_entries(db, chunk)
+                            seen += len(chunk)
+                            chunk = []
+                    written += self._ingest_entries(db, chunk)
+                    seen += len(chunk)
+
+                # The API occasionally returns an empty page mid-result set; retry those
+                if seen or (feed.total_results is not None and start >= feed.total_results):
+                    return seen, written, feed.total_results
+                logger.warning(f"Empty page at offset {start} (attempt {attempt})")
+            except Exception as e:
+                logger.error(f"Error harvesting offset {start} (attempt {attempt}): {e}")
+                # Keep the chunks that were committed; the next page starts after them
+                if seen:
+                    return seen, written, None
+        raise RuntimeError(f"Giving up on '{search_query}' at offset {start}; re-run to resume.")
+
+    def _ingest_entries(self, db, entries) -> int:
+        """ Select changed -> embed -> upsert. Returns the number of rows written. """
+        if not entries:
+            return 0
+        # Only new or re-versioned papers get embedded and written
+        changed = self._select_changed(db, entries)
+        logger.info(f"{len(changed)} of {len(entries)} entries are new or re-versioned.")
+        self._embed_entries(changed)
+        return self._upsert_papers(db, changed)
+
+    def _throttle(self):
+        # Serialised so concurrent downloaders still space their requests out
+        with self._throttle_lock:
+            wait = self._last_request + settings.ARXIV_REQUEST_DELAY - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
+
     def _parse_entry(self, entry):
         # Extract ID (remove version)
-        id_url = entry.id
-        arxiv_id = id_url.split('/abs/')[-1]
-        version = 1
-        if 'v' in arxiv_id:
-            parts = arxiv_id.split('v')
-            arxiv_id = parts[0]
-            version = int(parts[1])
+        arxiv_id, version = split_arxiv_id(entry.id)
 
         # Authors
         authors = [a.name for a in entry.authors]
@@ -111,34 +303,98 @@ class ArxivFetcher:
             "links": links
         }
 
-    def _save_paper(self, db, data):
-        # Generate embedding if new or updated
-        if self.embedder:
+    def _select_changed(self, db, entries):
+        """
+        Returns the entries that are not in the DB yet or carry a newer
+        version, looking existing versions up in a few IN queries.
+        Duplicate ids within one feed collapse to their latest version.
+        """
+        latest = {}
+        for data in entries:
+            current = latest.get(data['arxiv_id'])
+            if current is None or data['version'] > current['version']:
+                latest[data['arxiv_id']] = data
+
+        known = {}
+        arxiv_ids = list(latest)
+        for start in range(0, len(arxiv_ids), 500): # Stay under SQLite's bound-parameter limit
+            chunk = arxiv_ids[start:start + 500]
+            rows = db.query(Paper.arxiv_id, Paper.version).filter(Paper.arxiv_id.in_(chunk)).all()
+            known.update(dict(rows))
+
+        return [
+            data for arxiv_id, data in latest.items()
+            if arxiv_id not in known or data['version'] > (known[arxiv_id] or 0)
+        ]
+
+    def _embed_entries(self, entries):
+        """ Embeds entries in `EMBED_BATCH_SIZE` batches, storing packed vectors on each. """
+        if not self.embedder or not entries:
+            return
+        batch_size = settings.EMBED_BATCH_SIZE
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
             try:
-                # We do this before saving. It might be slow.
-                # In production, this should be a background task (APScheduler).
-                # For simplicity here (per "Code Cleanliness"), we do it synchronous.
-                embedding = self.embedder.embed_paper(data['title'], data['summary'])
-                data['embedding'] = embedding
+                vectors = self.embedder.embed_papers(
+                    [(data['title'], data['summary']) for data in batch], batch_size=batch_size
+                )
             except Exception as e:
-                logger.error(f"Failed to embed paper {data['arxiv_id']}: {e}")
+                logger.error(f"Failed to embed batch of {len(batch)} papers: {e}")
+                continue
+            for data, vector in zip(batch, vectors):
+                data['embedding'] = pack_embedding(vector)
 
-        # Check if exists
-        existing = db.query(Paper).filter(Paper.arxiv_id == data['arxiv_id']).first()
-        
-        if existing:
-            # Update if newer version
-            if data['version'] > existing.version:
-                logger.info(f"Updating {data['arxiv_id']} v{existing.version} -> v{data['version']}")
-                for key, value in data.items():
-                    setattr(existing, key, value)
-                return True # Count as "action taken"
-            return False # Skipped
-        
-        # Create new
-        paper = Paper(**data)
-        db.add(paper)
-        return True
+    def _upsert_papers(self, db, entries) -> int:
+        """
+        Writes entries with one executemany'd `INSERT ... ON CONFLICT(arxiv_id)
+        DO UPDATE` per chunk, committing every `INGEST_COMMIT_CHUNK` rows.
+        The conflict update only fires for a newer version, so re-running a
+        feed is a no-op. Returns the number of rows inserted or updated.
+        """
+        stmt = sqlite_insert(Paper.__table__)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Paper.arxiv_id],
+            set_={
+                "version": excluded.version,
+                "title": excluded.title,
+                "authors": excluded.authors,
+                "summary": excluded.summary,
+                "published": excluded.published,
+                "updated": excluded.updated,
+                "category": excluded.category,
+                "links": excluded.links,
+                # Keep the old vector if this version failed to embed
+                "embedding": func.coalesce(excluded.embedding, Paper.__table__.c.embedding),
+                # ON CONFLICT updates skip Column.onupdate, so bump the watermark here
+                "indexed_at": excluded.indexed_at,
+            },
+            where=Paper.__table__.c.version < excluded.version,
+        )
+
+        written = 0
+        chunk_size = settings.INGEST_COMMIT_CHUNK
+        for start in range(0, len(entries), chunk_size):
+            now = datetime.utcnow()
+            # executemany needs the same keys on every row
+            rows = [
+                {**data, "embedding": data.get("embedding"), "created_at": now, "indexed_at": now}
+                for data in entries[start:start + chunk_size]
+            ]
+            chunk_written = db.execute(stmt, rows).rowcount
+            db.commit()
+            written += chunk_written
+            if chunk_written:
+                fragment_cache.bump()
+                versions.bump_papers()
+
+            if self.cache is not None:
+                arxiv_ids = [row["arxiv_id"] for row in rows]
+                pushed = db.query(Paper.id, Paper.embedding, Paper.category, Paper.published).filter(
+                    Paper.arxiv_id.in_(arxiv_ids), Paper.embedding.isnot(None)
+                ).all()
+                self.cache.upsert([tuple(row) for row in pushed])
+        return written
 
 if __name__ == "__main__":
     # Test run
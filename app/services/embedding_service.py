@@ -1,4 +1,4 @@
-from sentence_transformers import SentenceTransformer
+import threading
 import numpy as np
 
 import logging
@@ -6,30 +6,44 @@ logger = logging.getLogger(__name__)
 
 class EmbeddingService:
     def __init__(self, model_name='all-MiniLM-L6-v2'):
+        # Imported here: sentence_transformers pulls in torch, seconds of import time
+        from sentence_transformers import SentenceTransformer
         # This will download the model on first use (~80MB)
         logger.info(f"Loading embedding model: {model_name}...")
         self.model = SentenceTransformer(model_name)
         logger.info("Model loaded.")
 
-    def embed_paper(self, title: str, summary: str) -> list[float]:
+    def embed_paper(self, title: str, summary: str) -> np.ndarray:
         """
         Creates a text embedding for the paper.
         Combines title and summary for the semantic representation.
         """
-        # Prefixing title might give it slightly more weight or context
-        text = f"{title}. {summary}"
-        
-        # Encode
-        embedding = self.model.encode(text)
-        
-        # Convert to list for JSON serialization (if using generic JSON storage)
-        return embedding.tolist()
+        # Encode (float32, packed for storage by the caller)
+        return self.model.encode(paper_text(title, summary))
+
+    def embed_papers(self, papers, batch_size: int = 64) -> np.ndarray:
+        """
+        Batched `embed_paper` for a list of (title, summary) pairs.
+        Returns an (n, dim) float32 matrix; one transformer call per batch.
+        """
+        texts = [paper_text(title, summary) for title, summary in papers]
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+def paper_text(title: str, summary: str) -> str:
+    # Prefixing title might give it slightly more weight or context
+    return f"{title}. {summary}"
 
 # Singleton instance to avoid reloading model
 _embedder_instance = None
+_embedder_lock = threading.Lock() # Warm-up and a first request may race to create it
 
 def get_embedder():
     global _embedder_instance
     if _embedder_instance is None:
-        _embedder_instance = EmbeddingService()
+        with _embedder_lock:
+            if _embedder_instance is None:
+                _embedder_instance = EmbeddingService()
     return _embedder_instance
+
+def embedder_loaded() -> bool:
+    return _embedder_instance is not None
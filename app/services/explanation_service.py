@@ -0,0 +1,227 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.writer import db_writer
+from app.models.explanation import Explanation
+from app.models.paper import Paper
+from app.services.gemini_service import PROMPT_VERSION, build_prompt, get_gemini_service
+from app.services.trending_service import trending_service
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Broadcast:
+    """
+    Chunks of one upstream stream, replayed to every listener: late joiners
+    get what was already generated, then follow live.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.listeners = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: BaseException = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event; later waits use a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self):
+        sent = 0
+        while True:
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+class ExplanationService:
+    """
+    Stored, coalesced AI explanations.
+
+    Explanations are persisted per (paper id, paper version, prompt
+    version). Concurrent requests for a key that is not stored yet share a
+    single in-flight upstream call, and at most `AI_MAX_CONCURRENCY` calls
+    run at once per worker.
+    """
+    def __init__(self, backend=None, session_factory=AsyncSessionLocal, writer=db_writer):
+        self._backend = backend
+        self.session_factory = session_factory
+        self.writer = writer
+        self._inflight = {} # key -> asyncio.Task
+        self._streams = {} # key -> Broadcast
+        self._semaphore = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_gemini_service()
+        return self._backend
+
+    async def explain(self, paper) -> str:
+        """ Returns the explanation for `paper`, generating and storing it on first use. """
+        key = (paper.id, paper.version or 1, PROMPT_VERSION)
+        stored = await self.lookup(key)
+        if stored is not None:
+            return stored
+
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            # Already being streamed to someone: wait for that call instead
+            return "".join([chunk async for chunk in self._listen(broadcast)])
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._generate(key, build_prompt(paper.title, paper.summary)))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded: one caller going away must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def stream(self, paper):
+        """
+        Yields the explanation as it is generated. Concurrent streams of the
+        same key share one upstream call; if every listener disconnects
+        before it finishes, that call is cancelled. The complete text is
+        stored just like `explain`.
+        """
+        key = (paper.id, paper.version or 1, PROMPT_VERSION)
+        stored = await self.lookup(key)
+        if stored is not None:
+            yield stored
+            return
+
+        task = self._inflight.get(key)
+        if task is not None:
+            # A non-streamed call is already running: hand over its result
+            yield await asyncio.shield(task)
+            return
+
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.create_task(self._stream_upstream(key, build_prompt(paper.title, paper.summary), broadcast))
+        async for chunk in self._listen(broadcast):
+            yield chunk
+
+    async def _listen(self, broadcast: Broadcast):
+        broadcast.listeners += 1
+        try:
+            async for chunk in broadcast.follow():
+                yield chunk
+        finally:
+            broadcast.listeners -= 1
+            if not broadcast.listeners and not broadcast.done:
+                # Nobody is reading any more: stop paying for the upstream call
+                broadcast.task.cancel()
+
+    async def _stream_upstream(self, key, prompt: str, broadcast: Broadcast):
+        try:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+            async with self._semaphore:
+                async for chunk in self.backend.stream(prompt):
+                    broadcast.publish(chunk)
+            await self.store(key, "".join(broadcast.chunks))
+            broadcast.finish()
+        except asyncio.CancelledError:
+            logger.info(f"Explanation stream for paper {key[0]} cancelled: all clients disconnected.")
+            broadcast.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            logger.error(f"Explanation stream for paper {key[0]} failed: {e}")
+            broadcast.finish(e)
+        finally:
+            self._streams.pop(key, None)
+
+    async def lookup(self, key):
+        paper_id, version, prompt_version = key
+        async with self.session_factory() as db:
+            result = await db.execute(select(Explanation.content).filter(
+                Explanation.paper_id == paper_id,
+                Explanation.version == version,
+                Explanation.prompt_version == prompt_version,
+            ))
+            return result.scalar()
+
+    async def _generate(self, key, prompt: str) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+        async with self._semaphore:
+            # Another worker may have stored it while we queued
+            stored = await self.lookup(key)
+            if stored is not None:
+                return stored
+            content = await self.backend.generate(prompt)
+        await self.store(key, content)
+        return content
+
+    async def store(self, key, content: str):
+        await self.writer.run_async(store_explanation, key, content)
+
+    async def pregenerate(self, limit: int = None) -> int:
+        """
+        Generates missing explanations for trending and newest papers, at
+        most `AI_PREGENERATE_CONCURRENCY` at a time. Returns how many were
+        generated.
+        """
+        limit = limit or settings.AI_PREGENERATE_BATCH
+        async with self.session_factory() as db:
+            trending_ids = await db.run_sync(trending_service.top, "week")
+            newest = await db.execute(select(Paper.id).order_by(Paper.published.desc()).limit(limit))
+            candidate_ids = list(dict.fromkeys(trending_ids[:limit] + newest.scalars().all()))
+            papers = (await db.execute(select(Paper).filter(Paper.id.in_(candidate_ids)))).scalars().all()
+            done = await db.execute(select(Explanation.paper_id, Explanation.version).filter(
+                Explanation.paper_id.in_(candidate_ids), Explanation.prompt_version == PROMPT_VERSION,
+            ))
+            done = set(done.all())
+        missing = [p for p in papers if (p.id, p.version or 1) not in done]
+
+        semaphore = asyncio.Semaphore(settings.AI_PREGENERATE_CONCURRENCY)
+        async def generate(paper):
+            async with semaphore:
+                try:
+                    await self.explain(paper)
+                    return 1
+                except Exception as e:
+                    logger.error(f"Pre-generating explanation for paper {paper.id} failed: {e}")
+                    return 0
+
+        generated = sum(await asyncio.gather(*(generate(p) for p in missing)))
+        logger.info(f"Pre-generated {generated} of {len(missing)} missing explanations.")
+        return generated
+
+    async def run_pregeneration(self, interval: float):
+        """ Background loop started at app startup when AI_PREGENERATE_INTERVAL_SECONDS > 0. """
+        while True:
+            try:
+                await self.pregenerate()
+            except Exception as e:
+                logger.error(f"Explanation pre-generation failed: {e}")
+            await asyncio.sleep(interval)
+
+def store_explanation(db, key, content: str):
+    """ Writer job; a row stored concurrently by another worker wins. """
+    paper_id, version, prompt_version = key
+    db.execute(sqlite_insert(Explanation).values(
+        paper_id=paper_id, version=version, prompt_version=prompt_version, content=content,
+    ).on_conflict_do_nothing())
+
+explanation_service = ExplanationService()
@@ -1,23 +1,15 @@
-import google.generativeai as genai
+import asyncio
+import hashlib
 import logging
-import os
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Configure API Key (In prod, use env var. Here using hardcoded for demo as requested)
-GEMINI_API_KEY = "enter your API key"
-genai.configure(api_key=GEMINI_API_KEY)
+# Bump whenever the prompt text changes: stored explanations are keyed by it
+PROMPT_VERSION = 1
 
-class GeminiService:
-    def __init__(self):
-        # Using the latest stable model
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
-
-    async def explain_paper(self, title: str, abstract: str) -> str:
-        """
-        Generates a simplified explanation of the paper.
-        """
-        prompt = f"""
+def build_prompt(title: str, abstract: str) -> str:
+    return f"""
         You are an expert research assistant. 
         Read the following paper abstract and explain it to a software engineer who is not an expert in this specific field.
         
@@ -31,19 +23,65 @@ class GeminiService:
         
         Format: Return HTML with <p> tags. Keep it short (max 100 words).
         """
-        try:
-            logger.info(f"Sending prompt to Gemini for paper: {title[:30]}...")
-            response = await self.model.generate_content_async(prompt)
-            logger.info("Gemini response received.")
-            return response.text
-        except Exception as e:
-            logger.error(f"Gemini Error details: {e}")
-            return f"<p style='color:red'>Error: {e}. Check server logs.</p>"
+
+class GeminiService:
+    def __init__(self):
+        # Imported here so the app (and tests) run without the SDK configured
+        import google.generativeai as genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+
+    async def generate(self, prompt: str) -> str:
+        """ Returns the model's answer. Raises on failure, so errors are never cached. """
+        logger.info("Sending prompt to Gemini...")
+        response = await self.model.generate_content_async(prompt)
+        logger.info("Gemini response received.")
+        return response.text
+
+    async def stream(self, prompt: str):
+        """ Yields text chunks as the model produces them. Closing the generator cancels the call. """
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+class StubService(GeminiService):
+    """
+    Offline backend (AI_BACKEND=stub): deterministic canned answers after
+    AI_STUB_DELAY seconds (spread across the tokens when streaming).
+    Counts calls so tests can check coalescing.
+    """
+    def __init__(self, delay: float = None):
+        self.delay = settings.AI_STUB_DELAY if delay is None else delay
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.answer(prompt)
+
+    async def stream(self, prompt: str):
+        self.calls += 1
+        tokens = self.answer(prompt).split(" ")
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(self.delay / len(tokens))
+            yield token if i == len(tokens) - 1 else token + " "
+
+    @staticmethod
+    def answer(prompt: str) -> str:
+        title = next((line.strip()[len("Title: "):] for line in prompt.splitlines() if line.strip().startswith("Title: ")), "")
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        return f"<p>Stub explanation of {title} ({digest}).</p>"
+
+BACKENDS = {
+    "gemini": GeminiService,
+    "stub": StubService,
+}
 
 _gemini_instance = None
 
 def get_gemini_service():
     global _gemini_instance
     if _gemini_instance is None:
-        _gemini_instance = GeminiService()
+        _gemini_instance = BACKENDS[settings.AI_BACKEND]()
     return _gemini_instance
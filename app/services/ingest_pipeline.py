@@ -0,0 +1,213 @@
+import io
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.arxiv_service import ArxivFetcher, FeedStream
+
+logger = logging.getLogger(__name__)
+
+_DONE = object() # End-of-stream marker passed down the queues
+
+class StageStats:
+    """ Throughput counters for one pipeline stage. """
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy = 0.0 # Seconds spent working (excludes waiting on queues)
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float):
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+
+    def report(self, wall: float) -> str:
+        rate = self.items / wall if wall else 0.0
+        utilisation = self.busy / wall if wall else 0.0
+        return f"{self.name}: {self.items} {self.unit} ({rate:.1f}/s, busy {utilisation:.0%})"
+
+class IngestPipeline:
+    """
+    Harvest as overlapping stages connected by bounded queues:
+
+        download (N threads) -> parse + embed (worker pool) -> DB writer (1 thread)
+
+    Full queues block the stage in front of them, so a slow embedder or
+    writer throttles downloads instead of buffering pages in memory.
+    Pages can finish out of order; the checkpoint only advances over a
+    contiguous prefix of written pages, so resume stays exact.
+    """
+    def __init__(self, fetcher: ArxivFetcher, download_workers: int = 2, embed_workers: int = 1, queue_size: int = 4):
+        self.fetcher = fetcher
+        self.download_workers = download_workers
+        self.embed_workers = embed_workers
+        self.raw_pages = queue.Queue(maxsize=queue_size)
+        self.parsed_pages = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "download": StageStats("download", "pages"),
+            "parse": StageStats("parse", "entries"),
+            "embed": StageStats("embed", "papers"),
+            "write": StageStats("write", "papers"),
+        }
+        self._stop = threading.Event()
+        self._errors = []
+        self._written = 0
+
+    def run(self, search_query, max_papers=None, page_size=None, restart=False) -> int:
+        page_size = page_size or settings.ARXIV_PAGE_SIZE
+        with SessionLocal() as db:
+            checkpoint = self.fetcher.load_checkpoint(db, search_query, restart)
+            if checkpoint.completed:
+                return 0
+            start = checkpoint.next_start
+
+        end = start + max_papers if max_papers is not None else None
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self._guard, args=(self._download, search_query, start, end, page_size), name="ingest-download")]
+        threads += [threading.Thread(target=self._guard, args=(self._parse_and_embed,), name=f"ingest-embed-{i}") for i in range(self.embed_workers)]
+        threads.append(threading.Thread(target=self._guard, args=(self._write, search_query, start), name="ingest-write"))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        wall = time.perf_counter() - started
+        for stage in self.stats.values():
+            logger.info(stage.report(wall))
+        if self._errors:
+            raise RuntimeError(f"Ingest pipeline failed; re-run to resume: {self._errors[0]}")
+        logger.info(f"Pipeline done in {wall:.1f}s. Wrote {self._written} papers.")
+        return self._written
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except Exception as e:
+            logger.error(f"Ingest stage {threading.current_thread().name} failed: {e}")
+            self._errors.append(e)
+            self._stop.set()
+            # Unblock neighbours that may be waiting on a queue
+            for q in (self.raw_pages, self.parsed_pages):
+                try:
+                    q.put_nowait(_DONE)
+                except queue.Full:
+                    pass
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _download_page(self, search_query, start, count):
+        for attempt in range(1, settings.ARXIV_MAX_RETRIES + 1):
+            try:
+                t0 = time.perf_counter()
+                with self.fetcher.open_page(search_query, start, count) as response:
+                    data = response.read()
+                self.stats["download"].record(1, time.perf_counter() - t0)
+                return data
+            except Exception as e:
+                logger.error(f"Error downloading offset {start} (attempt {attempt}): {e}")
+        raise RuntimeError(f"Giving up on offset {start}")
+
+    def _download(self, search_query, start, end, page_size):
+        """ Downloads pages concurrently, emitting them in offset order. """
+        # The first page tells us the result count, which bounds the rest
+        count = self._page_count(start, end, page_size)
+        first = self._download_page(search_query, start, count)
+        total = FeedStream.total_results_of(first)
+        if not self._put(self.raw_pages, (start, count, first, total)):
+            return
+
+        offsets = []
+        offset = start + page_size
+        if total is None:
+            logger.warning("No result count in the first page; stopping after it.")
+        while total is not None and offset < total and (end is None or offset < end):
+            offsets.append(offset)
+            offset += page_size
+
+        with ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix="ingest-download") as pool:
+            pending = []
+            for offset in offsets:
+                count = self._page_count(offset, end, page_size)
+                pending.append((offset, count, pool.submit(self._download_page, search_query, offset, count)))
+                # Bound pages in flight; the oldest one is handed on first
+                while len(pending) >= self.download_workers:
+                    page_start, count, future = pending.pop(0)
+                    if not self._put(self.raw_pages, (page_start, count, future.result(), total)):
+                        return
+            for page_start, count, future in pending:
+                if not self._put(self.raw_pages, (page_start, count, future.result(), total)):
+                    return
+        self._put(self.raw_pages, _DONE)
+
+    @staticmethod
+    def _page_count(offset, end, page_size):
+        return page_size if end is None else min(page_size, end - offset)
+
+    def _parse_and_embed(self):
+        with SessionLocal() as db:
+            while not self._stop.is_set():
+                item = self.raw_pages.get()
+                if item is _DONE:
+                    # Let sibling workers and the writer see the end too
+                    self.raw_pages.put(_DONE)
+                    self._put(self.parsed_pages, _DONE)
+                    return
+                page_start, count, data, total = item
+
+                t0 = time.perf_counter()
+                entries = list(FeedStream(io.BytesIO(data)))
+                changed = self.fetcher._select_changed(db, entries)
+                db.rollback() # End the read transaction so the writer is never blocked by it
+                self.stats["parse"].record(len(entries), time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                self.fetcher._embed_entries(changed)
+                self.stats["embed"].record(len(changed), time.perf_counter() - t0)
+
+                if not self._put(self.parsed_pages, (page_start, count, len(entries), changed, total)):
+                    return
+
+    def _write(self, search_query, start):
+        """ Single DB writer: upserts pages and advances the checkpoint. """
+        finished = {} # page_start -> (requested, seen) for pages written out of order
+        next_start = start
+        gap = False
+        producers = self.embed_workers
+        with SessionLocal() as db:
+            checkpoint = self.fetcher.load_checkpoint(db, search_query)
+            while producers and not self._stop.is_set():
+                item = self.parsed_pages.get()
+                if item is _DONE:
+                    producers -= 1
+                    continue
+                page_start, count, seen, changed, total = item
+
+                t0 = time.perf_counter()
+                self._written += self.fetcher._upsert_papers(db, changed)
+                finished[page_start] = (count, seen)
+                while not gap and next_start in finished:
+                    count, seen = finished.pop(next_start)
+                    next_start += seen
+                    if seen < count and (total is None or next_start < total):
+                        # Short page: later pages are still written, but the
+                        # checkpoint stays here so a resume re-fetches the gap
+                        logger.warning(f"Short page at offset {next_start - seen} ({seen}/{count})")
+                        gap = True
+                checkpoint.next_start = next_start
+                if total is not None:
+                    checkpoint.total_results = total
+                    checkpoint.completed = next_start >= total
+                db.commit()
+                self.stats["write"].record(len(changed), time.perf_counter() - t0)
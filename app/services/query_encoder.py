@@ -0,0 +1,130 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from app.core.config import settings
+from app.services.embedding_service import get_embedder
+
+import logging
+logger = logging.getLogger(__name__)
+
+def normalize_query(text: str) -> str:
+    """ Cache key: collapsed whitespace, case-folded (the MiniLM model is uncased). """
+    return " ".join(text.split()).casefold()
+
+def encode_with_model(texts):
+    return get_embedder().model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+class QueryEncoder:
+    """
+    Encodes search queries in micro-batches.
+
+    Concurrent queries are gathered by one worker thread for up to
+    `window_ms` (or until `max_batch` are waiting) and encoded in a single
+    transformer call, instead of one call per request competing for the
+    cores. Identical queries in flight share one slot, and recent results
+    are kept in an LRU cache keyed by the normalised query.
+    """
+    def __init__(self, encode=encode_with_model, window_ms: float = None, max_batch: int = None, cache_size: int = None):
+        self._encode = encode
+        self.window = (settings.QUERY_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or settings.QUERY_BATCH_MAX
+        self.cache_size = settings.QUERY_CACHE_SIZE if cache_size is None else cache_size
+        self._cache = OrderedDict() # normalised query -> read-only vector
+        self._inflight = {} # normalised query -> Future
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counts = Counter() # requests, cache_hits, coalesced, batches, encoded, errors
+        self.batch_sizes = Counter() # batch size -> number of batches
+
+    def encode(self, text: str) -> np.ndarray:
+        """ Blocking: the query's embedding (float32, read-only). """
+        return self.submit(text).result()
+
+    async def encode_async(self, text: str) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def submit(self, text: str) -> Future:
+        key = normalize_query(text)
+        with self._lock:
+            self.counts["requests"] += 1
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.counts["cache_hits"] += 1
+                future = Future()
+                future.set_result(vector)
+                return future
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counts["coalesced"] += 1
+                return future
+            future = self._inflight[key] = Future()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                self._thread.start()
+        self._queue.put(key)
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Collect whatever else arrives within the window
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._encode_batch(batch)
+
+    def _encode_batch(self, keys):
+        try:
+            matrix = np.asarray(self._encode(keys), dtype=np.float32)
+            matrix.flags.writeable = False # Cached rows are shared between requests
+            vectors = list(matrix)
+            error = None
+        except Exception as e:
+            logger.error(f"Encoding a batch of {len(keys)} queries failed: {e}")
+            error = e
+
+        with self._lock:
+            self.counts["batches"] += 1
+            self.batch_sizes[len(keys)] += 1
+            futures = [self._inflight.pop(key) for key in keys]
+            if error is not None:
+                self.counts["errors"] += 1
+            else:
+                self.counts["encoded"] += len(keys)
+                for key, vector in zip(keys, vectors):
+                    self._cache[key] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        for i, future in enumerate(futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(vectors[i])
+
+    def metrics(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            sizes = dict(sorted(self.batch_sizes.items()))
+            cached = len(self._cache)
+        requests = counts.get("requests", 0)
+        batches = sum(sizes.values())
+        return {
+            **counts,
+            "cache_entries": cached,
+            "cache_hit_rate": round(counts.get("cache_hits", 0) / requests, 3) if requests else 0.0,
+            "mean_batch_size": round(sum(size * n for size, n in sizes.items()) / batches, 2) if batches else 0.0,
+            "batch_sizes": sizes,
+        }
+
+query_encoder = QueryEncoder()
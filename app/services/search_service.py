@@ -0,0 +1,69 @@
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.core.filters import NO_FILTER, PaperFilter
+from app.models.paper import Paper
+
+import logging
+logger = logging.getLogger(__name__)
+
+# bm25() column weights for (title, summary, authors)
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+def fts_query(q: str) -> str:
+    """
+    Turns free text into a safe FTS5 query: every term is quoted (so
+    'GPT-4' or 'C++' are matched literally instead of parsed as operators)
+    and terms are ANDed.
+    """
+    terms = [t.replace('"', '""') for t in q.split()]
+    return " ".join(f'"{t}"' for t in terms if t)
+
+def keyword_search(db: Session, q: str, limit: int = 30, flt: PaperFilter = NO_FILTER) -> list[int]:
+    """ Paper ids matching `q`, best BM25 first. """
+    return [pid for pid, _ in keyword_page(db, q, limit, flt=flt)]
+
+def keyword_page(db: Session, q: str, limit: int = 30, after=None, flt: PaperFilter = NO_FILTER) -> list[tuple]:
+    """
+    (paper id, bm25 rank) pairs matching `q` and `flt`, best first (ascending
+    rank, then id). `after` is the last (rank, id) of the previous page: FTS5
+    scores every match either way, so a deep page costs the same as the first.
+    """
+    match = fts_query(q)
+    if not match:
+        return []
+    rank = f"bm25(papers_fts, {', '.join(map(str, BM25_WEIGHTS))})"
+    keyset = f"AND ({rank}, papers_fts.rowid) > (:rank, :after_id) " if after is not None else ""
+    # Filters join the matches to their papers rows (by primary key)
+    where, params = flt.sql("papers")
+    source = "papers_fts JOIN papers ON papers.id = papers_fts.rowid" if where else "papers_fts"
+    try:
+        rows = db.execute(
+            text(
+                f"SELECT papers_fts.rowid, {rank} AS rank FROM {source} WHERE papers_fts MATCH :match{where} "
+                f"{keyset}ORDER BY rank, papers_fts.rowid LIMIT :limit"
+            ),
+            {
+                "match": match, "limit": limit, **params,
+                **({"rank": after[0], "after_id": after[1]} if after is not None else {}),
+            },
+        ).all()
+        return [(row[0], row[1]) for row in rows]
+    except OperationalError as e:
+        # Index not migrated yet: fall back to a title scan
+        logger.warning(f"FTS search unavailable, falling back to LIKE: {e}")
+        query = db.query(Paper.id).filter(Paper.title.contains(q), *flt.conditions(Paper))
+        if after is not None:
+            query = query.filter(Paper.id > after[1])
+        return [(p.id, 0.0) for p in query.order_by(Paper.id).limit(limit).all()]
+
+def reciprocal_rank_fusion(rankings, k: int = 60, limit: int = 30) -> list[int]:
+    """
+    Merges ranked id lists: score(id) = sum(1 / (k + rank)). Rank-based, so
+    BM25 and cosine scores never need to be put on the same scale.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, pid in enumerate(ranking, start=1):
+            scores[pid] = scores.get(pid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda pid: -scores[pid])[:limit]
@@ -0,0 +1,170 @@
+import math
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.versions import versions
+from app.models.trending import PaperTrend
+from app.models.user import Library
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Decay windows: name -> (score column, half-life in seconds). "all" ranks by raw saves.
+WINDOWS = {
+    "day": (PaperTrend.score_day, 24 * 3600),
+    "week": (PaperTrend.score_week, 7 * 24 * 3600),
+    "all": (PaperTrend.saves, None),
+}
+EPOCH = datetime(2024, 1, 1)
+
+def log_weight(saved_at: datetime, half_life: float) -> float:
+    """
+    log of a save's weight 2^((t - EPOCH) / half_life). Every score is
+    scaled by the same 2^(-(now - EPOCH) / half_life) at read time, so the
+    ranking by stored log score equals the ranking by decayed score and
+    nothing has to be recomputed as time passes.
+    """
+    return (saved_at - EPOCH).total_seconds() / half_life * math.log(2)
+
+def _log_add(score, x):
+    if score is None:
+        return x
+    hi, lo = max(score, x), min(score, x)
+    return hi + math.log1p(math.exp(lo - hi))
+
+def _log_sub(score, x):
+    if score is None or x >= score - 1e-9:
+        return None
+    return score + math.log1p(-math.exp(x - score))
+
+class TrendingService:
+    """
+    Keeps `paper_trends` current from library toggles and serves a
+    precomputed top-N per window from memory. The lists are recomputed (an
+    indexed `ORDER BY score LIMIT N`) only after a toggle in any worker
+    (the shared save version moved), or every `TRENDING_REFRESH_SECONDS`.
+    """
+    def __init__(self):
+        self._top = {} # window -> (computed_at, saves version, [(paper_id, score), ...])
+        self._lock = threading.Lock()
+
+    def record_save(self, db: Session, paper_id: int, saved_at: datetime):
+        """ Adds a save to the counters. Runs inside the caller's transaction. """
+        trend = db.get(PaperTrend, paper_id)
+        if trend is None:
+            trend = PaperTrend(paper_id=paper_id, saves=0)
+            db.add(trend)
+        trend.saves = (trend.saves or 0) + 1
+        trend.score_day = _log_add(trend.score_day, log_weight(saved_at, WINDOWS["day"][1]))
+        trend.score_week = _log_add(trend.score_week, log_weight(saved_at, WINDOWS["week"][1]))
+        self.invalidate()
+
+    def record_unsave(self, db: Session, paper_id: int, saved_at: datetime):
+        """ Removes exactly the weight a save made at `saved_at` contributed. """
+        trend = db.get(PaperTrend, paper_id)
+        if trend is None:
+            return
+        trend.saves = max(0, (trend.saves or 0) - 1)
+        if trend.saves == 0:
+            trend.score_day = trend.score_week = None
+        else:
+            trend.score_day = _log_sub(trend.score_day, log_weight(saved_at, WINDOWS["day"][1]))
+            trend.score_week = _log_sub(trend.score_week, log_weight(saved_at, WINDOWS["week"][1]))
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._top.clear()
+
+    def top(self, db: Session, window: str = "week") -> list[int]:
+        """ Paper ids for the window, hottest first. O(1) while the cached list is fresh. """
+        return [paper_id for paper_id, _ in self._top_rows(db, window)]
+
+    def page(self, db: Session, window: str, cursor: dict, limit: int):
+        """
+        One page of the ranking, ordered by (score, paper id) descending.
+        The cursor is the last (score, paper id) shown. Pages inside the
+        cached top-N are served from memory; deeper ones are a keyset range
+        read on the score index. Returns (paper ids, next cursor key or None).
+        """
+        cached = self._top_rows(db, window)
+        after = (cursor["s"], cursor["i"]) if cursor else None
+        rows = cached if after is None else [row for row in cached if (row[1], row[0]) < after]
+        if len(rows) < limit and len(cached) >= settings.TRENDING_TOP_N:
+            # Past the cached list
+            column, _ = WINDOWS[window]
+            query = self._ranked(db, column)
+            if after is not None:
+                query = query.filter(tuple_(column, PaperTrend.paper_id) < tuple_(*after))
+            rows = [tuple(row) for row in query.limit(limit).all()]
+        rows = rows[:limit]
+        next_key = {"s": rows[-1][1], "i": rows[-1][0]} if len(rows) == limit else None
+        return [paper_id for paper_id, _ in rows], next_key
+
+    def _top_rows(self, db: Session, window: str):
+        version = versions.saves # Read first: a toggle during the query makes the result stale, not the version
+        cached = self._top.get(window)
+        if cached is not None and cached[1] == version and time.monotonic() - cached[0] < settings.TRENDING_REFRESH_SECONDS:
+            return cached[2]
+
+        column, _ = WINDOWS[window]
+        rows = [tuple(row) for row in self._ranked(db, column).limit(settings.TRENDING_TOP_N).all()]
+        with self._lock:
+            self._top[window] = (time.monotonic(), version, rows)
+        return rows
+
+    @staticmethod
+    def _ranked(db: Session, column):
+        return db.query(PaperTrend.paper_id, column).filter(PaperTrend.saves > 0, column.isnot(None)) \
+            .order_by(column.desc(), PaperTrend.paper_id.desc())
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Regenerates every counter from the `library` table and replaces the
+        stored ones. Returns how many papers had drifted from the rebuilt
+        values (a consistency check for the incremental path).
+        """
+        rebuilt = {}
+        for paper_id, saved_at in db.query(Library.paper_id, Library.created_at).yield_per(10000):
+            saved_at = saved_at or EPOCH
+            saves, day, week = rebuilt.get(paper_id, (0, None, None))
+            rebuilt[paper_id] = (
+                saves + 1,
+                _log_add(day, log_weight(saved_at, WINDOWS["day"][1])),
+                _log_add(week, log_weight(saved_at, WINDOWS["week"][1])),
+            )
+
+        drifted = 0
+        existing = {t.paper_id: t for t in db.query(PaperTrend).all()}
+        for paper_id, trend in existing.items():
+            fresh = rebuilt.get(paper_id, (0, None, None))
+            if not _same(trend, fresh):
+                drifted += 1
+        drifted += sum(1 for paper_id in rebuilt if paper_id not in existing)
+
+        db.query(PaperTrend).delete()
+        db.bulk_insert_mappings(PaperTrend, [
+            {"paper_id": pid, "saves": saves, "score_day": day, "score_week": week}
+            for pid, (saves, day, week) in rebuilt.items()
+        ])
+        db.commit()
+        self.invalidate()
+        versions.bump_saves()
+        logger.info(f"Rebuilt trending counters for {len(rebuilt)} papers ({drifted} had drifted).")
+        return drifted
+
+def _same(trend: PaperTrend, fresh) -> bool:
+    saves, day, week = fresh
+    if (trend.saves or 0) != saves:
+        return False
+    for stored, value in ((trend.score_day, day), (trend.score_week, week)):
+        if (stored is None) != (value is None):
+            return False
+        if stored is not None and not math.isclose(stored, value, rel_tol=1e-9, abs_tol=1e-6):
+            return False
+    return True
+
+trending_service = TrendingService()
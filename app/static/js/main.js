@@ -49,6 +49,34 @@ function toggleBibtex(pid) {
     }
 }
 
+// AI explanation, streamed over Server-Sent Events as it is generated
+var explain_streams = {};
+
+function explainPaper(pid) {
+    var el = document.getElementById('ai_expl_' + pid);
+    if (explain_streams[pid]) { return; } // Already streaming
+    el.innerHTML = '<div class="ai-expl" style="background: #f0fdf4; border: 1px solid #bbf7d0; padding: 15px; margin-top: 10px; border-radius: 4px; font-size: 14px; color: #166534;">' +
+        '<h4 style="margin: 0 0 5px 0; font-weight: bold;">🤖 AI Explanation</h4><div class="ai-body"></div></div>';
+    var body = el.getElementsByClassName('ai-body')[0];
+    var text = '';
+
+    var source = new EventSource('/ai/explain/' + pid + '/stream');
+    explain_streams[pid] = source;
+    function close() {
+        source.close();
+        delete explain_streams[pid];
+    }
+    source.onmessage = function (evt) {
+        text += evt.data;
+        body.innerHTML = text;
+    };
+    source.addEventListener('done', close);
+    source.addEventListener('error', function (evt) {
+        if (evt.data) { body.innerHTML = '<p style="color:red">' + evt.data + '</p>'; }
+        close();
+    });
+}
+
 // Initial setup
 document.addEventListener("DOMContentLoaded", function () {
     var qf = document.getElementById('qfield');
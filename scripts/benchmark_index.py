@@ -0,0 +1,75 @@
+import sys
+import os
+import argparse
+import time
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from app.core.ann import ENGINES, recall_at_k
+from app.core.cache import SearchCache
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.vectors import l2_normalize
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k, latency and memory of ANN engines vs. the exact scan.")
+    parser.add_argument("--engine", nargs="+", default=[settings.ANN_ENGINE], choices=sorted(ENGINES))
+    parser.add_argument("--nlist", type=int, default=settings.ANN_NLIST)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[settings.ANN_NPROBE])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[settings.ANN_RERANK],
+                        help="Candidates re-scored at full precision (quantised engines)")
+    parser.add_argument("--quantize", default=settings.ANN_QUANTIZE, choices=["", "sq8", "fp16"],
+                        help="Score ivf candidates on quantised codes")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N random vectors instead of the DB")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        # Clustered random vectors: roughly the topic structure of real abstracts
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((max(1, args.synthetic // 500), 384), dtype=np.float32)
+        embeddings = centers[rng.integers(0, len(centers), args.synthetic)]
+        embeddings += 1.5 * rng.standard_normal(embeddings.shape, dtype=np.float32)
+        embeddings = l2_normalize(embeddings)
+    else:
+        cache = SearchCache()
+        cache.load(SessionLocal())
+        embeddings = cache.snapshot.embeddings
+    print(f"Corpus: {len(embeddings)} x {embeddings.shape[1]}")
+
+    exact = recall_at_k(ENGINES["exact"].build(embeddings), embeddings, k=args.k, queries=args.queries)
+    print(f"{'exact':<22} recall@{args.k}=1.000  mean={exact[1]:.2f}ms  p99={exact[2]:.2f}ms  "
+          f"resident={embeddings.nbytes / 2**20:.0f}MB")
+
+    for name in args.engine:
+        if name == "exact":
+            continue
+        start = time.perf_counter()
+        index = ENGINES[name].build(
+            embeddings, nlist=args.nlist, train_sample=settings.ANN_TRAIN_SAMPLE,
+            iterations=settings.ANN_KMEANS_ITERATIONS, quantize=args.quantize, rerank=args.rerank[0],
+        )
+        print(f"Build ({name}): {time.perf_counter() - start:.1f}s")
+        if name == "ivf":
+            label = f"ivf+{args.quantize}" if args.quantize else "ivf"
+            variants = [(f"{label} nprobe={nprobe}", "nprobe", nprobe) for nprobe in args.nprobe]
+        else:
+            variants = [(f"{name} rerank={rerank}", "rerank", rerank) for rerank in args.rerank]
+        for label, attr, value in variants:
+            setattr(index, attr, value)
+            recall, mean_ms, p99_ms = recall_at_k(index, embeddings, k=args.k, queries=args.queries)
+            print(f"{label:<22} recall@{args.k}={recall:.3f}  mean={mean_ms:.2f}ms  p99={p99_ms:.2f}ms  "
+                  f"{resident(index, embeddings)}")
+
+def resident(index, embeddings) -> str:
+    """ Memory the engine needs in RAM; the float32 rows it re-ranks against can stay on disk. """
+    quantizer = getattr(index, "quantizer", None)
+    if quantizer is None:
+        return f"resident={embeddings.nbytes / 2**20:.0f}MB"
+    return f"resident={quantizer.codes.nbytes / 2**20:.0f}MB (+ re-ranked rows read from disk)"
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,43 @@
 import sys
 import os
+import argparse
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.core.database import SessionLocal, engine, Base
+from app.core.migrations import run_migrations
 from app.services.arxiv_service import ArxivFetcher
+from app.services.ingest_pipeline import IngestPipeline
 
 def main():
+    parser = argparse.ArgumentParser(description="Fetch papers from arXiv into the local database.")
+    parser.add_argument("--harvest", metavar="QUERY",
+                        help="Backfill every result of QUERY (e.g. 'cat:cs.LG'), resuming from the last checkpoint")
+    parser.add_argument("--max-papers", type=int, default=None, help="Stop a harvest after this many papers")
+    parser.add_argument("--page-size", type=int, default=None, help="Results per API call when harvesting")
+    parser.add_argument("--restart", action="store_true", help="Ignore the harvest checkpoint and start from 0")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Harvest with overlapping download / embed / write stages")
+    parser.add_argument("--download-workers", type=int, default=2, help="Concurrent page downloads (--pipeline)")
+    args = parser.parse_args()
+
     print("Initializing Database...")
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     
     print("Starting Fetch...")
     db = SessionLocal()
     fetcher = ArxivFetcher(db)
     
-    # Fetch a reasonable amount for the first run
-    fetcher.fetch_papers(max_results=50) # Small batch for speed
+    if args.harvest and args.pipeline:
+        pipeline = IngestPipeline(fetcher, download_workers=args.download_workers)
+        pipeline.run(args.harvest, max_papers=args.max_papers, page_size=args.page_size, restart=args.restart)
+    elif args.harvest:
+        fetcher.harvest(args.harvest, max_papers=args.max_papers, page_size=args.page_size, restart=args.restart)
+    else:
+        # Fetch a reasonable amount for the first run
+        fetcher.fetch_papers(max_results=50) # Small batch for speed
     
     print("Fetch complete.")
 
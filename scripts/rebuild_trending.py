@@ -0,0 +1,21 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import SessionLocal, engine, Base
+from app.core.migrations import run_migrations
+from app.services.trending_service import trending_service
+
+def main():
+    """ Regenerates the /hype counters from the library table. """
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    with SessionLocal() as db:
+        drifted = trending_service.rebuild(db)
+    print(f"Trending counters rebuilt. {drifted} papers differed from the incremental counters.")
+
+if __name__ == "__main__":
+    main()
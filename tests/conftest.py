@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.core.migrations import run_migrations
+# Every table, as in the app, whichever models the test module itself imports
+from app.models import explanation, harvest, paper, trending, user # noqa: F401
+
+@pytest.fixture
+def db():
+    """ Session on a fresh in-memory database, with the tables and migrations of a real one. """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+@pytest.fixture
+def statements(db):
+    """ SQL sent through `db`, in order (clear it before the part under test). """
+    sent = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, sql, *args: sent.append(sql))
+    return sent
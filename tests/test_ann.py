@@ -0,0 +1,87 @@
+import numpy as np
+from app.core.ann import ExactIndex, IVFIndex, fingerprint, recall_at_k, search_with_tail
+from app.core.vectors import exact_search, l2_normalize, top_k
+
+def clustered(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dim)).astype(np.float32)
+    points = centers[rng.integers(0, 20, n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    return l2_normalize(points)
+
+def test_exact_index_returns_best_first():
+    embeddings = l2_normalize(np.array([[1, 0], [0, 1], [1, 1]], dtype=np.float32))
+    rows, scores = ExactIndex(3).search(embeddings, np.array([1, 0.1], dtype=np.float32), 2)
+    assert rows.tolist() == [0, 2]
+    assert scores[0] >= scores[1]
+
+def test_ivf_recall_against_exact():
+    embeddings = clustered(2000)
+    index = IVFIndex.build(embeddings, nlist=20, nprobe=4)
+    recall, _, _ = recall_at_k(index, embeddings, k=10, queries=50)
+    assert recall > 0.9
+
+def test_tail_rows_are_searched():
+    embeddings = clustered(500)
+    index = IVFIndex.build(embeddings[:400], nlist=10, nprobe=2)
+    rows, _ = search_with_tail(index, embeddings, embeddings[450], 1)
+    assert rows.tolist() == [450]
+
+def test_ivf_persistence_checks_fingerprint(tmp_path):
+    embeddings = clustered(300)
+    index = IVFIndex.build(embeddings, nlist=8)
+    path = str(tmp_path / "ann.npz")
+    index.save(path, "ivf:a")
+    assert IVFIndex.load(path, "ivf:a", nprobe=3).size == 300
+    assert IVFIndex.load(path, "ivf:b", nprobe=3) is None
+
+def test_fingerprint_covers_vector_contents():
+    ids, embeddings = np.arange(300), clustered(300)
+    changed = embeddings.copy()
+    changed[7] = changed[8]
+    assert fingerprint(ids, embeddings) == fingerprint(ids.copy(), embeddings.copy())
+    assert fingerprint(ids, embeddings) != fingerprint(ids, changed)
+
+def test_top_k_excludes_positions_not_duplicates():
+    scores = np.array([0.9, 1.0, 1.0, 0.1], dtype=np.float32)
+    assert top_k(scores, 2, exclude=[1]).tolist() == [2, 0]
+    assert top_k(scores, 10, exclude=[0, 1]).tolist() == [2, 3]
+
+def test_exact_search_batches_queries():
+    embeddings = clustered(100)
+    rows, _ = exact_search(embeddings, embeddings[[3, 7]], 1)
+    assert [r.tolist() for r in rows] == [[3], [7]]
+
+def test_tail_exclusion():
+    embeddings = clustered(500)
+    index = IVFIndex.build(embeddings[:400], nlist=10, nprobe=10)
+    rows, _ = search_with_tail(index, embeddings, embeddings[450], 3, exclude=[450, 5])
+    assert 450 not in rows.tolist() and 5 not in rows.tolist()
+    assert len(rows) == 3
+
+def test_quantized_indexes_rerank_to_exact_results(tmp_path):
+    from app.core.ann import Float16Index, Int8Index
+    embeddings = clustered(3000)
+    for engine in (Int8Index, Float16Index):
+        index = engine.build(embeddings, rerank=100)
+        recall, _, _ = recall_at_k(index, embeddings, k=10, queries=50)
+        assert recall > 0.98
+        # Returned scores are the exact ones, not the quantised estimates
+        rows, scores = index.search(embeddings, embeddings[7], 5, exclude=np.array([7]))
+        assert 7 not in rows.tolist()
+        assert np.allclose(scores, embeddings[rows] @ embeddings[7])
+
+        path = str(tmp_path / f"{engine.name}.npz")
+        index.save(path, "meta")
+        assert engine.load(path, "other", rerank=100) is None
+        loaded = engine.load(path, "meta", rerank=100)
+        assert isinstance(loaded.codes, np.memmap)
+        assert loaded.search(embeddings, embeddings[7], 5)[0].tolist() == index.search(embeddings, embeddings[7], 5)[0].tolist()
+
+def test_ivf_with_quantized_candidates():
+    embeddings = clustered(2000)
+    index = IVFIndex.build(embeddings, nlist=20, nprobe=4, quantize="sq8", rerank=50)
+    recall, _, _ = recall_at_k(index, embeddings, k=10, queries=50)
+    assert recall > 0.9
+    rows, scores = index.search(embeddings, embeddings[3], 5, exclude=np.array([3]))
+    assert 3 not in rows.tolist()
+    assert np.allclose(scores, embeddings[rows] @ embeddings[3])
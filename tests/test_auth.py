@@ -0,0 +1,50 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from app.core.principals import Principal, PrincipalCache
+from app.core.security import HashPool
+
+def test_principal_cache_expires_and_invalidates():
+    cache = PrincipalCache(size=2, ttl=0.05)
+    cache.put(Principal(1, "a@example.com", True))
+    assert cache.get("a@example.com").id == 1
+
+    cache.invalidate("a@example.com")
+    assert cache.get("a@example.com") is None
+
+    cache.put(Principal(1, "a@example.com", True))
+    time.sleep(0.06)
+    assert cache.get("a@example.com") is None
+    assert cache.metrics() == {"entries": 0, "hits": 1, "misses": 2}
+
+def test_principal_cache_is_bounded():
+    cache = PrincipalCache(size=2, ttl=60)
+    for i in range(3):
+        cache.put(Principal(i, f"{i}@example.com", True))
+    assert cache.get("0@example.com") is None
+    assert cache.get("2@example.com").id == 2
+
+def test_hash_pool_hashes_off_process_and_sheds_load():
+    pool = HashPool(workers=1, queue_size=1)
+
+    async def run():
+        hashed = await pool.hash("secret")
+        assert await pool.verify("secret", hashed)
+        assert not await pool.verify("wrong", hashed)
+        with pytest.raises(ValueError):
+            await pool.verify("secret", "not-a-hash")
+        # One running + one queued; the third is refused
+        return await asyncio.gather(*(pool.hash("x") for _ in range(3)), return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 503
+    metrics = pool.metrics()
+    assert metrics["rejected"] == 1
+    assert metrics["completed"] == 5 and metrics["failed"] == 1 # Only successes count as completed
+    assert metrics["max_pending"] == 2
+    assert metrics["queue_depth"] == 0
@@ -0,0 +1,102 @@
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from app.core.ann import ExactIndex, Int8Index
+from app.core.cache import SearchCache
+from app.core.config import settings
+from app.core.vectors import pack_embedding
+from app.models.paper import Paper
+
+def add_paper(db, pid, vector, indexed_at):
+    db.add(Paper(id=pid, arxiv_id=f"2401.{pid:05d}", embedding=pack_embedding(vector), indexed_at=indexed_at))
+    db.commit()
+
+def test_load_is_float32_and_sorted(db):
+    t0 = datetime(2024, 1, 1)
+    add_paper(db, 2, [0.0, 1.0], t0)
+    add_paper(db, 1, [1.0, 0.0], t0)
+
+    cache = SearchCache()
+    cache.load(db)
+    snap = cache.snapshot
+    assert snap.embeddings.dtype == np.float32
+    assert snap.ids.tolist() == [1, 2]
+    assert snap.row_of(2) == 1
+    assert snap.row_of(3) is None
+
+def test_refresh_applies_only_delta_and_keeps_old_snapshot_intact(db):
+    t0 = datetime(2024, 1, 1)
+    add_paper(db, 1, [1.0, 0.0], t0)
+    add_paper(db, 2, [0.0, 1.0], t0)
+
+    cache = SearchCache()
+    cache.load(db)
+    before = cache.snapshot
+
+    # New paper plus a re-versioned one
+    add_paper(db, 3, [1.0, 1.0], t0 + timedelta(hours=1))
+    paper = db.get(Paper, 1)
+    paper.embedding = pack_embedding([0.5, 0.5])
+    paper.indexed_at = t0 + timedelta(hours=1)
+    db.commit()
+
+    assert cache.refresh(db) == 2
+    after = cache.snapshot
+    assert after.generation > before.generation
+    assert after.ids.tolist() == [1, 2, 3]
+    assert np.allclose(after.embeddings[0], [np.sqrt(0.5), np.sqrt(0.5)])
+    # Readers holding the old snapshot still see a consistent index
+    assert before.ids.tolist() == [1, 2]
+    assert before.embeddings[0].tolist() == [1.0, 0.0]
+
+    # Nothing changed since: boundary rows are re-read but not re-applied
+    assert cache.refresh(db) == 0
+
+def test_upsert_appends_into_spare_capacity():
+    cache = SearchCache()
+    cache.upsert([(1, pack_embedding([1.0, 0.0]))])
+    first = cache.snapshot
+    cache.upsert([(5, pack_embedding([0.0, 1.0])), (4, pack_embedding([1.0, 1.0]))])
+    assert cache.snapshot.ids.tolist() == [1, 4, 5]
+    assert np.allclose(cache.snapshot.embeddings[1], [np.sqrt(0.5), np.sqrt(0.5)])
+    assert len(first) == 1
+
+    # Out-of-order id falls back to a sorted rebuild
+    cache.upsert([(2, pack_embedding([0.0, 0.25]))])
+    assert cache.snapshot.ids.tolist() == [1, 2, 4, 5]
+    assert cache.snapshot.embeddings[1].tolist() == [0.0, 1.0]
+
+def test_search_excludes_ids_but_keeps_duplicates():
+    cache = SearchCache()
+    cache.upsert([(1, pack_embedding([1.0, 0.0])), (2, pack_embedding([1.0, 0.0])), (3, pack_embedding([0.0, 1.0]))])
+    rows, scores = cache.search(np.array([2.0, 0.0]), 2, exclude_ids=[1])
+    assert cache.snapshot.ids_for(rows) == [2, 3]
+    assert np.isclose(scores[0], 1.0)
+
+def wait_for_index(cache, kind, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not isinstance(cache.snapshot.index, kind) or cache._building:
+        assert time.monotonic() < deadline, "index build did not land"
+        time.sleep(0.01)
+    return cache.snapshot.index
+
+def test_rewritten_vectors_rebuild_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ANN_ENGINE", "sq8")
+    monkeypatch.setattr(settings, "ANN_MIN_ROWS", 1)
+    monkeypatch.setattr(settings, "ANN_INDEX_PATH", str(tmp_path / "ann.npz"))
+    rng = np.random.default_rng(0)
+    cache = SearchCache()
+    cache.upsert([(pid, pack_embedding(rng.standard_normal(8))) for pid in range(1, 51)])
+    old = wait_for_index(cache, Int8Index)
+
+    # Appends keep the index (scored as a tail); a re-embedded paper doesn't
+    cache.upsert([(51, pack_embedding(rng.standard_normal(8)))])
+    assert cache.snapshot.index is old
+    vector = rng.standard_normal(8)
+    cache.upsert([(7, pack_embedding(vector))])
+    assert isinstance(cache.snapshot.index, ExactIndex)
+
+    new = wait_for_index(cache, Int8Index)
+    row = cache.snapshot.row_of(7)
+    approx = new.quantizer.scores(cache.snapshot.embeddings[row])[row]
+    assert abs(approx - 1.0) <= new.quantizer.error_bound(cache.snapshot.embeddings[row])
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.core.writer import DatabaseWriter
+from app.models.explanation import Explanation
+from app.models.paper import Paper
+from app.services.explanation_service import ExplanationService
+from app.services.gemini_service import StubService
+
+def setup(tmp_path, delay=0.05):
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([
+            Paper(id=i, arxiv_id=f"2401.0000{i}", version=1, title=f"Paper {i}", summary="s", published=datetime(2024, 1, i))
+            for i in (1, 2, 3)
+        ])
+        db.commit()
+    AsyncSession = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"), expire_on_commit=False)
+    backend = StubService(delay=delay)
+    return Session, ExplanationService(backend, AsyncSession, DatabaseWriter(Session)), backend
+
+def test_concurrent_requests_share_one_call_and_are_stored(tmp_path):
+    Session, service, backend = setup(tmp_path)
+    with Session() as db:
+        paper = db.get(Paper, 1)
+
+    async def run():
+        results = await asyncio.gather(*(service.explain(paper) for _ in range(10)))
+        # Stored: later requests never reach the backend
+        again = await service.explain(paper)
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert len(set(results)) == 1 and again == results[0]
+    assert backend.calls == 1
+    with Session() as db:
+        assert db.query(Explanation).count() == 1
+
+    # A new arXiv version gets a fresh explanation
+    paper.version = 2
+    asyncio.run(service.explain(paper))
+    assert backend.calls == 2
+
+def test_pregenerate_fills_missing_explanations(tmp_path):
+    Session, service, backend = setup(tmp_path, delay=0)
+    assert asyncio.run(service.pregenerate(limit=10)) == 3
+    assert asyncio.run(service.pregenerate(limit=10)) == 0
+    assert backend.calls == 3
+
+def test_streams_are_shared_stored_and_cancelled_when_abandoned(tmp_path):
+    Session, service, backend = setup(tmp_path, delay=0.1)
+    with Session() as db:
+        paper, other = db.get(Paper, 1), db.get(Paper, 2)
+
+    async def collect(paper):
+        return "".join([chunk async for chunk in service.stream(paper)])
+
+    async def run():
+        first, second = await asyncio.gather(collect(paper), collect(paper))
+        stored = await service.explain(paper)
+        return first, second, stored
+
+    first, second, stored = asyncio.run(run())
+    assert first == second == stored
+    assert backend.calls == 1 # One upstream stream, replayed to both clients; the result is stored
+
+    async def abandon():
+        chunks = service.stream(other)
+        await chunks.__anext__()
+        await chunks.aclose() # Client disconnected
+        await asyncio.sleep(0.05)
+        return service._streams
+
+    assert asyncio.run(abandon()) == {}
+    with Session() as db:
+        assert db.query(Explanation).filter_by(paper_id=2).count() == 0
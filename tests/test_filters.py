@@ -0,0 +1,79 @@
+from datetime import date, datetime
+import numpy as np
+import pytest
+from app.core.ann import ExactIndex, Int8Index, IVFIndex
+from app.core.cache import CacheSnapshot, SearchCache
+from app.core.config import settings
+from app.core.filters import PaperFilter, RowColumns
+from app.core.shared_matrix import SharedMatrix
+from app.core.vectors import l2_normalize, pack_embedding
+from app.models.paper import Paper
+from app.services.search_service import keyword_page
+
+CATEGORIES = ["cs.LG", "cs.CL", "math.ST", None]
+
+def make_snapshot(engine, n=2000, **params):
+    rng = np.random.default_rng(1)
+    embeddings = l2_normalize(rng.standard_normal((n, 16), dtype=np.float32))
+    categories = [CATEGORIES[i % 4] for i in range(n)]
+    published = [datetime(2020 + i % 5, 1 + i % 12, 1) for i in range(n)]
+    columns = RowColumns.build(categories, published)
+    return CacheSnapshot(np.arange(n, dtype=np.int64), embeddings, index=engine.build(embeddings, **params), columns=columns)
+
+def test_masks_compile_categories_and_inclusive_date_ranges():
+    columns = RowColumns.build(
+        ["cs.LG", "cs.CL", None, "cs.LG"],
+        [datetime(2024, 1, 1, 12), "2024-03-31 23:59:00.000000", datetime(2024, 2, 1), None],
+    )
+    assert columns.mask(PaperFilter()) is None
+    assert columns.mask(PaperFilter(("cs.LG",))).tolist() == [True, False, False, True]
+    assert columns.mask(PaperFilter(("cs.CL", "cs.LG"))).tolist() == [True, True, False, True]
+    assert columns.mask(PaperFilter(("unknown",))).tolist() == [False] * 4
+    assert columns.mask(PaperFilter(since=date(2024, 2, 1))).tolist() == [False, True, True, False]
+    assert columns.mask(PaperFilter(until=date(2024, 3, 31))).tolist() == [True, True, True, False]
+    flt = PaperFilter(("cs.LG",), until=date(2024, 1, 1))
+    assert columns.mask(flt) is columns.mask(flt) # Compiled once per snapshot
+
+@pytest.mark.parametrize("engine, params", [
+    (ExactIndex, {}), (Int8Index, {"rerank": 64}), (IVFIndex, {"nlist": 32, "nprobe": 4}),
+])
+@pytest.mark.parametrize("scan_rows", [0, 10**6]) # Through the index / exact scan of the matching rows
+def test_filtered_top_k_is_the_top_k_of_the_matching_rows(engine, params, scan_rows, monkeypatch):
+    monkeypatch.setattr(settings, "FILTER_SCAN_ROWS", scan_rows)
+    snapshot = make_snapshot(engine, **params)
+    flt = PaperFilter(("cs.CL",), since=date(2022, 1, 1))
+    allowed = snapshot.mask(flt)
+    for row in range(5):
+        query = snapshot.embeddings[row]
+        rows, _ = snapshot.search(query, 10, exclude_ids=[row], allowed=allowed)
+        assert len(rows) == 10 and allowed[rows].all() and row not in rows
+
+        matching = np.flatnonzero(allowed & (np.arange(len(snapshot)) != row))
+        truth = matching[np.argsort(-(snapshot.embeddings[matching] @ query))[:10]]
+        recall = len(np.intersect1d(rows, truth)) / 10
+        assert recall >= (0.7 if engine is IVFIndex and not scan_rows else 1.0)
+
+def test_columns_follow_upserts_and_the_shared_matrix(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHARED_CACHE_POLL_SECONDS", 0)
+    leader = SearchCache(SharedMatrix(str(tmp_path)))
+    follower = SearchCache(SharedMatrix(str(tmp_path)))
+    vector = pack_embedding([1.0, 0.0])
+    leader.upsert([(5, vector, "cs.LG", datetime(2024, 1, 1)), (9, vector, "cs.CL", datetime(2024, 2, 1))])
+    # Out of order, a re-embedded row without metadata, and a new category
+    leader.upsert([(2, vector, "math.ST", None), (9, pack_embedding([0.0, 1.0]))])
+
+    snap = follower.snapshot
+    assert snap.ids.tolist() == [2, 5, 9]
+    assert snap.ids[snap.mask(PaperFilter(("cs.CL",)))].tolist() == [9] # Kept through the replace
+    assert snap.ids[snap.mask(PaperFilter(("math.ST", "cs.LG")))].tolist() == [2, 5]
+    assert snap.ids[snap.mask(PaperFilter(since=date(2024, 1, 15)))].tolist() == [9]
+
+def test_keyword_hits_are_filtered_in_sql(db):
+    for i in range(6):
+        db.add(Paper(
+            id=i + 1, arxiv_id=str(i), title="graph networks", summary="", authors=[],
+            category=CATEGORIES[i % 2], published=datetime(2024, 1 + i, 1),
+        ))
+    db.commit()
+    flt = PaperFilter(("cs.LG",), since=date(2024, 2, 1), until=date(2024, 5, 1))
+    assert sorted(pid for pid, _ in keyword_page(db, "graph", 10, flt=flt)) == [3, 5]
@@ -0,0 +1,26 @@
+from app.core.fragments import FragmentCache
+
+def test_bump_invalidates_and_drops_stale_renders():
+    cache = FragmentCache(max_entries=10, max_bytes=1000)
+    cache.put(("index",), "<a>", cache.version)
+    assert cache.get(("index",)) == "<a>"
+
+    started = cache.version
+    cache.bump()
+    assert cache.get(("index",)) is None
+    # A render that began before the bump is not stored
+    cache.put(("index",), "<old>", started)
+    assert cache.get(("index",)) is None
+
+def test_lru_respects_entry_and_byte_limits():
+    cache = FragmentCache(max_entries=2, max_bytes=10)
+    cache.put("a", "aaaa", 0)
+    cache.put("b", "bbbb", 0)
+    cache.get("a") # "b" is now least recently used
+    cache.put("c", "cc", 0)
+    assert cache.get("b") is None and cache.get("a") == "aaaa"
+
+    cache.put("d", "dddddddd", 0) # Over the byte limit: evicts until it fits
+    assert cache.get("a") is None and cache.get("d") == "dddddddd"
+    cache.put("e", "x" * 11, 0) # Larger than the whole cache: not stored
+    assert cache.get("e") is None
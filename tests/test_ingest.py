@@ -0,0 +1,160 @@
+import numpy as np
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.paper import Paper
+from app.services.arxiv_service import ArxivFetcher
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed_papers(self, papers, batch_size=64):
+        self.calls.append(len(papers))
+        return np.ones((len(papers), 4), dtype=np.float32)
+
+def entry(arxiv_id, version):
+    return {
+        "arxiv_id": arxiv_id, "version": version, "title": f"Paper {arxiv_id}", "summary": "Abstract",
+        "authors": ["A. Author"], "published": datetime(2024, 1, 1), "updated": datetime(2024, 1, 1),
+        "category": "cs.LG", "links": {},
+    }
+
+def test_only_new_or_reversioned_entries_are_embedded(db):
+    db.add(Paper(**entry("2401.00001", 1)))
+    db.add(Paper(**entry("2401.00002", 2)))
+    db.commit()
+
+    embedder = FakeEmbedder()
+    fetcher = ArxivFetcher(db, embedder=embedder)
+    entries = [
+        entry("2401.00001", 2), # re-versioned
+        entry("2401.00002", 2), # unchanged
+        entry("2401.00003", 1), # new
+        entry("2401.00003", 1), # duplicate within the feed
+    ]
+    changed = fetcher._select_changed(db, entries)
+    assert sorted(d["arxiv_id"] for d in changed) == ["2401.00001", "2401.00003"]
+
+    fetcher._embed_entries(changed)
+    assert embedder.calls == [2]
+    assert all(len(d["embedding"]) == 16 for d in changed)
+
+def test_bulk_upsert_inserts_and_only_applies_newer_versions(db):
+    db.add(Paper(**entry("2401.00001", 2)))
+    db.commit()
+
+    fetcher = ArxivFetcher(db, embedder=FakeEmbedder())
+    stale = entry("2401.00001", 1)
+    stale["title"] = "Stale"
+    newer = entry("2401.00001", 3)
+    newer["title"] = "Revised"
+    assert fetcher._upsert_papers(db, [stale, entry("2401.00002", 1)]) == 1
+    assert fetcher._upsert_papers(db, [newer]) == 1
+
+    papers = {p.arxiv_id: p for p in db.query(Paper).all()}
+    assert papers["2401.00001"].version == 3
+    assert papers["2401.00001"].title == "Revised"
+    assert papers["2401.00002"].indexed_at is not None
+
+def test_upsert_pushes_rows_into_live_cache(db):
+    from app.core.cache import SearchCache
+    cache = SearchCache()
+    fetcher = ArxivFetcher(db, cache=cache, embedder=FakeEmbedder())
+    changed = [entry("2401.00001", 1), entry("2401.00002", 1)]
+    fetcher._embed_entries(changed)
+    fetcher._upsert_papers(db, changed)
+    assert len(cache.snapshot) == 2
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/"
+      xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <opensearch:totalResults>3</opensearch:totalResults>
+  {entries}
+</feed>"""
+
+ENTRY = """<entry>
+    <id>http://arxiv.org/abs/2401.0000{n}v2</id>
+    <updated>2024-01-02T00:00:00Z</updated>
+    <published>2024-01-01T00:00:00Z</published>
+    <title>Paper
+      {n}</title>
+    <summary>Abstract {n}</summary>
+    <author><name>A. Author</name></author>
+    <author><name>B. Author</name></author>
+    <link href="http://arxiv.org/abs/2401.0000{n}v2" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/2401.0000{n}v2" rel="related" type="application/pdf"/>
+    <arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>"""
+
+def feed_bytes(numbers):
+    return FEED.format(entries="".join(ENTRY.format(n=n) for n in numbers)).encode()
+
+def test_feed_stream_parses_entries():
+    import io
+    from app.services.arxiv_service import FeedStream
+    feed = FeedStream(io.BytesIO(feed_bytes([1, 2])))
+    entries = list(feed)
+    assert feed.total_results == 3
+    assert [e["arxiv_id"] for e in entries] == ["2401.00001", "2401.00002"]
+    assert entries[0]["version"] == 2
+    assert entries[0]["title"] == "Paper 1"
+    assert entries[0]["authors"] == ["A. Author", "B. Author"]
+    assert entries[0]["links"]["pdf"].endswith("v2")
+    assert entries[0]["category"] == "cs.LG"
+
+def fake_arxiv(monkeypatch, tmp_path, pages):
+    """ Points the fetcher at a scratch DB and a canned paged API. """
+    import io
+    from app.core.config import settings
+    from app.services import arxiv_service, ingest_pipeline
+
+    # A file DB, so each pipeline thread gets its own connection and transaction
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(arxiv_service, "SessionLocal", Session)
+    monkeypatch.setattr(ingest_pipeline, "SessionLocal", Session)
+    monkeypatch.setattr(settings, "ARXIV_REQUEST_DELAY", 0)
+
+    requested = []
+
+    class Opener:
+        addheaders = []
+        def open(self, url):
+            start = int(url.split("start=")[1].split("&")[0])
+            requested.append(start)
+            return io.BytesIO(feed_bytes(pages[start]))
+
+    monkeypatch.setattr(arxiv_service.urllib.request, "build_opener", Opener)
+    return Session, requested
+
+def test_harvest_pages_and_resumes_from_checkpoint(monkeypatch, tmp_path):
+    from app.models.harvest import HarvestCheckpoint
+    Session, requested = fake_arxiv(monkeypatch, tmp_path, {0: [1, 2], 2: [3], 3: []})
+    fetcher = ArxivFetcher(Session(), embedder=FakeEmbedder())
+
+    # Interrupted after the first page...
+    assert fetcher.harvest("cat:cs.LG", max_papers=2, page_size=2) == 2
+    # ...then resumed
+    assert fetcher.harvest("cat:cs.LG", page_size=2) == 1
+    assert requested == [0, 2]
+
+    with Session() as db:
+        checkpoint = db.get(HarvestCheckpoint, "cat:cs.LG")
+        assert checkpoint.completed and checkpoint.next_start == 3
+        assert db.query(Paper).count() == 3
+
+def test_pipeline_harvest_writes_all_pages_and_checkpoints(monkeypatch, tmp_path):
+    from app.models.harvest import HarvestCheckpoint
+    from app.services.ingest_pipeline import IngestPipeline
+    Session, requested = fake_arxiv(monkeypatch, tmp_path, {0: [1, 2], 2: [3]})
+    pipeline = IngestPipeline(ArxivFetcher(Session(), embedder=FakeEmbedder()), download_workers=2)
+
+    assert pipeline.run("cat:cs.LG", page_size=2) == 3
+    assert sorted(requested) == [0, 2]
+    assert pipeline.stats["write"].items == 3
+    with Session() as db:
+        checkpoint = db.get(HarvestCheckpoint, "cat:cs.LG")
+        assert checkpoint.completed and checkpoint.next_start == 3
@@ -1,5 +1,24 @@
+import html
+import re
+from datetime import datetime
+import numpy as np
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from app import main
+from app.core.cache import SearchCache
+from app.core.config import settings
+from app.core.database import Base, get_async_db
+from app.core.fragments import FragmentCache
+from app.core.migrations import run_migrations
+from app.core.pagination import encode_cursor
+from app.core.paper_store import PaperStore
+from app.core.vectors import pack_embedding
 from app.main import app
+from app.models.paper import Paper
 
 client = TestClient(app, base_url="http://localhost")
 
@@ -27,3 +46,119 @@ def test_login_flow():
     response = client.post("/login_or_create", data=login_data)
     assert response.status_code == 200
     assert "access_token" in response.json()
+
+def test_health_and_readiness():
+    assert client.get("/healthz").json() == {"status": "ok"}
+    response = client.get("/readyz")
+    assert response.status_code in (200, 503)
+    body = response.json()
+    assert set(body["components"]) == {"index", "model"}
+    assert "imports" in body["timings"]
+
+@pytest.fixture
+def async_routes(tmp_path, monkeypatch):
+    """
+    Serves the routes from a scratch file DB through an aiosqlite engine, with
+    private caches. Returns (sync session to seed it, SQL run on the async engine).
+    """
+    url = f"sqlite:///{tmp_path / 'papers.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    run_migrations(sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'papers.db'}", poolclass=NullPool)
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    async def get_test_db():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_async_db, get_test_db)
+    monkeypatch.setattr(main, "search_cache", SearchCache())
+    monkeypatch.setattr(main, "paper_store", PaperStore()) # Not loaded: every paper is read through the session
+    monkeypatch.setattr(main, "fragment_cache", FragmentCache())
+    return sessionmaker(bind=sync_engine)(), statements
+
+def listed(path):
+    """ Paper ids on the page at `path`, and its "more" link. """
+    response = client.get(path)
+    assert response.status_code == 200
+    more = re.search(r'hx-get="([^"]+)" hx-swap="outerHTML"', response.text)
+    return [int(pid) for pid in re.findall(r'id="pid(\d+)"', response.text)], more and html.unescape(more.group(1))
+
+def test_search_and_similar_through_the_async_engine(async_routes, monkeypatch):
+    db, statements = async_routes
+    papers = {1: ("graph neural networks", [1.0, 0.0]), 2: ("graph transformers", [0.9, 0.1]), 3: ("protein folding", [0.0, 1.0])}
+    for pid, (title, vector) in papers.items():
+        db.add(Paper(
+            id=pid, arxiv_id=f"2401.{pid:05d}", title=title, summary="", authors=[], category="cs.LG",
+            published=datetime(2024, 1, pid), links={}, embedding=pack_embedding(vector), indexed_at=datetime(2024, 1, 1),
+        ))
+    db.commit()
+    main.search_cache.load(db)
+    async def encode_async(text):
+        return np.array([1.0, 0.0], dtype=np.float32)
+    monkeypatch.setattr(main, "model_warming_up", lambda: False)
+    monkeypatch.setattr(main.query_encoder, "encode_async", encode_async)
+
+    assert listed("/search?q=graph")[0] == [1, 2, 3]
+    assert listed("/search?q=graph&mode=keyword")[0] in ([1, 2], [2, 1])
+    assert listed("/similar/1")[0] == [2, 3]
+    assert any("papers_fts" in sql for sql in statements) and any("FROM papers" in sql for sql in statements)
+
+def test_recent_pages_skip_undated_papers(async_routes, monkeypatch):
+    db, _ = async_routes
+    monkeypatch.setattr(settings, "PAGE_SIZE", 3)
+    for pid in range(1, 6):
+        # Undated papers sort last, so they would fill (and end) the first page
+        published = datetime(2024, 1, pid) if pid in (2, 5) else None
+        db.add(Paper(id=pid, arxiv_id=f"2401.{pid:05d}", title=str(pid), authors=[], links={}, published=published))
+    db.commit()
+    assert listed("/search") == ([5, 2], None)
+
+    # Full pages of dated papers still continue from the last one shown
+    for pid in range(6, 9):
+        db.add(Paper(id=pid, arxiv_id=f"2401.{pid:05d}", title=str(pid), authors=[], links={}, published=datetime(2024, 1, pid)))
+    db.commit()
+    main.fragment_cache.bump()
+    shown, more = listed("/search")
+    assert shown == [8, 7, 6] and more
+    assert listed(more) == ([5, 2], None)
+
+def test_similar_fragments_from_warm_up_are_dropped_once_the_index_loads(async_routes, monkeypatch):
+    db, _ = async_routes
+    for pid, vector in ((1, [1.0, 0.0]), (2, [0.9, 0.1])):
+        db.add(Paper(
+            id=pid, arxiv_id=f"2401.{pid:05d}", title=str(pid), authors=[], links={},
+            published=datetime(2024, 1, pid), embedding=pack_embedding(vector), indexed_at=datetime(2024, 1, 1),
+        ))
+    db.commit()
+    assert listed("/similar/1")[0] == [] # Still warming up: the index is empty
+
+    monkeypatch.setattr(main, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    main.load_index()
+    assert listed("/similar/1")[0] == [2]
+
+def test_hybrid_pages_end_with_a_notice_at_the_candidate_pool(async_routes, monkeypatch):
+    db, _ = async_routes
+    monkeypatch.setattr(settings, "PAGE_SIZE", 2)
+    monkeypatch.setattr(settings, "SEARCH_CANDIDATES", 2)
+    for pid in range(1, 6):
+        db.add(Paper(
+            id=pid, arxiv_id=f"2401.{pid:05d}", title="graph " * pid, summary="", authors=[], links={},
+            published=datetime(2024, 1, pid), embedding=pack_embedding([1.0, pid / 10]), indexed_at=datetime(2024, 1, 1),
+        ))
+    db.commit()
+    main.search_cache.load(db)
+    async def encode_async(text):
+        return np.array([1.0, 0.0], dtype=np.float32)
+    monkeypatch.setattr(main, "model_warming_up", lambda: False)
+    monkeypatch.setattr(main.query_encoder, "encode_async", encode_async)
+
+    shown, more = listed("/search?q=graph")
+    assert len(shown) == 2 and more
+    ids, more = listed(more)
+    shown += ids
+    assert more is None and len(shown) == len(set(shown)) <= 4 # Two rankers, two candidates each
+    text = client.get("/search?q=graph&cursor=" + encode_cursor({"o": 2, "m": "hybrid"})).text
+    assert f"End of the {len(shown)} best hybrid matches" in text
+    assert "/search?q=graph&amp;mode=semantic" in text and "/search?q=graph&amp;mode=keyword" in text
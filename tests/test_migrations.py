@@ -0,0 +1,45 @@
+import json
+import numpy as np
+from sqlalchemy import create_engine, text
+from app.core import migrations
+from app.core.migrations import run_migrations
+from app.core.vectors import EMBEDDING_DTYPE, pack_embedding, unpack_embedding
+
+# The papers table as the baseline release created it: embeddings as JSON float lists
+BASELINE_PAPERS = (
+    "CREATE TABLE papers (id INTEGER PRIMARY KEY, arxiv_id VARCHAR UNIQUE, version INTEGER, title VARCHAR, "
+    "authors JSON, summary TEXT, published DATETIME, updated DATETIME, category VARCHAR, links JSON, "
+    "embedding JSON, created_at DATETIME)"
+)
+
+def test_pack_embedding_round_trips_float32():
+    blob = pack_embedding([0.1, -2.5, 3.0])
+    assert len(blob) == 3 * EMBEDDING_DTYPE.itemsize
+    assert unpack_embedding(blob).tolist() == np.array([0.1, -2.5, 3.0], dtype=np.float32).tolist()
+
+def test_json_embeddings_are_migrated_to_blobs_once(monkeypatch):
+    monkeypatch.setattr(migrations, "BATCH_SIZE", 2) # Several batches
+    engine = create_engine("sqlite://")
+    vectors = {pid: [pid / 10, -1.0, 0.5] for pid in (1, 2, 4)}
+    with engine.begin() as conn:
+        conn.execute(text(BASELINE_PAPERS))
+        for pid, vector in vectors.items():
+            conn.execute(text(
+                "INSERT INTO papers (id, arxiv_id, title, embedding, created_at) "
+                "VALUES (:id, :arxiv_id, 't', :embedding, '2024-01-01 00:00:00')"
+            ), {"id": pid, "arxiv_id": f"2401.{pid:05d}", "embedding": json.dumps(vector)})
+        conn.execute(text("INSERT INTO papers (id, arxiv_id, embedding) VALUES (3, '2401.00003', 'null')"))
+
+    def stored():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT id, typeof(embedding), embedding FROM papers ORDER BY id")).all()
+
+    run_migrations(engine)
+    rows = stored()
+    assert [row[1] for row in rows] == ["blob", "blob", "null", "blob"]
+    for pid, _, blob in rows:
+        if pid in vectors:
+            assert unpack_embedding(blob).tolist() == np.array(vectors[pid], dtype=np.float32).tolist()
+
+    run_migrations(engine) # Idempotent: nothing left to rewrite
+    assert stored() == rows
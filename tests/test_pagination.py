@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from app.core.ann import ExactIndex, Int8Index
+from app.core.cache import CacheSnapshot
+from app.core.config import settings
+from app.core.pagination import decode_cursor, encode_cursor, vector_page
+from app.core.vectors import l2_normalize
+from app.models.paper import Paper
+from app.models.user import Library
+from app.services.search_service import keyword_page
+from app.services.trending_service import TrendingService
+
+def walk(fetch):
+    """ Follows cursors until the last page; returns every id in order. """
+    ids, key = [], {}
+    while True:
+        page, key = fetch(decode_cursor(encode_cursor(key)) if key else {})
+        ids += page
+        if key is None:
+            return ids
+
+def make_snapshot(engine=ExactIndex, n=200, **params):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((n, 16), dtype=np.float32)
+    embeddings[10:15] = embeddings[3] # Exact duplicates tie on score
+    embeddings = l2_normalize(embeddings)
+    ids = np.arange(1, n + 1, dtype=np.int64) * 10
+    return CacheSnapshot(ids, embeddings, index=engine.build(embeddings, **params)), embeddings[3]
+
+@pytest.mark.parametrize("engine, params", [(ExactIndex, {}), (Int8Index, {"rerank": 8})])
+def test_vector_pages_continue_the_exact_ranking(engine, params):
+    snapshot, query = make_snapshot(engine, **params)
+    expected, _ = snapshot.search(query, len(snapshot), exclude_ids=[40])
+    paged = walk(lambda key: vector_page(snapshot, query, key, limit=4, exclude_ids=[40]))
+    # Every paper exactly once (the five tied duplicates included), best first
+    assert len(paged) == len(set(paged)) == len(expected)
+    assert set(paged) == set(snapshot.ids_for(expected))
+    scores = snapshot.embeddings[snapshot.rows_of(paged)] @ l2_normalize(query)
+    assert np.all(np.diff(scores) <= 0)
+
+def test_keyword_pages(db):
+    for i in range(7):
+        db.add(Paper(arxiv_id=str(i), title="graph " * (i % 3 + 1), summary="", authors=[], published=datetime(2024, 1, 1)))
+    db.commit()
+    everything = [pid for pid, _ in keyword_page(db, "graph", 100)]
+
+    def fetch(key):
+        hits = keyword_page(db, "graph", 3, (key["r"], key["i"]) if key else None)
+        return [pid for pid, _ in hits], ({"r": hits[-1][1], "i": hits[-1][0]} if len(hits) == 3 else None)
+    assert walk(fetch) == everything
+
+def test_trending_pages_run_past_the_cached_top_n(db, monkeypatch):
+    monkeypatch.setattr(settings, "TRENDING_TOP_N", 4)
+    service = TrendingService()
+    now = datetime(2026, 6, 1)
+    for pid in range(1, 11):
+        db.add(Paper(id=pid, arxiv_id=str(pid), title=str(pid)))
+        for user in range(pid % 4 + 1): # Many ties on the save count
+            db.add(Library(user_id=user, paper_id=pid, created_at=now - timedelta(hours=pid)))
+            service.record_save(db, pid, now - timedelta(hours=pid))
+    db.commit()
+
+    paged = walk(lambda key: service.page(db, "all", key, 3))
+    assert len(paged) == len(set(paged)) == 10
+    saves = {pid: pid % 4 + 1 for pid in range(1, 11)}
+    assert [saves[pid] for pid in paged] == sorted(saves.values(), reverse=True)
+    assert service.top(db, "all") == paged[:4]
+
+def test_invalid_cursors_are_rejected():
+    with pytest.raises(HTTPException):
+        decode_cursor("not-base64!")
+    with pytest.raises(HTTPException):
+        vector_page(None, None, {"s": "high", "x": []})
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.core import paper_store as store_module
+from app.core.database import Base
+from app.core.paper_store import PaperStore
+from app.core.versions import VersionCounters
+from app.core.vectors import pack_embedding
+from app.models.paper import Paper
+
+T0 = datetime(2024, 1, 1)
+
+def add_paper(db, pid, title, indexed_at=T0):
+    db.add(Paper(
+        id=pid, arxiv_id=f"2401.{pid:05d}", title=title, authors=["A", "B"], summary=f"abstract {pid}", category="cs.LG",
+        published=T0, links={"abs": "a", "pdf": "p"}, embedding=pack_embedding([1.0, 0.0]), indexed_at=indexed_at,
+    ))
+    db.commit()
+
+def test_hydrates_in_order_without_sql(db, statements, monkeypatch):
+    monkeypatch.setattr(store_module, "versions", VersionCounters())
+    for pid in (1, 2, 3):
+        add_paper(db, pid, f"paper {pid}")
+    store = PaperStore()
+    statements.clear()
+    store.load(db)
+    # Neither the embedding nor the abstracts are resident
+    assert len(statements) == 1 and "embedding" not in statements[0] and "summary" not in statements[0]
+
+    statements.clear()
+    records = store.hydrate(db, [3, 99, 1])
+    assert [r.id for r in records] == [3, 1] and records[0].authors == ("A", "B") and records[0].links["abs"] == "a"
+    assert [r.summary for r in records] == ["abstract 3", "abstract 1"]
+    assert len(statements) == 2 # The unknown id, then the abstracts
+    statements.clear()
+    assert [(r.title, r.summary) for r in store.hydrate(db, [1, 3])] == [("paper 1", "abstract 1"), ("paper 3", "abstract 3")]
+    assert statements == []
+
+def test_reads_outside_the_load_are_bounded(db, monkeypatch):
+    monkeypatch.setattr(store_module, "versions", VersionCounters())
+    for pid in (1, 2, 3):
+        add_paper(db, pid, f"paper {pid}")
+    store = PaperStore(summary_size=2, fallback_size=2) # Not loaded: every id is a fallback read
+    assert [r.summary for r in store.hydrate(db, [1, 2, 3])] == ["abstract 1", "abstract 2", "abstract 3"]
+    assert len(store._fallback) == 2 and len(store._summaries) == 2
+
+def test_follows_ingests_through_the_paper_version(db, monkeypatch):
+    counters = VersionCounters()
+    monkeypatch.setattr(store_module, "versions", counters)
+    add_paper(db, 1, "v1")
+    store = PaperStore()
+    store.load(db)
+
+    paper = db.get(Paper, 1)
+    paper.title, paper.indexed_at = "v2", T0 + timedelta(hours=1)
+    db.commit()
+    add_paper(db, 2, "new", T0 + timedelta(hours=1))
+    assert store.hydrate(db, [1])[0].title == "v1" # Nobody announced the change yet
+
+    counters.bump_papers() # As ingest and /reload do
+    assert store.stale
+    assert [r.title for r in store.hydrate(db, [1, 2])] == ["v2", "new"]
+    assert not store.stale and len(store) == 2
+
+def test_orm_loads_skip_the_embedding(db, statements):
+    add_paper(db, 1, "paper")
+    db.expunge_all()
+    statements.clear()
+    db.execute(select(Paper)).scalars().all()
+    assert "embedding" not in statements[0]
+
+def test_concurrent_hydrates_of_a_stale_store_never_block_the_loop(tmp_path, monkeypatch):
+    counters = VersionCounters()
+    monkeypatch.setattr(store_module, "versions", counters)
+    path = tmp_path / "papers.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for pid in (1, 2, 3):
+        add_paper(db, pid, f"paper {pid}")
+    store = PaperStore()
+    store.load(db)
+    counters.bump_papers() # Every request now starts with a refresh
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    results = []
+    async def one():
+        async with AsyncSession(async_engine) as session:
+            return await store.hydrate_async(session, [3, 1, 4])
+    async def run():
+        results.extend(await asyncio.gather(*[one() for _ in range(4)]))
+        await async_engine.dispose()
+    # A deadlock would block the loop thread itself, so watch it from outside
+    thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert [[r.id for r in records] for records in results] == [[3, 1]] * 4
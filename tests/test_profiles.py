@@ -0,0 +1,42 @@
+import numpy as np
+from app.core.cache import SearchCache
+from app.core.profiles import ProfileStore
+from app.core.vectors import pack_embedding
+from app.models.user import Library
+
+def make_store():
+    cache = SearchCache()
+    cache.upsert([(1, pack_embedding([1.0, 0.0])), (2, pack_embedding([0.0, 1.0])), (3, pack_embedding([1.0, 1.0]))])
+    return cache, ProfileStore(cache)
+
+def test_profile_built_once_then_updated_incrementally(db):
+    cache, store = make_store()
+    db.add(Library(user_id=7, paper_id=1))
+    db.commit()
+
+    vector, ids = store.query(db, 7)
+    assert ids == [1]
+    assert np.allclose(vector, [1.0, 0.0])
+
+    # Toggles update the cached profile without touching the DB
+    db.close()
+    store.add(7, 2)
+    vector, ids = store.query(None, 7)
+    assert sorted(ids) == [1, 2]
+    assert np.allclose(vector, [0.5, 0.5])
+
+    store.remove(7, 1)
+    vector, ids = store.query(None, 7)
+    assert ids == [2]
+    assert np.allclose(vector, [0.0, 1.0])
+
+def test_pending_papers_fold_in_once_embedded(db):
+    cache, store = make_store()
+    db.add(Library(user_id=7, paper_id=9))
+    db.commit()
+    vector, _ = store.query(db, 7)
+    assert vector is None
+
+    cache.upsert([(9, pack_embedding([0.0, 2.0]))])
+    vector, _ = store.query(db, 7)
+    assert np.allclose(vector, [0.0, 1.0])
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from app.services.query_encoder import QueryEncoder
+
+class FakeModel:
+    """ Deterministic 4-d vectors; records the size of every batch. """
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        return np.array([[len(t), t.count(" "), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+def test_concurrent_queries_are_encoded_in_one_batch():
+    model = FakeModel()
+    encoder = QueryEncoder(model, window_ms=50, max_batch=32)
+
+    async def run():
+        return await asyncio.gather(*(encoder.encode_async(f"query {i}") for i in range(10)))
+
+    vectors = asyncio.run(run())
+    assert [len(b) for b in model.batches] == [10]
+    assert all(v[0] == len(f"query {i}") for i, v in enumerate(vectors))
+    metrics = encoder.metrics()
+    assert metrics["batch_sizes"] == {10: 1}
+    assert metrics["mean_batch_size"] == 10
+
+def test_batches_are_capped_at_max_batch():
+    model = FakeModel()
+    encoder = QueryEncoder(model, window_ms=50, max_batch=4)
+    threads = [threading.Thread(target=encoder.encode, args=(f"q{i}",)) for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(len(b) for b in model.batches) == 10
+    assert max(len(b) for b in model.batches) <= 4
+
+def test_repeated_queries_hit_the_cache():
+    model = FakeModel(delay=0)
+    encoder = QueryEncoder(model, window_ms=0, cache_size=2)
+    first = encoder.encode("Graph  Neural networks")
+    again = encoder.encode("graph neural NETWORKS ")
+    assert again is first
+    assert not again.flags.writeable
+    assert len(model.batches) == 1
+    assert encoder.metrics()["cache_hits"] == 1
+
+    # LRU: the oldest query is evicted once the cache is full
+    encoder.encode("a")
+    encoder.encode("b")
+    encoder.encode("graph neural networks")
+    assert len(model.batches) == 4
+
+def test_identical_inflight_queries_share_one_slot():
+    model = FakeModel()
+    encoder = QueryEncoder(model, window_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(encoder.encode_async("transformers") for _ in range(5)))
+
+    asyncio.run(run())
+    assert model.batches == [["transformers"]]
+    assert encoder.metrics()["coalesced"] == 4
+
+def test_encoding_errors_reach_every_caller():
+    def broken(texts):
+        raise RuntimeError("model unavailable")
+    encoder = QueryEncoder(broken, window_ms=0)
+    with pytest.raises(RuntimeError):
+        encoder.encode("anything")
+    assert encoder.metrics()["errors"] == 1
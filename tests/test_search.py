@@ -0,0 +1,34 @@
+from datetime import datetime
+from app.models.paper import Paper
+from app.services.search_service import fts_query, keyword_search, reciprocal_rank_fusion
+
+def add_paper(db, arxiv_id, title, summary="", authors=()):
+    paper = Paper(arxiv_id=arxiv_id, title=title, summary=summary, authors=list(authors),
+                  published=datetime(2024, 1, 1))
+    db.add(paper)
+    db.commit()
+    return paper
+
+def test_fts_query_quotes_terms():
+    assert fts_query('GPT-4 "vision"') == '"GPT-4" """vision"""'
+    assert fts_query("   ") == ""
+
+def test_keyword_search_ranks_title_matches_and_tracks_updates(db):
+    a = add_paper(db, "1", "Scaling GPT-4 style models", "We study transformers.")
+    b = add_paper(db, "2", "Diffusion models", "Compared against GPT-4 baselines.")
+    c = add_paper(db, "3", "Graph networks", "Message passing.", authors=["Ada Lovelace"])
+
+    assert keyword_search(db, "GPT-4") == [a.id, b.id]
+    assert keyword_search(db, "lovelace") == [c.id]
+    # Stemming: "model" matches "models"
+    assert set(keyword_search(db, "model")) == {a.id, b.id}
+
+    # Triggers keep the index in sync with edits
+    c.title = "Graph transformers"
+    db.commit()
+    assert c.id in keyword_search(db, "transformers")
+    assert keyword_search(db, "networks") == []
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]], k=60, limit=3)
+    assert fused[0] in (1, 3) and set(fused[:2]) == {1, 3}
@@ -0,0 +1,81 @@
+import numpy as np
+from app.core.ann import Int8Index
+from app.core.cache import SearchCache
+from app.core.config import settings
+from app.core.shared_matrix import SharedMatrix
+from app.core.vectors import pack_embedding
+from tests.test_cache import wait_for_index
+
+def test_workers_share_one_mapping_and_follow_reloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHARED_CACHE_POLL_SECONDS", 0)
+    leader = SearchCache(SharedMatrix(str(tmp_path)))
+    follower = SearchCache(SharedMatrix(str(tmp_path)))
+
+    leader.upsert([(1, pack_embedding([1.0, 0.0])), (2, pack_embedding([0.0, 1.0]))], watermark="w1")
+    # The publishing process itself serves from the mapping, not a private copy
+    assert isinstance(leader.snapshot.embeddings, np.memmap)
+
+    snap = follower.snapshot
+    assert isinstance(snap.embeddings, np.memmap)
+    assert snap.ids.tolist() == [1, 2] and snap.watermark == "w1"
+    rows, _ = snap.search(np.array([1.0, 0.1]), 1)
+    assert snap.ids_for(rows) == [1]
+
+    # A reload in one process bumps the generation; the other re-attaches
+    version = follower.snapshot.vectors_version
+    leader.upsert([(2, pack_embedding([1.0, 1.0])), (3, pack_embedding([0.0, 1.0]))], watermark="w2")
+    snap = follower.snapshot
+    assert snap.ids.tolist() == [1, 2, 3] and snap.watermark == "w2"
+    assert snap.vectors_version > version # Paper 2 was re-embedded
+    assert np.allclose(snap.embeddings[1], np.array([1.0, 1.0]) / np.sqrt(2))
+
+def test_old_generations_are_cleaned_up(tmp_path):
+    shared = SharedMatrix(str(tmp_path))
+    for generation in range(4):
+        shared.publish(np.arange(2), np.eye(2, dtype=np.float32))
+    files = sorted(name for name in tmp_path.iterdir() if name.suffix == ".npy")
+    assert [f.name for f in files] == ["embeddings.3.npy", "embeddings.4.npy", "ids.3.npy", "ids.4.npy"]
+    manifest, ids, embeddings, _ = shared.attach()
+    assert manifest["generation"] == 4 and ids.tolist() == [0, 1]
+
+def test_appends_are_written_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHARED_CACHE_POLL_SECONDS", 0)
+    leader = SearchCache(SharedMatrix(str(tmp_path)))
+    follower = SearchCache(SharedMatrix(str(tmp_path)))
+    leader.upsert([(1, pack_embedding([1.0, 0.0])), (2, pack_embedding([0.0, 1.0]))], watermark="w1")
+    before = follower.snapshot
+    segment = leader.shared.manifest()["segment"]
+
+    leader.upsert([(3, pack_embedding([1.0, 1.0]))], watermark="w2")
+    manifest = leader.shared.manifest()
+    assert manifest["segment"] == segment and manifest["rows"] == 3 # No new files
+    assert isinstance(leader.snapshot.embeddings, np.memmap)
+    snap = follower.snapshot
+    assert snap.ids.tolist() == [1, 2, 3] and snap.watermark == "w2"
+    assert snap.vectors_version == before.vectors_version
+    assert np.allclose(snap.embeddings[2], np.array([1.0, 1.0]) / np.sqrt(2))
+    assert len(before) == 2 and before.ids.tolist() == [1, 2] # Older readers are unaffected
+
+    # Once the capacity is used up, the next append starts a new segment
+    leader.upsert([(pid, pack_embedding([1.0, 0.0])) for pid in range(4, 10)])
+    assert leader.shared.manifest()["segment"] > segment
+    assert follower.snapshot.ids.tolist() == list(range(1, 10))
+
+def test_only_the_writer_builds_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHARED_CACHE_POLL_SECONDS", 0)
+    monkeypatch.setattr(settings, "ANN_ENGINE", "sq8")
+    monkeypatch.setattr(settings, "ANN_MIN_ROWS", 1)
+    monkeypatch.setattr(settings, "ANN_INDEX_PATH", str(tmp_path / "ann.npz"))
+    builds = []
+    build = Int8Index.build.__func__
+    monkeypatch.setattr(Int8Index, "build", classmethod(lambda cls, *args, **kw: builds.append(1) or build(cls, *args, **kw)))
+    leader = SearchCache(SharedMatrix(str(tmp_path / "shared")))
+    follower = SearchCache(SharedMatrix(str(tmp_path / "shared")))
+    rng = np.random.default_rng(0)
+    leader.upsert([(pid, pack_embedding(rng.standard_normal(8))) for pid in range(1, 51)])
+    follower.snapshot # Attaches before the index exists: scores exactly meanwhile
+
+    index = wait_for_index(leader, Int8Index)
+    assert leader.shared.manifest()["index"] == index.meta
+    assert isinstance(wait_for_index(follower, Int8Index), Int8Index)
+    assert builds == [1]
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from app.models.paper import Paper
+from app.models.trending import PaperTrend
+from app.models.user import Library
+from app.services.trending_service import TrendingService
+
+NOW = datetime(2026, 6, 1)
+
+def seed(db) -> TrendingService:
+    db.add_all([Paper(id=i, arxiv_id=f"2401.0000{i}", title=f"P{i}") for i in (1, 2)])
+    db.commit()
+    return TrendingService()
+
+def save(db, service, user_id, paper_id, at):
+    db.add(Library(user_id=user_id, paper_id=paper_id, created_at=at))
+    service.record_save(db, paper_id, at)
+    db.commit()
+
+def test_recent_saves_beat_older_popularity(db):
+    service = seed(db)
+    # Paper 1: five saves a month ago. Paper 2: two saves today.
+    for user in range(5):
+        save(db, service, user, 1, NOW - timedelta(days=30))
+    for user in range(2):
+        save(db, service, user, 2, NOW)
+
+    assert service.top(db, "all") == [1, 2]
+    assert service.top(db, "week") == [2, 1]
+    assert service.top(db, "day") == [2, 1]
+
+def test_unsave_and_rebuild_agree(db):
+    service = seed(db)
+    save(db, service, 1, 1, NOW - timedelta(days=3))
+    save(db, service, 2, 1, NOW)
+    save(db, service, 3, 2, NOW - timedelta(days=1))
+
+    entry = db.query(Library).filter_by(user_id=2, paper_id=1).one()
+    service.record_unsave(db, 1, entry.created_at)
+    db.delete(entry)
+    db.commit()
+
+    # The incremental counters match a full regeneration from `library`
+    assert service.rebuild(db) == 0
+    assert db.get(PaperTrend, 1).saves == 1
+
+    # Removing the last save clears the scores
+    entry = db.query(Library).filter_by(user_id=3, paper_id=2).one()
+    service.record_unsave(db, 2, entry.created_at)
+    db.delete(entry)
+    db.commit()
+    assert service.top(db, "week") == [1]
@@ -0,0 +1,43 @@
+from fastapi.testclient import TestClient
+from app.core.principals import principal_cache
+from app.core.versions import VersionCounters, versions
+from app.main import app
+
+client = TestClient(app, base_url="http://localhost")
+
+def test_counters_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "versions.bin")
+    worker_a, worker_b = VersionCounters(path, user_slots=8), VersionCounters(path, user_slots=8)
+    tag = worker_b.etag(worker_b.papers)
+    assert worker_a.etag(worker_a.papers) == tag
+
+    worker_a.bump_papers()
+    worker_a.bump_library(3)
+    assert worker_b.papers == 1 and worker_b.saves == 1
+    assert worker_b.user(3) == 1 and worker_b.user(4) == 0
+    assert worker_b.etag(worker_b.papers) != tag
+
+def test_recreated_file_gets_a_new_epoch(tmp_path):
+    first = VersionCounters(str(tmp_path / "a.bin")).etag(0)
+    second = VersionCounters(str(tmp_path / "b.bin")).etag(0)
+    assert first != second
+
+def test_index_revalidates_with_304():
+    response = client.get("/")
+    etag = response.headers["etag"]
+    again = client.get("/", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag
+    assert client.get("/", headers={"If-None-Match": 'W/"stale"'}).status_code == 200
+
+def test_library_ids_change_after_a_toggle():
+    token = client.post("/login_or_create", data={"username": "etag@example.com", "password": "pw"}).json()["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+    etag = client.get("/library/ids", headers=auth).headers["etag"]
+    assert client.get("/library/ids", headers={**auth, "If-None-Match": etag}).status_code == 304
+
+    client.post("/library/toggle/999999999", headers=auth) # Unknown paper: nothing changes
+    assert client.get("/library/ids", headers={**auth, "If-None-Match": etag}).status_code == 304
+
+    versions.bump_library(principal_cache.get("etag@example.com").id) # As a real toggle does
+    fresh = client.get("/library/ids", headers={**auth, "If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["etag"] != etag
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, sqlite_profile
+from app.core.writer import DatabaseWriter
+from app.models.paper import Paper # noqa: F401 (registers the table library references)
+from app.models.user import User
+
+def file_db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    write_engine = sqlite_profile(create_engine(url, connect_args={"check_same_thread": False}))
+    Base.metadata.create_all(bind=write_engine)
+    read_engine = sqlite_profile(create_engine(url, connect_args={"check_same_thread": False}), read_only=True)
+    return sessionmaker(bind=write_engine), sessionmaker(bind=read_engine)
+
+def add_user(db, email):
+    db.add(User(email=email, hashed_password="x"))
+    db.flush()
+    return email
+
+def test_writes_are_serialised_and_errors_roll_back(tmp_path):
+    Writer, Reader = file_db(tmp_path)
+    writer = DatabaseWriter(Writer)
+
+    futures = [writer.submit(add_user, f"u{i}@x") for i in range(20)]
+    assert [f.result() for f in futures] == [f"u{i}@x" for i in range(20)]
+
+    # A failing job (duplicate email) rolls back without affecting the next one
+    failed = writer.submit(add_user, "u0@x")
+    assert failed.exception() is not None
+    assert writer.run(add_user, "new@x") == "new@x"
+
+    with Reader() as db:
+        assert db.query(User).count() == 21
+
+def test_readers_not_blocked_by_open_write_transaction(tmp_path):
+    Writer, Reader = file_db(tmp_path)
+    with Writer() as db:
+        add_user(db, "a@x")
+        db.commit()
+
+    # Hold a write transaction open, as a long ingest chunk would
+    writer = Writer()
+    writer.execute(text("INSERT INTO users (email, hashed_password) VALUES ('b@x', 'x')"))
+
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(Reader().query(User).count()))
+    reader.start()
+    reader.join(timeout=2)
+    assert seen == [1] # WAL: the reader sees the last commit, without waiting
+
+    writer.rollback()
+
+def test_read_pool_rejects_writes(tmp_path):
+    _, Reader = file_db(tmp_path)
+    with Reader() as db, pytest.raises(OperationalError):
+        add_user(db, "c@x")
+
+def test_full_queue_never_blocks_the_event_loop(tmp_path):
+    Writer, _ = file_db(tmp_path)
+    writer = DatabaseWriter(Writer, queue_size=1, wait_seconds=0.2)
+    release = threading.Event()
+    busy = writer.submit(lambda db: release.wait(5)) # Occupies the writer thread
+    while writer.pending: # ...once it has taken the job off the queue
+        time.sleep(0.001)
+    writer.submit(add_user, "queued@x") # Fills the queue
+
+    async def run():
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        ticker = asyncio.create_task(tick())
+        with pytest.raises(HTTPException) as rejected:
+            await writer.run_async(add_user, "late@x")
+        assert rejected.value.status_code == 503
+        assert ticks > 5 # The loop kept running while the submit waited
+
+        # Space frees up while waiting: the write goes through
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        assert await writer.run_async(add_user, "waited@x") == "waited@x"
+        ticker.cancel()
+    asyncio.run(run())
+    assert busy.result() is True